@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Date  : 2026/10/17
+# @File  : benchmark_task_callback.py
+# @Author: johnson
+# @Contact : github: johnson7788
+# @Desc  : ADKHostManager.task_callback 的微基准测试，任务数量增加时每次状态更新的耗时应保持不变
+"""
+远程 Agent 的每一个流式状态更新都会调用 task_callback，这里不启动服务、不调用大模型:
+1. 预先通过 task_callback 添加 N 个任务（分布在多个会话中）
+2. 对随机的已有任务发送 --updates 次 TaskStatusUpdateEvent，统计每次调用的平均耗时，
+   同时统计 sanitize_message（查找会话最后一条消息关联的任务）的耗时
+python benchmark_task_callback.py
+python benchmark_task_callback.py --tasks 100 1000 10000 50000 --updates 2000 --output callback.json
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import time
+import uuid
+
+import httpx
+
+# 只构造 Agent，不会请求模型，没有配置 .env 时使用占位的模型配置
+os.environ.setdefault("MODEL_PROVIDER", "deepseek")
+os.environ.setdefault("LLM_MODEL", "deepseek-chat")
+os.environ.setdefault("DEEPSEEK_API_KEY", "benchmark")
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
+from a2a.types import (  # noqa: E402
+    AgentCapabilities,
+    AgentCard,
+    Message,
+    Part,
+    Role,
+    Task,
+    TaskState,
+    TaskStatus,
+    TaskStatusUpdateEvent,
+    TextPart,
+)
+
+from service.server.adk_host_manager import ADKHostManager  # noqa: E402
+
+AGENT_CARD = AgentCard(
+    name="benchmark_agent",
+    description="benchmark",
+    url="http://127.0.0.1:0",
+    version="1.0",
+    capabilities=AgentCapabilities(streaming=True),
+    defaultInputModes=["text"],
+    defaultOutputModes=["text"],
+    skills=[],
+)
+
+
+def make_message(context_id: str, task_id: str, text: str) -> Message:
+    return Message(
+        role=Role.agent,
+        parts=[Part(root=TextPart(text=text))],
+        messageId=str(uuid.uuid4()),
+        contextId=context_id,
+        taskId=task_id,
+    )
+
+
+async def run_size(num_tasks: int, num_updates: int, num_conversations: int) -> dict:
+    async with httpx.AsyncClient() as client:
+        manager = ADKHostManager(client)
+        contexts = [str(uuid.uuid4()) for _ in range(num_conversations)]
+        for context_id in contexts:
+            await manager.create_conversation(context_id)
+        task_ids = []
+        for idx in range(num_tasks):
+            context_id = contexts[idx % num_conversations]
+            task_id = str(uuid.uuid4())
+            manager.task_callback(Task(
+                id=task_id,
+                contextId=context_id,
+                status=TaskStatus(state=TaskState.working, message=make_message(context_id, task_id, "start")),
+            ), AGENT_CARD)
+            task_ids.append((context_id, task_id))
+        # 每个会话的最后一条消息关联一个任务，sanitize_message 需要查找该任务是否还在进行
+        for context_id, task_id in task_ids[-num_conversations:]:
+            manager.get_conversation(context_id).messages.append(make_message(context_id, task_id, "reply"))
+
+        rng = random.Random(num_tasks)
+        updates = []
+        for _ in range(num_updates):
+            context_id, task_id = rng.choice(task_ids)
+            updates.append(TaskStatusUpdateEvent(
+                taskId=task_id,
+                contextId=context_id,
+                status=TaskStatus(state=TaskState.working, message=make_message(context_id, task_id, "token")),
+                final=False,
+            ))
+        start = time.perf_counter()
+        for update in updates:
+            manager.task_callback(update, AGENT_CARD)
+        callback_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for idx in range(num_updates):
+            manager.sanitize_message(make_message(contexts[idx % num_conversations], "", "next"))
+        sanitize_seconds = time.perf_counter() - start
+
+    return {
+        "tasks": num_tasks,
+        "conversations": num_conversations,
+        "updates": num_updates,
+        "callback_us": round(callback_seconds / num_updates * 1e6, 2),
+        "sanitize_us": round(sanitize_seconds / num_updates * 1e6, 2),
+    }
+
+
+async def main(args):
+    results = []
+    for num_tasks in args.tasks:
+        # 回调中会打印每个事件，统计时不输出
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            result = await run_size(num_tasks, args.updates, args.conversations)
+        print(json.dumps(result, ensure_ascii=False))
+        results.append(result)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存到 {args.output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ADKHostManager.task_callback 微基准测试")
+    parser.add_argument("--tasks", type=int, nargs="+", default=[100, 1000, 10000], help="预先添加的任务数量，可以指定多个")
+    parser.add_argument("--updates", type=int, default=2000, help="状态更新次数")
+    parser.add_argument("--conversations", type=int, default=50, help="任务分布的会话数量")
+    parser.add_argument("--output", help="把结果保存为 JSON 文件")
+    asyncio.run(main(parser.parse_args()))
@@ -49,6 +49,7 @@ async def lifespan(app: FastAPI):
     app.openapi_schema = None
     app.setup()
     yield
+    await agent_server.close()
     await httpx_client_wrapper.stop()
 # 添加 ping 路由
 
@@ -112,23 +112,70 @@ class HostAgentAPIClient:
         """
         return self._post_request("/message/pending")
 
+    def get_message_queue(self):
+        """
+        消息队列的状态: 排队数量(queue_depth)、正在处理的数量、拒绝的数量等
+        """
+        return self._post_request("/message/queue")
+
+    def get_admin_stats(self):
+        """
+        各项数据（会话、消息、任务、事件、文件缓存等）的数量和估算的内存字节数
+        """
+        url = f"{self.base_url}/admin/stats"
+        try:
+            response = requests.get(url)
+            response.raise_for_status()
+            return response.json()
+        except requests.exceptions.RequestException as e:
+            print(f"An error occurred: {e}")
+            return None
+
     def get_events(self):
         """
         Gets events.
         """
         return self._post_request("/events/get")
 
-    def query_events(self, conversation_id):
+    def query_events(self, conversation_id, since=0, limit=None):
         """
         Queries events for a specific conversation.
+        :param since: 上一次返回的 next_since，只返回之后的新事件，0 表示从头开始
+        :param limit: 最多返回的事件数量
         """
         payload = {
             "params": {
                 "conversation_id": conversation_id,
+                "since": since,
+                "limit": limit,
             }
         }
         return self._post_request("/events/query", payload)
 
+    def stream_events(self, conversation_id, since=0, timeout=None):
+        """
+        通过 /conversation/{conversation_id}/stream（SSE）接收会话的事件，不需要轮询，每收到一个事件返回 (序号, 事件)
+        :param since: 从该序号之后开始推送，0 表示从头开始；断线后传入最后收到的序号即可继续
+        :param timeout: 连接和读取的超时时间，服务端没有新事件时每隔一段时间发送心跳
+        """
+        url = f"{self.base_url}/conversation/{conversation_id}/stream"
+        with requests.get(url, params={"since": since}, stream=True, timeout=timeout) as response:
+            response.raise_for_status()
+            event_id = None
+            data_lines = []
+            for line in response.iter_lines(decode_unicode=True):
+                if line:
+                    # 以 ":" 开头的是心跳，retry、event 字段不需要处理
+                    if line.startswith("id:"):
+                        event_id = line[3:].strip()
+                    elif line.startswith("data:"):
+                        data_lines.append(line[5:].strip())
+                    continue
+                if data_lines:
+                    yield int(event_id) if event_id else None, json.loads("\n".join(data_lines))
+                event_id = None
+                data_lines = []
+
     def list_tasks(self):
         """
         Lists tasks.
@@ -155,7 +202,8 @@ class HostAgentAPIClient:
         print(f"Message sent, message_id: {message_id}")
 
         start_time = time.time()
-        last_events_number = 0
+        # 事件的 cursor，每次只取新的事件
+        since = 0
         while time.time() - start_time < timeout:
             pending_response = self.get_pending_messages()
             if pending_response and "result" in pending_response:
@@ -164,10 +212,10 @@ class HostAgentAPIClient:
                 if message_id not in pending_ids:
                     print("Message processed.")
                     return True
-            events = self.query_events(conversation_id)
-            event_results = events["result"]
-            new_events = event_results[last_events_number:]
-            last_events_number += len(event_results)
+            events = self.query_events(conversation_id, since=since)
+            new_events = events["result"] if events else []
+            if events:
+                since = events.get("next_since", since)
             if new_events:
                 print(f"有新的事件收到了,事件内容: {new_events}")
             time.sleep(interval)
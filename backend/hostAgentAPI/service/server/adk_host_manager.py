@@ -1,10 +1,11 @@
-import asyncio
 import base64
 import datetime
 import json
 import os
 import uuid
 
+from collections.abc import Callable, Iterable
+
 import httpx
 
 from a2a.types import (
@@ -38,8 +39,18 @@ from hosts.multiagent.remote_agent_connection import (
 from utils.agent_card import get_agent_card
 
 from service.server.application_manager import ApplicationManager
+from service.server.state_store import HostStateStore, deep_sizeof, size_stats
 from service.types import Conversation, Event
 
+# 最多保留的会话数量，超过后淘汰最久没有活动的会话，0 表示不限制
+MAX_CONVERSATIONS = int(os.environ.get('A2A_MAX_CONVERSATIONS', '1000'))
+# 会话超过多少秒没有活动后被淘汰，0 表示不限制
+CONVERSATION_TTL = float(os.environ.get('A2A_CONVERSATION_TTL', str(7 * 24 * 3600)))
+# 每个会话最多保留的事件数量，超过后删除最早的事件，0 表示不限制
+MAX_EVENTS_PER_CONVERSATION = int(
+    os.environ.get('A2A_MAX_EVENTS_PER_CONVERSATION', '5000')
+)
+
 
 class ADKHostManager(ApplicationManager):
     """An implementation of memory based management with fake agent actions
@@ -55,13 +66,14 @@ class ADKHostManager(ApplicationManager):
         api_key: str = '',
         uses_vertex_ai: bool = False,
     ):
-        self._conversations: list[Conversation] = []
-        self._messages: list[Message] = []
-        self._tasks: list[Task] = []
-        self._events: dict[str, Event] = {}
-        self._pending_message_ids: list[str] = []
+        # 会话、消息、任务、事件按 id 建立索引，流式状态更新时不再遍历所有任务
+        self._store = HostStateStore(MAX_EVENTS_PER_CONVERSATION)
+        # 等待回复的消息 id（字典当作有序集合使用，删除是 O(1)）
+        self._pending_message_ids: dict[str, None] = {}
         self._agents: list[AgentCard] = []
         self._artifact_chunks: dict[str, list[Artifact]] = {}
+        # 会话 id -> 该会话还没有接收完的分块产物 id，淘汰会话时一起删除
+        self._artifact_chunks_by_context: dict[str, set[str]] = {}
         self._session_service = InMemorySessionService()
         self._artifact_service = InMemoryArtifactService()
         self._memory_service = InMemoryMemoryService()
@@ -110,7 +122,7 @@ class ADKHostManager(ApplicationManager):
         )
         conversation_id = session.id
         c = Conversation(conversation_id=conversation_id, is_active=True)
-        self._conversations.append(c)
+        self._store.add_conversation(c)
         return c
 
     def update_api_key(self, api_key: str):
@@ -135,102 +147,97 @@ class ADKHostManager(ApplicationManager):
             # Check if the last event in the conversation was tied to a task.
             if conversation.messages:
                 task_id = conversation.messages[-1].taskId
-                if task_id and task_still_open(
-                    next(
-                        filter(lambda x: x and x.id == task_id, self._tasks),
-                        None,
-                    )
-                ):
+                if task_id and task_still_open(self._store.get_task(task_id)):
                     message.taskId = task_id
         return message
 
     async def process_message(self, message: Message):
         message_id = message.messageId
         if message_id:
-            self._pending_message_ids.append(message_id)
-        context_id = message.contextId
-        conversation = self.get_conversation(context_id)
-        self._messages.append(message)
-        if conversation:
-            conversation.messages.append(message)
-        self.add_event(
-            Event(
-                id=str(uuid.uuid4()),
-                actor='user',
-                content=message,
-                timestamp=datetime.datetime.utcnow().timestamp(),
-            )
-        )
-        final_event = None
-        # Determine if a task is to be resumed.
-        session = await self._session_service.get_session(
-            app_name='A2A', user_id='test_user', session_id=context_id
-        )
-        task_id = message.taskId
-        # Update state must happen in an event
-        state_update = {
-            'task_id': task_id,
-            'context_id': context_id,
-            'message_id': message.messageId,
-        }
-        # Need to upsert session state now, only way is to append an event.
-        print(f"adk_host_manager: 发送event事件前")
-        await self._session_service.append_event(
-            session,
-            ADKEvent(
-                id=ADKEvent.new_id(),
-                author='host_agent',
-                invocation_id=ADKEvent.new_id(),
-                actions=ADKEventActions(state_delta=state_update),
-            ),
-        )
-        print(f"adk_host_manager:发送event事件后")
-        async for event in self._host_runner.run_async(
-            user_id=self.user_id,
-            session_id=context_id,
-            new_message=self.adk_content_from_message(message),
-        ):
-            if (
-                event.actions.state_delta
-                and 'task_id' in event.actions.state_delta
-            ):
-                task_id = event.actions.state_delta['task_id']
+            self._pending_message_ids[message_id] = None
+        try:
+            context_id = message.contextId
+            conversation = self.get_conversation(context_id)
+            self._store.add_message(message)
+            if conversation:
+                conversation.messages.append(message)
             self.add_event(
                 Event(
-                    id=event.id,
-                    actor=event.author,
-                    content=await self.adk_content_to_message(
-                        event.content, context_id, task_id
-                    ),
-                    timestamp=event.timestamp,
+                    id=str(uuid.uuid4()),
+                    actor='user',
+                    content=message,
+                    timestamp=datetime.datetime.utcnow().timestamp(),
                 )
             )
-            final_event = event
-        response: Message | None = None
-        if final_event:
-            if (
-                final_event.actions.state_delta
-                and 'task_id' in final_event.actions.state_delta
-            ):
-                task_id = event.actions.state_delta['task_id']
-            final_event.content.role = 'model'
-            response = await self.adk_content_to_message(
-                final_event.content, context_id, task_id
+            final_event = None
+            # Determine if a task is to be resumed.
+            session = await self._session_service.get_session(
+                app_name='A2A', user_id='test_user', session_id=context_id
+            )
+            task_id = message.taskId
+            # Update state must happen in an event
+            state_update = {
+                'task_id': task_id,
+                'context_id': context_id,
+                'message_id': message.messageId,
+            }
+            # Need to upsert session state now, only way is to append an event.
+            print(f"adk_host_manager: 发送event事件前")
+            await self._session_service.append_event(
+                session,
+                ADKEvent(
+                    id=ADKEvent.new_id(),
+                    author='host_agent',
+                    invocation_id=ADKEvent.new_id(),
+                    actions=ADKEventActions(state_delta=state_update),
+                ),
             )
-            self._messages.append(response)
+            print(f"adk_host_manager:发送event事件后")
+            async for event in self._host_runner.run_async(
+                user_id=self.user_id,
+                session_id=context_id,
+                new_message=self.adk_content_from_message(message),
+            ):
+                if (
+                    event.actions.state_delta
+                    and 'task_id' in event.actions.state_delta
+                ):
+                    task_id = event.actions.state_delta['task_id']
+                self.add_event(
+                    Event(
+                        id=event.id,
+                        actor=event.author,
+                        content=await self.adk_content_to_message(
+                            event.content, context_id, task_id
+                        ),
+                        timestamp=event.timestamp,
+                    )
+                )
+                final_event = event
+            response: Message | None = None
+            if final_event:
+                if (
+                    final_event.actions.state_delta
+                    and 'task_id' in final_event.actions.state_delta
+                ):
+                    task_id = event.actions.state_delta['task_id']
+                final_event.content.role = 'model'
+                response = await self.adk_content_to_message(
+                    final_event.content, context_id, task_id
+                )
+                self._store.add_message(response)
 
-        if conversation and response:
-            conversation.messages.append(response)
-        self._pending_message_ids.remove(message_id)
+            if conversation and response:
+                conversation.messages.append(response)
+        finally:
+            # 处理失败时也不再显示为 pending
+            self._pending_message_ids.pop(message_id, None)
 
     def add_task(self, task: Task):
-        self._tasks.append(task)
+        self._store.add_task(task)
 
     def update_task(self, task: Task):
-        for i, t in enumerate(self._tasks):
-            if t.id == task.id:
-                self._tasks[i] = task
-                return
+        self._store.update_task(task)
 
     def task_callback(self, task: TaskCallbackArg, agent_card: AgentCard):
         self.emit_event(task, agent_card)
@@ -247,7 +254,7 @@ class ADKHostManager(ApplicationManager):
             self.update_task(current_task)
             return current_task
         # Otherwise this is a Task, either new or updated
-        if not any(filter(lambda x: x and x.id == task.id, self._tasks)):
+        if self._store.get_task(task.id) is None:
             self.attach_message_to_task(task.status.message, task.id)
             self.add_task(task)
             return task
@@ -347,9 +354,7 @@ class ADKHostManager(ApplicationManager):
             task_id = event.taskId
         if not task_id:
             task_id = str(uuid.uuid4())
-        current_task = next(
-            filter(lambda x: x.id == task_id, self._tasks), None
-        )
+        current_task = self._store.get_task(task_id)
         if not current_task:
             context_id = event.contextId
             current_task = Task(
@@ -384,6 +389,9 @@ class ADKHostManager(ApplicationManager):
                 if artifact.artifactId not in self._artifact_chunks:
                     self._artifact_chunks[artifact.artifactId] = []
                 self._artifact_chunks[artifact.artifactId].append(artifact)
+                self._artifact_chunks_by_context.setdefault(
+                    current_task.contextId, set()
+                ).add(artifact.artifactId)
         else:
             # we received an append chunk, add to the existing temp artifact
             current_temp_artifact = self._artifact_chunks[artifact.artifactId][
@@ -397,32 +405,32 @@ class ADKHostManager(ApplicationManager):
                 else:
                     current_task.artifacts = [current_temp_artifact]
                 del self._artifact_chunks[artifact.artifactId][-1]
+                if not self._artifact_chunks[artifact.artifactId]:
+                    del self._artifact_chunks[artifact.artifactId]
+                    chunk_ids = self._artifact_chunks_by_context.get(
+                        current_task.contextId
+                    )
+                    if chunk_ids is not None:
+                        chunk_ids.discard(artifact.artifactId)
+                        if not chunk_ids:
+                            del self._artifact_chunks_by_context[
+                                current_task.contextId
+                            ]
 
     def add_event(self, event: Event):
-        print(f"已经收集了事件数据: {len(self._events)} 条，正在添加的event的id是: {event.id}")
-        self._events[event.id] = event
+        print(f"已经收集了事件数据: {len(self._store.events)} 条，正在添加的event的id是: {event.id}")
+        self._store.add_event(event)
 
     def get_conversation(
         self, conversation_id: str | None
     ) -> Conversation | None:
-        if not conversation_id:
-            return None
-        return next(
-            filter(
-                lambda c: c and c.conversation_id == conversation_id,
-                self._conversations,
-            ),
-            None,
-        )
+        return self._store.get_conversation(conversation_id)
 
     def get_pending_messages(self) -> list[tuple[str, str]]:
         rval = []
         for message_id in self._pending_message_ids:
             if message_id in self._task_map:
-                task_id = self._task_map[message_id]
-                task = next(
-                    filter(lambda x: x.id == task_id, self._tasks), None
-                )
+                task = self._store.get_task(self._task_map[message_id])
                 if not task:
                     rval.append((message_id, ''))
                 elif task.history and task.history[-1].parts:
@@ -457,15 +465,85 @@ class ADKHostManager(ApplicationManager):
 
     @property
     def conversations(self) -> list[Conversation]:
-        return self._conversations
+        return list(self._store.conversations.values())
 
     @property
     def tasks(self) -> list[Task]:
-        return self._tasks
+        return list(self._store.tasks.values())
 
     @property
     def events(self) -> list[Event]:
-        return sorted(self._events.values(), key=lambda x: x.timestamp)
+        return sorted(self._store.events.values(), key=lambda x: x.timestamp)
+
+    def query_events(
+        self, conversation_id: str, since: int = 0, limit: int | None = None
+    ) -> tuple[list[Event], int]:
+        # 每个会话的事件日志只追加，按序号切片，不再对所有会话的事件排序
+        return self._store.query_events(conversation_id, since, limit)
+
+    def subscribe_events(
+        self, conversation_id: str, listener: Callable[[], None]
+    ) -> Callable[[], None]:
+        # task_callback、emit_event 添加事件时立即通知 /conversation/{id}/stream
+        return self._store.subscribe(conversation_id, listener)
+
+    async def compact(self, protected: Iterable[str] = ()) -> list[str]:
+        # 正在等待回复的会话不淘汰
+        protected = set(protected)
+        for message_id in self._pending_message_ids:
+            message = self._store.get_message(message_id)
+            if message and message.contextId:
+                protected.add(message.contextId)
+        evicted = self._store.evictable_conversations(
+            MAX_CONVERSATIONS, CONVERSATION_TTL, protected
+        )
+        for context_id in evicted:
+            messages, tasks = self._store.remove_conversation(context_id)
+            for message in messages:
+                self._task_map.pop(message.messageId, None)
+            for task in tasks:
+                for message in [*(task.history or []), task.status.message]:
+                    if message:
+                        self._task_map.pop(message.messageId, None)
+            for artifact_id in self._artifact_chunks_by_context.pop(context_id, ()):
+                self._artifact_chunks.pop(artifact_id, None)
+            # 会话 id 同时是 ADK 的 session_id，session 中保存了完整的对话历史
+            for filename in await self._artifact_service.list_artifact_keys(
+                app_name=self.app_name, user_id=self.user_id, session_id=context_id
+            ):
+                await self._artifact_service.delete_artifact(
+                    app_name=self.app_name,
+                    user_id=self.user_id,
+                    session_id=context_id,
+                    filename=filename,
+                )
+            await self._session_service.delete_session(
+                app_name=self.app_name, user_id=self.user_id, session_id=context_id
+            )
+        if evicted:
+            print(f"淘汰了 {len(evicted)} 个会话，剩余 {len(self._store.conversations)} 个会话")
+        return evicted
+
+    def stats(self, include_bytes: bool = True) -> dict[str, dict[str, int]]:
+        rval = self._store.stats(include_bytes)
+        rval['artifact_chunks'] = size_stats(self._artifact_chunks, include_bytes)
+        rval['task_map'] = size_stats(self._task_map, include_bytes)
+        rval['pending_messages'] = {'count': len(self._pending_message_ids)}
+        rval['adk_sessions'] = {
+            'count': sum(
+                len(sessions)
+                for users in list(self._session_service.sessions.values())
+                for sessions in list(users.values())
+            )
+        }
+        if include_bytes:
+            rval['adk_sessions']['bytes'] = deep_sizeof(
+                self._session_service.sessions
+            )
+        rval['adk_artifacts'] = size_stats(
+            self._artifact_service.artifacts, include_bytes
+        )
+        return rval
 
     def adk_content_from_message(self, message: Message) -> types.Content:
         parts: list[types.Part] = []
@@ -623,17 +701,6 @@ class ADKHostManager(ApplicationManager):
             )
         return parts
 
-    def process_message_threadsafe(
-        self, message: Message, loop: asyncio.AbstractEventLoop
-    ):
-        """Safely run process_message from a thread using the given event loop."""
-        future = asyncio.run_coroutine_threadsafe(
-            self.process_message(message), loop
-        )
-        return (
-            future  # You can call future.result() to get the result if needed
-        )
-
 
 def get_message_id(m: Message | None) -> str | None:
     if not m or not m.metadata or 'message_id' not in m.metadata:
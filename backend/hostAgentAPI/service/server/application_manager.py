@@ -1,4 +1,5 @@
 from abc import ABC, abstractmethod
+from collections.abc import Callable, Iterable
 
 from a2a.types import AgentCard, Message, Task
 
@@ -53,3 +54,32 @@ class ApplicationManager(ABC):
     @abstractmethod
     def events(self) -> list[Event]:
         pass
+
+    def query_events(
+        self, conversation_id: str, since: int = 0, limit: int | None = None
+    ) -> tuple[list[Event], int]:
+        """会话中序号（从 1 开始）大于 since 的事件，最多 limit 个，以及下一次查询使用的 since"""
+        events = [
+            event
+            for event in self.events
+            if event.content.contextId == conversation_id
+        ]
+        if since > len(events):
+            since = 0
+        end = len(events) if limit is None else since + max(limit, 0)
+        events = events[since:end]
+        return events, since + len(events)
+
+    def subscribe_events(
+        self, conversation_id: str, listener: Callable[[], None]
+    ) -> Callable[[], None]:
+        """会话有新事件时调用 listener，返回取消订阅的函数；默认不通知，推送接口在每次心跳时检查新事件"""
+        return lambda: None
+
+    async def compact(self, protected: Iterable[str] = ()) -> list[str]:
+        """按保留策略淘汰不活跃的会话，protected 中的会话不淘汰，返回被淘汰的会话 id；默认不淘汰"""
+        return []
+
+    def stats(self, include_bytes: bool = True) -> dict[str, dict[str, int]]:
+        """每种数据的数量和估算的内存字节数，include_bytes 为 False 时只统计数量"""
+        return {}
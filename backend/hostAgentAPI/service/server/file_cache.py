@@ -0,0 +1,118 @@
+import base64
+import os
+import shutil
+import tempfile
+
+from typing import NamedTuple
+
+from a2a.types import FilePart, FileWithBytes
+
+from .state_store import deep_sizeof
+
+
+class SpilledFile(NamedTuple):
+    """已经写入磁盘的文件，内存中只保存路径"""
+
+    path: str
+    mime_type: str
+    size: int
+
+
+class FileCache:
+    """/message/list 把消息中的文件替换为 /message/file/{cache_id} 链接，这里保存链接对应的文件
+
+    以前所有文件都以 base64 的形式保存在内存中。现在超过 spill_bytes 的文件写入 directory，
+    内存中只保存路径；每个文件记录所属的会话，会话被淘汰时删除它的文件。
+    :param directory: 保存大文件的目录，默认在临时目录中为每个进程新建一个目录，close 时删除
+    :param spill_bytes: 超过该大小（base64 字符数）的文件写入磁盘，0 表示都保存在内存中
+    """
+
+    def __init__(self, directory: str | None = None, spill_bytes: int = 256 * 1024):
+        self._owns_directory = not directory
+        self.directory = directory or tempfile.mkdtemp(prefix='a2a_file_cache_')
+        os.makedirs(self.directory, exist_ok=True)
+        self.spill_bytes = spill_bytes
+        # cache_id -> 文件
+        self._files: dict[str, FilePart | SpilledFile] = {}
+        # message_id:part_index -> cache_id
+        self._message_to_cache: dict[str, str] = {}
+        # 会话 id -> 该会话的 message_id:part_index
+        self._parts_by_context: dict[str, list[str]] = {}
+
+    def __contains__(self, cache_id: str) -> bool:
+        return cache_id in self._files
+
+    def get(self, cache_id: str) -> FilePart | SpilledFile | None:
+        return self._files.get(cache_id)
+
+    def cache_id(self, message_part_id: str) -> str | None:
+        return self._message_to_cache.get(message_part_id)
+
+    def put(
+        self, message_part_id: str, cache_id: str, part: FilePart, context_id: str
+    ) -> None:
+        self._message_to_cache[message_part_id] = cache_id
+        self._parts_by_context.setdefault(context_id, []).append(message_part_id)
+        if cache_id in self._files:
+            return
+        file = part.file
+        if (
+            self.spill_bytes
+            and isinstance(file, FileWithBytes)
+            and len(file.bytes) > self.spill_bytes
+        ):
+            # 与 /message/file 返回的内容相同: 图片返回解码后的数据，其它文件返回 base64 文本
+            if 'image' in (file.mimeType or ''):
+                content = base64.b64decode(file.bytes)
+            else:
+                content = file.bytes.encode('utf-8')
+            path = os.path.join(self.directory, cache_id)
+            with open(path, 'wb') as f:
+                f.write(content)
+            self._files[cache_id] = SpilledFile(path, file.mimeType, len(content))
+        else:
+            self._files[cache_id] = part
+
+    def remove_conversation(self, context_id: str) -> None:
+        for message_part_id in self._parts_by_context.pop(context_id, ()):
+            cache_id = self._message_to_cache.pop(message_part_id, None)
+            entry = self._files.pop(cache_id, None)
+            if isinstance(entry, SpilledFile):
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+
+    def stats(self, include_bytes: bool = True) -> dict[str, int]:
+        """include_bytes 为 False 时不估算内存中文件占用的字节数"""
+        files = list(self._files.items())
+        spilled = [entry for _, entry in files if isinstance(entry, SpilledFile)]
+        rval = {
+            'count': len(files),
+            'disk_files': len(spilled),
+            'disk_bytes': sum(entry.size for entry in spilled),
+        }
+        if include_bytes:
+            in_memory = {
+                cache_id: entry
+                for cache_id, entry in files
+                if not isinstance(entry, SpilledFile)
+            }
+            rval['bytes'] = deep_sizeof(in_memory) + deep_sizeof(
+                self._message_to_cache
+            )
+        return rval
+
+    def close(self) -> None:
+        if self._owns_directory:
+            shutil.rmtree(self.directory, ignore_errors=True)
+        else:
+            for entry in self._files.values():
+                if isinstance(entry, SpilledFile):
+                    try:
+                        os.remove(entry.path)
+                    except OSError:
+                        pass
+        self._files.clear()
+        self._message_to_cache.clear()
+        self._parts_by_context.clear()
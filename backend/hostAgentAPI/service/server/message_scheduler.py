@@ -0,0 +1,136 @@
+import asyncio
+import traceback
+
+from collections import deque
+from collections.abc import Awaitable, Callable
+
+from a2a.types import Message
+
+
+class MessageQueueFull(Exception):
+    """排队的消息数量已达到上限"""
+
+
+class MessageScheduler:
+    """在事件循环中处理 /message/send 收到的消息，代替每条消息启动一个线程
+
+    - 最多 max_concurrency 条消息同时处理，其余消息排队，排队数量达到 max_queue 时 submit 抛出 MessageQueueFull
+    - 同一个会话（contextId）的消息按提交顺序逐条处理，上一条处理完才开始下一条
+    - 有消息等待的会话按先来先服务轮流处理，一个会话的大量消息不会让其它会话一直等待
+
+    实现: 每个会话一个消息队列，会话有待处理的消息且没有正在处理的消息时放入 _ready，
+    max_concurrency 个 worker 从 _ready 中取出会话，处理它的下一条消息，处理完后如果该会话还有消息，
+    再放回 _ready 的末尾。同一个会话同时最多在 _ready 中出现一次或被一个 worker 处理。
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[Message], Awaitable[None]],
+        max_concurrency: int = 8,
+        max_queue: int = 100,
+    ):
+        self._handler = handler
+        self.max_concurrency = max(max_concurrency, 1)
+        self.max_queue = max_queue
+        # 会话 id -> 该会话等待处理的消息
+        self._queues: dict[str, deque[Message]] = {}
+        # 等待 worker 处理的会话
+        self._ready: asyncio.Queue[str] | None = None
+        # 正在处理消息的会话 id -> 消息 id
+        self._running: dict[str, str] = {}
+        self._workers: list[asyncio.Task] = []
+        self._queued = 0
+        self.processed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    @property
+    def queue_depth(self) -> int:
+        """等待处理的消息数量（不包括正在处理的消息）"""
+        return self._queued
+
+    def submit(self, message: Message) -> int:
+        """提交一条消息，返回提交后的排队数量，需要在事件循环中调用"""
+        if self.max_queue and self._queued >= self.max_queue:
+            self.rejected += 1
+            raise MessageQueueFull(
+                f'message queue is full ({self._queued}/{self.max_queue})'
+            )
+        self._start()
+        context_id = message.contextId or ''
+        queue = self._queues.get(context_id)
+        if queue is None:
+            queue = self._queues[context_id] = deque()
+            if context_id not in self._running:
+                self._ready.put_nowait(context_id)
+        queue.append(message)
+        self._queued += 1
+        return self._queued
+
+    def queued_message_ids(self) -> list[str]:
+        """还没有开始处理的消息 id，按会话和提交顺序"""
+        return [
+            message.messageId
+            for queue in self._queues.values()
+            for message in queue
+            if message.messageId
+        ]
+
+    def active_conversations(self) -> set[str]:
+        """有消息正在处理或排队的会话 id"""
+        return set(self._queues) | set(self._running)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            'queue_depth': self._queued,
+            'max_queue': self.max_queue,
+            'running': len(self._running),
+            'max_concurrency': self.max_concurrency,
+            'conversations_waiting': len(self._queues),
+            'processed': self.processed,
+            'failed': self.failed,
+            'rejected': self.rejected,
+        }
+
+    async def close(self):
+        """停止所有 worker，正在处理和排队的消息被丢弃"""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def _start(self):
+        if self._workers:
+            return
+        self._ready = asyncio.Queue()
+        for context_id in self._queues:
+            if context_id not in self._running:
+                self._ready.put_nowait(context_id)
+        self._workers = [
+            asyncio.create_task(self._worker())
+            for _ in range(self.max_concurrency)
+        ]
+
+    async def _worker(self):
+        while True:
+            context_id = await self._ready.get()
+            queue = self._queues[context_id]
+            message = queue.popleft()
+            if not queue:
+                del self._queues[context_id]
+            self._queued -= 1
+            self._running[context_id] = message.messageId
+            try:
+                await self._handler(message)
+                self.processed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.failed += 1
+                print(f'处理消息 {message.messageId} 失败:')
+                traceback.print_exc()
+            finally:
+                del self._running[context_id]
+                # 处理期间该会话又收到了消息，排到其它等待的会话后面
+                if context_id in self._queues:
+                    self._ready.put_nowait(context_id)
@@ -1,24 +1,26 @@
 import asyncio
 import base64
 import os
-import threading
+import time
 import uuid
 
-from typing import cast
-
 import httpx
 
 from a2a.types import FilePart, FileWithUri, Message, Part
 from fastapi import FastAPI, Request, Response
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 
 from ..types import (
+    AdminStatsResponse,
     CreateConversationResponse,
     GetEventResponse,
+    JSONRPCError,
     ListAgentResponse,
     ListConversationResponse,
     ListMessageResponse,
     ListTaskResponse,
     MessageInfo,
+    MessageQueueResponse,
     PendingMessageResponse,
     RegisterAgentResponse,
     SendMessageResponse,
@@ -27,7 +29,37 @@ from ..types import (
 
 from .adk_host_manager import ADKHostManager, get_message_id
 from .application_manager import ApplicationManager
+from .file_cache import FileCache, SpilledFile
 from .in_memory_manager import InMemoryFakeAgentManager
+from .message_scheduler import MessageQueueFull, MessageScheduler
+
+# 推送接口没有新事件时发送心跳的间隔（秒）
+STREAM_HEARTBEAT = float(os.environ.get('A2A_STREAM_HEARTBEAT', '15'))
+# 推送接口每次最多从事件日志中读取的事件数量，客户端接收完一批后才读取下一批
+STREAM_BATCH = int(os.environ.get('A2A_STREAM_BATCH', '100'))
+# 同时处理的消息数量
+MESSAGE_CONCURRENCY = int(os.environ.get('A2A_MESSAGE_CONCURRENCY', '8'))
+# 最多排队等待处理的消息数量，超过后 /message/send 返回 429，0 表示不限制
+MESSAGE_MAX_QUEUE = int(os.environ.get('A2A_MESSAGE_MAX_QUEUE', '100'))
+# 每隔多少秒按保留策略淘汰不活跃的会话
+RETENTION_INTERVAL = float(os.environ.get('A2A_RETENTION_INTERVAL', '300'))
+# 超过该大小（base64 字符数）的文件写入磁盘，内存中只保存路径
+FILE_SPILL_BYTES = int(os.environ.get('A2A_FILE_SPILL_BYTES', str(256 * 1024)))
+# /admin/stats 中估算的内存字节数缓存的秒数，估算需要遍历所有数据，在线程中进行；数量每次都重新统计
+STATS_BYTES_TTL = float(os.environ.get('A2A_STATS_BYTES_TTL', '60'))
+
+
+def parse_non_negative_int(value, name: str) -> int:
+    """解析请求参数中的非负整数（整数或数字字符串），不合法时抛出 ValueError"""
+    if isinstance(value, (int, str)) and not isinstance(value, bool):
+        try:
+            number = int(value)
+        except ValueError:
+            number = -1
+        if number >= 0:
+            return number
+    raise ValueError(f'{name} must be a non-negative integer, got {value!r}')
+
 
 class ConversationServer:
     """ConversationServer is the backend to serve the agent interactions in the UI
@@ -51,8 +83,21 @@ class ConversationServer:
             api_key=api_key,
             uses_vertex_ai=uses_vertex_ai,
         )
-        self._file_cache = {}  # dict[str, FilePart] maps file id to message data
-        self._message_to_cache = {}  # dict[str, str] maps message id to cache id
+        # maps file id to message data, large files are kept on disk
+        self._file_cache = FileCache(
+            os.environ.get('A2A_FILE_CACHE_DIR'), spill_bytes=FILE_SPILL_BYTES
+        )
+        # 消息在事件循环中处理，同一个会话的消息按顺序处理
+        self._scheduler = MessageScheduler(
+            self.manager.process_message,
+            max_concurrency=MESSAGE_CONCURRENCY,
+            max_queue=MESSAGE_MAX_QUEUE,
+        )
+        self._retention_task = asyncio.create_task(self._retention_loop())
+        # 最近一次估算的内存字节数和估算时间
+        self._memory_bytes: dict[str, int] = {}
+        self._memory_bytes_at: float | None = None
+        self._memory_bytes_lock = asyncio.Lock()
 
         app.add_api_route(
             '/conversation/create', self._create_conversation, methods=['POST']
@@ -61,6 +106,9 @@ class ConversationServer:
             '/conversation/list', self._list_conversation, methods=['POST']
         )
         app.add_api_route('/message/send', self._send_message, methods=['POST'])
+        app.add_api_route(
+            '/message/queue', self._message_queue, methods=['POST']
+        )
         app.add_api_route('/events/get', self._get_events, methods=['POST'])
         app.add_api_route(
             '/message/list', self._list_messages, methods=['POST']
@@ -81,19 +129,87 @@ class ConversationServer:
         )
         # 新增
         app.add_api_route("/events/query",self._query_events,methods=["POST"])
+        app.add_api_route('/admin/stats', self._admin_stats, methods=['GET'])
+        app.add_api_route(
+            '/conversation/{conversation_id}/stream',
+            self._stream_conversation,
+            methods=['GET'],
+        )
+
+    async def _stream_conversation(
+        self, conversation_id: str, request: Request, since: int = 0
+    ):
+        """以 SSE 推送会话的事件，不再需要轮询 /events/query
+
+        每个事件的 id 为它在会话事件日志中的序号，断线重连时浏览器会带上 Last-Event-ID，
+        从该序号之后继续推送（也可以用 since 参数指定）。没有新事件时每隔 STREAM_HEARTBEAT 秒
+        发送一次心跳注释。事件只保存在会话的事件日志中，每次读取一批，客户端接收慢时发送会阻塞，
+        不会为每个连接缓存事件。
+        """
+        last_event_id = request.headers.get('last-event-id', '')
+        if last_event_id.isdigit():
+            since = int(last_event_id)
+        loop = asyncio.get_running_loop()
+        wakeup = asyncio.Event()
+        # 事件可能在其它线程中添加，通过事件循环唤醒
+        unsubscribe = self.manager.subscribe_events(
+            conversation_id, lambda: loop.call_soon_threadsafe(wakeup.set)
+        )
+
+        async def event_stream():
+            cursor = since
+            try:
+                yield 'retry: 3000\n\n'
+                while True:
+                    wakeup.clear()
+                    events, next_cursor = self.manager.query_events(
+                        conversation_id, cursor, STREAM_BATCH
+                    )
+                    if events:
+                        first = next_cursor - len(events)
+                        yield ''.join(
+                            f'id: {first + offset}\nevent: event\ndata: {event.model_dump_json()}\n\n'
+                            for offset, event in enumerate(events, 1)
+                        )
+                        cursor = next_cursor
+                        continue
+                    if await request.is_disconnected():
+                        break
+                    try:
+                        await asyncio.wait_for(wakeup.wait(), timeout=STREAM_HEARTBEAT)
+                    except asyncio.TimeoutError:
+                        yield ': heartbeat\n\n'
+            finally:
+                unsubscribe()
+
+        return StreamingResponse(
+            event_stream(),
+            media_type='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+        )
 
     # 新增
     async def _query_events(self, request: Request):
+        """查询会话的事件，since 为上一次返回的 next_since，只返回之后的新事件；limit 限制返回的数量"""
         data = await request.json()
-        conversation_id = data['params'].get("conversation_id")
-        # 过滤出属于该 conversation_id 的事件
-        events = []
-        for event in self.manager.events:
-            event_content = event.content
-            if hasattr(event_content, 'contextId') and event_content.contextId == conversation_id:
-                events.append(event)
-        print(f"过滤出属于该 conversation_id {conversation_id} 的事件数量: {len(events)}")
-        return QueryEventResponse(result=events)
+        params = data['params']
+        conversation_id = params.get("conversation_id")
+        try:
+            since = parse_non_negative_int(params.get("since") or 0, 'since')
+            limit = params.get("limit")
+            if limit is not None:
+                limit = parse_non_negative_int(limit, 'limit')
+        except ValueError as e:
+            # 与 /message/send 一样返回 JSON-RPC 错误，-32602 为参数不合法
+            response = QueryEventResponse(
+                error=JSONRPCError(code=-32602, message=str(e))
+            )
+            return JSONResponse(
+                status_code=400, content=response.model_dump(mode='json')
+            )
+        events, next_since = self.manager.query_events(conversation_id, since, limit)
+        print(f"conversation_id {conversation_id} 在 {since} 之后的事件数量: {len(events)}")
+        return QueryEventResponse(result=events, next_since=next_since)
 
     # Update API key in manager
     def update_api_key(self, api_key: str):
@@ -107,26 +223,38 @@ class ConversationServer:
             data = {}
         conversation_id = data.get('conversation_id')
         c = await self.manager.create_conversation(conversation_id=conversation_id)
+        # 会话数量超过上限时立即淘汰最久没有活动的会话
+        await self.compact()
         return CreateConversationResponse(result=c)
 
     async def _send_message(self, request: Request):
         message_data = await request.json()
         message = Message(**message_data['params'])
+        # 会话不存在或已被淘汰时拒绝，否则处理消息时找不到 ADK session
+        if not message.contextId or not self.manager.get_conversation(
+            message.contextId
+        ):
+            response = SendMessageResponse(
+                error=JSONRPCError(
+                    code=-32001,
+                    message=f'conversation {message.contextId} not found'
+                    if message.contextId
+                    else 'contextId is required',
+                )
+            )
+            return JSONResponse(
+                status_code=404, content=response.model_dump(mode='json')
+            )
         message = self.manager.sanitize_message(message)
-        loop = asyncio.get_event_loop()
-        if isinstance(self.manager, ADKHostManager):
-            t = threading.Thread(
-                target=lambda: cast(
-                    ADKHostManager, self.manager
-                ).process_message_threadsafe(message, loop)
+        try:
+            self._scheduler.submit(message)
+        except MessageQueueFull as e:
+            response = SendMessageResponse(
+                error=JSONRPCError(code=-32000, message=str(e))
             )
-        else:
-            t = threading.Thread(
-                target=lambda: asyncio.run(
-                    self.manager.process_message(message)
-                )
+            return JSONResponse(
+                status_code=429, content=response.model_dump(mode='json')
             )
-        t.start()
         return SendMessageResponse(
             result=MessageInfo(
                 message_id=message.messageId,
@@ -158,11 +286,12 @@ class ConversationServer:
                     new_parts.append(p)
                     continue
                 message_part_id = f'{message_id}:{i}'
-                if message_part_id in self._message_to_cache:
-                    cache_id = self._message_to_cache[message_part_id]
-                else:
+                cache_id = self._file_cache.cache_id(message_part_id)
+                if cache_id is None:
                     cache_id = str(uuid.uuid4())
-                    self._message_to_cache[message_part_id] = cache_id
+                    self._file_cache.put(
+                        message_part_id, cache_id, part, m.contextId or ''
+                    )
                 # Replace the part data with a url reference
                 new_parts.append(
                     Part(
@@ -174,15 +303,86 @@ class ConversationServer:
                         )
                     )
                 )
-                if cache_id not in self._file_cache:
-                    self._file_cache[cache_id] = part
             m.parts = new_parts
             rval.append(m)
         return rval
 
+    async def _message_queue(self):
+        """消息队列的状态: 排队数量、正在处理的数量、拒绝的数量等"""
+        return MessageQueueResponse(result=self._scheduler.stats())
+
+    async def compact(self) -> list[str]:
+        """按保留策略淘汰不活跃的会话，有消息正在处理或排队的会话不淘汰"""
+        evicted = await self.manager.compact(
+            self._scheduler.active_conversations()
+        )
+        for context_id in evicted:
+            self._file_cache.remove_conversation(context_id)
+        return evicted
+
+    async def _retention_loop(self):
+        while True:
+            await asyncio.sleep(RETENTION_INTERVAL)
+            try:
+                await self.compact()
+            except Exception as e:
+                print(f"淘汰会话失败: {e}")
+
+    def _collect_stats(self, include_bytes: bool = True):
+        stats = self.manager.stats(include_bytes)
+        stats['file_cache'] = self._file_cache.stats(include_bytes)
+        return stats
+
+    async def _estimate_memory_bytes(self) -> tuple[dict[str, int], float]:
+        """返回每种数据估算的内存字节数和估算距今的秒数
+
+        估算需要递归遍历所有消息、任务、事件和 ADK session，耗时与保留的数据量成正比，
+        在线程中进行，结果缓存 STATS_BYTES_TTL 秒，同时只有一个估算在进行
+        """
+        async with self._memory_bytes_lock:
+            if (
+                self._memory_bytes_at is None
+                or time.monotonic() - self._memory_bytes_at >= STATS_BYTES_TTL
+            ):
+                stats = await asyncio.to_thread(self._collect_stats)
+                self._memory_bytes = {
+                    name: value['bytes']
+                    for name, value in stats.items()
+                    if 'bytes' in value
+                }
+                self._memory_bytes_at = time.monotonic()
+        return self._memory_bytes, time.monotonic() - self._memory_bytes_at
+
+    async def _admin_stats(self):
+        """每种数据的数量和估算的内存字节数，以及文件缓存和消息队列的状态
+
+        数量每次都重新统计，字节数使用最近一次估算的结果（memory_estimate.age 为估算距今的秒数）
+        """
+        stats = self._collect_stats(include_bytes=False)
+        memory_bytes, age = await self._estimate_memory_bytes()
+        for name, value in memory_bytes.items():
+            if name in stats:
+                stats[name]['bytes'] = value
+        stats['message_queue'] = self._scheduler.stats()
+        stats['memory_estimate'] = {
+            'age': int(age),
+            'ttl': int(STATS_BYTES_TTL),
+        }
+        return AdminStatsResponse(result=stats)
+
+    async def close(self):
+        self._retention_task.cancel()
+        await self._scheduler.close()
+        self._file_cache.close()
+
     async def _pending_messages(self):
+        # 还在排队的消息还没有进入 manager，也算作未处理完成
+        queued = [
+            (message_id, 'Queued...')
+            for message_id in self._scheduler.queued_message_ids()
+        ]
         return PendingMessageResponse(
-            result=self.manager.get_pending_messages()
+            result=queued + self.manager.get_pending_messages()
         )
 
     def _list_conversation(self):
@@ -204,9 +404,11 @@ class ConversationServer:
         return ListAgentResponse(result=self.manager.agents)
 
     def _files(self, file_id):
-        if file_id not in self._file_cache:
+        part = self._file_cache.get(file_id)
+        if part is None:
             raise Exception('file not found')
-        part = self._file_cache[file_id]
+        if isinstance(part, SpilledFile):
+            return FileResponse(part.path, media_type=part.mime_type)
         if 'image' in part.file.mimeType:
             return Response(
                 content=base64.b64decode(part.file.bytes),
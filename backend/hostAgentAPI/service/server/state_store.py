@@ -0,0 +1,286 @@
+import sys
+import time
+
+from collections import OrderedDict
+from collections.abc import Callable, Iterable
+
+from a2a.types import Message, Task
+from pydantic import BaseModel
+
+from ..types import Conversation, Event
+
+
+class EventLog:
+    """一个会话的事件日志，只追加，每个事件按追加顺序得到递增的序号（从 1 开始）
+
+    查询 since 之后的事件时直接按序号切片，耗时只与新事件的数量有关。
+    """
+
+    def __init__(self):
+        self._events: list[Event] = []
+        # 日志中第一个事件之前的序号
+        self._base = 0
+
+    @property
+    def last_seq(self) -> int:
+        """最后一个事件的序号，没有事件时为 0"""
+        return self._base + len(self._events)
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    def append(self, event: Event) -> int:
+        self._events.append(event)
+        return self.last_seq
+
+    def trim(self, keep: int) -> list[Event]:
+        """只保留最新的 keep 个事件，返回删除的事件，保留的事件序号不变"""
+        if len(self._events) <= keep:
+            return []
+        removed = self._events[: len(self._events) - keep]
+        del self._events[: len(removed)]
+        self._base += len(removed)
+        return removed
+
+    def since(
+        self, cursor: int = 0, limit: int | None = None
+    ) -> tuple[list[Event], int]:
+        """返回序号大于 cursor 的事件（最多 limit 个）和下一次查询使用的 cursor
+
+        cursor 大于最后一个事件的序号时（例如服务重启后客户端仍使用旧的 cursor），从头返回；
+        cursor 之后的事件已经被 trim 删除时，从保留的第一个事件开始返回。
+        """
+        if cursor > self.last_seq:
+            cursor = 0
+        start = max(cursor - self._base, 0)
+        end = len(self._events) if limit is None else start + max(limit, 0)
+        events = self._events[start:end]
+        return events, self._base + start + len(events)
+
+
+class HostStateStore:
+    """会话、消息、任务、事件的内存存储，按 id 建立索引
+
+    以前这些数据都保存在列表中，每次按 id 查找都要遍历整个列表，远程 Agent 的每个流式状态更新
+    （task_callback）的耗时随任务数量线性增长。这里改为以 id 为键的字典（保持插入顺序），
+    并按会话 id（contextId）建立任务和事件的二级索引，查找、更新都是 O(1)。
+
+    每个会话记录最后一次活动的时间（按活动顺序排列），evictable_conversations 按 TTL 和会话数量上限
+    选出需要淘汰的会话，remove_conversation 删除会话及其消息、任务、事件。
+    :param max_events_per_conversation: 每个会话最多保留的事件数量，超过后删除最早的事件，0 表示不限制
+    """
+
+    def __init__(self, max_events_per_conversation: int = 0):
+        self.max_events_per_conversation = max_events_per_conversation
+        self.conversations: dict[str, Conversation] = {}
+        # 消息 id -> 消息
+        self.messages: dict[str, Message] = {}
+        # 任务 id -> 任务
+        self.tasks: dict[str, Task] = {}
+        # 事件 id -> 事件
+        self.events: dict[str, Event] = {}
+        # 会话 id -> 该会话的任务 id（字典当作有序集合使用）
+        self.tasks_by_context: dict[str, dict[str, None]] = {}
+        # 会话 id -> 该会话的消息 id
+        self.messages_by_context: dict[str, dict[str, None]] = {}
+        # 会话 id -> 最后一次活动的时间，最久没有活动的会话在最前面
+        self.last_active: OrderedDict[str, float] = OrderedDict()
+        # 会话 id -> 该会话的事件日志
+        self.event_logs: dict[str, EventLog] = {}
+        # 会话 id -> 有新事件时调用的函数（事件推送的订阅者）
+        self._listeners: dict[str, set[Callable[[], None]]] = {}
+
+    # ---------- 会话 ----------
+    def touch(self, context_id: str | None) -> None:
+        """记录会话的活动"""
+        if not context_id:
+            return
+        self.last_active[context_id] = time.time()
+        self.last_active.move_to_end(context_id)
+
+    def add_conversation(self, conversation: Conversation) -> Conversation:
+        self.conversations[conversation.conversation_id] = conversation
+        self.touch(conversation.conversation_id)
+        return conversation
+
+    def get_conversation(
+        self, conversation_id: str | None
+    ) -> Conversation | None:
+        if not conversation_id:
+            return None
+        return self.conversations.get(conversation_id)
+
+    # ---------- 消息 ----------
+    def add_message(self, message: Message) -> None:
+        self.messages[message.messageId] = message
+        if message.contextId:
+            self.messages_by_context.setdefault(message.contextId, {})[
+                message.messageId
+            ] = None
+            self.touch(message.contextId)
+
+    def get_message(self, message_id: str | None) -> Message | None:
+        if not message_id:
+            return None
+        return self.messages.get(message_id)
+
+    # ---------- 任务 ----------
+    def get_task(self, task_id: str | None) -> Task | None:
+        if not task_id:
+            return None
+        return self.tasks.get(task_id)
+
+    def add_task(self, task: Task) -> None:
+        self.tasks[task.id] = task
+        if task.contextId:
+            self.tasks_by_context.setdefault(task.contextId, {})[task.id] = None
+            self.touch(task.contextId)
+
+    def update_task(self, task: Task) -> bool:
+        """替换已有的同 id 任务，任务不存在时不添加，返回是否替换"""
+        if task.id not in self.tasks:
+            return False
+        self.tasks[task.id] = task
+        self.touch(task.contextId)
+        return True
+
+    def tasks_for_conversation(self, context_id: str) -> list[Task]:
+        return [
+            self.tasks[task_id]
+            for task_id in self.tasks_by_context.get(context_id, ())
+            if task_id in self.tasks
+        ]
+
+    # ---------- 事件 ----------
+    def add_event(self, event: Event) -> None:
+        is_new = event.id not in self.events
+        self.events[event.id] = event
+        context_id = event.content.contextId
+        if context_id and is_new:
+            log = self.event_logs.setdefault(context_id, EventLog())
+            log.append(event)
+            if self.max_events_per_conversation:
+                for removed in log.trim(self.max_events_per_conversation):
+                    self.events.pop(removed.id, None)
+            self.touch(context_id)
+            for listener in tuple(self._listeners.get(context_id, ())):
+                listener()
+
+    def subscribe(
+        self, context_id: str, listener: Callable[[], None]
+    ) -> Callable[[], None]:
+        """会话有新事件时调用 listener（不传参数），返回取消订阅的函数"""
+        self._listeners.setdefault(context_id, set()).add(listener)
+
+        def unsubscribe():
+            listeners = self._listeners.get(context_id)
+            if listeners is not None:
+                listeners.discard(listener)
+                if not listeners:
+                    del self._listeners[context_id]
+
+        return unsubscribe
+
+    def query_events(
+        self, context_id: str, since: int = 0, limit: int | None = None
+    ) -> tuple[list[Event], int]:
+        """会话中序号大于 since 的事件和下一次查询使用的 cursor"""
+        log = self.event_logs.get(context_id)
+        if log is None:
+            # 会话还没有事件，之后的第一个事件序号为 1
+            return [], 0
+        return log.since(since, limit)
+
+    # ---------- 淘汰 ----------
+    def evictable_conversations(
+        self,
+        max_conversations: int = 0,
+        ttl: float = 0,
+        protected: Iterable[str] = (),
+        now: float | None = None,
+    ) -> list[str]:
+        """需要淘汰的会话 id，按最后一次活动的时间从早到晚
+
+        超过 ttl 秒没有活动的会话都需要淘汰；之后会话数量仍超过 max_conversations 时，再淘汰最久没有活动的会话。
+        protected 中的会话（例如正在处理消息、有客户端订阅事件的会话）不淘汰。ttl、max_conversations 为 0 表示不限制。
+        """
+        now = time.time() if now is None else now
+        protected = set(protected) | set(self._listeners)
+        remaining = len(self.last_active)
+        evict = []
+        for context_id, last_active in self.last_active.items():
+            expired = ttl and now - last_active > ttl
+            if not expired and (not max_conversations or remaining <= max_conversations):
+                # 按活动时间排序，后面的会话都不需要淘汰
+                break
+            if context_id in protected:
+                continue
+            evict.append(context_id)
+            remaining -= 1
+        return evict
+
+    def remove_conversation(self, context_id: str) -> tuple[list[Message], list[Task]]:
+        """删除会话及其消息、任务、事件，返回删除的消息和任务（调用方清理与它们关联的其它数据）"""
+        self.conversations.pop(context_id, None)
+        self.last_active.pop(context_id, None)
+        messages = [
+            self.messages.pop(message_id)
+            for message_id in self.messages_by_context.pop(context_id, ())
+            if message_id in self.messages
+        ]
+        tasks = [
+            self.tasks.pop(task_id)
+            for task_id in self.tasks_by_context.pop(context_id, ())
+            if task_id in self.tasks
+        ]
+        log = self.event_logs.pop(context_id, None)
+        if log is not None:
+            for event in log.since(0)[0]:
+                self.events.pop(event.id, None)
+        return messages, tasks
+
+    def stats(self, include_bytes: bool = True) -> dict[str, dict[str, int]]:
+        """每种数据的数量和估算的内存字节数（事件日志与 events 共用事件对象，不重复计算）
+
+        估算字节数需要遍历所有数据，include_bytes 为 False 时只统计数量
+        """
+        return {
+            'conversations': size_stats(self.conversations, include_bytes),
+            'messages': size_stats(self.messages, include_bytes),
+            'tasks': size_stats(self.tasks, include_bytes),
+            'events': size_stats(self.events, include_bytes),
+            'event_logs': {'count': len(self.event_logs)},
+            'listeners': {'count': sum(map(len, self._listeners.values()))},
+        }
+
+
+def deep_sizeof(obj, seen: set[int] | None = None) -> int:
+    """递归估算对象占用的内存字节数，同一个对象只计算一次
+
+    可以在其它线程中调用: 遍历前先复制容器，事件循环同时修改数据时不会因为大小变化而报错
+    """
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, (str, bytes, bytearray, int, float, bool)) or obj is None:
+        return size
+    if isinstance(obj, dict):
+        for key, value in list(obj.items()):
+            size += deep_sizeof(key, seen) + deep_sizeof(value, seen)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        for item in tuple(obj):
+            size += deep_sizeof(item, seen)
+    elif isinstance(obj, BaseModel):
+        size += deep_sizeof(obj.__dict__, seen)
+    elif hasattr(obj, '__dict__'):
+        size += deep_sizeof(vars(obj), seen)
+    return size
+
+
+def size_stats(store: dict, include_bytes: bool = True) -> dict[str, int]:
+    if not include_bytes:
+        return {'count': len(store)}
+    return {'count': len(store), 'bytes': deep_sizeof(store)}
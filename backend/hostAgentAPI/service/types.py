@@ -70,6 +70,14 @@ class SendMessageResponse(JSONRPCResponse):
     result: Message | MessageInfo | None = None
 
 
+class MessageQueueResponse(JSONRPCResponse):
+    result: dict[str, int] | None = None
+
+
+class AdminStatsResponse(JSONRPCResponse):
+    result: dict[str, dict[str, int]] | None = None
+
+
 class GetEventRequest(JSONRPCRequest):
     method: Literal['events/get'] = 'events/get'
 
@@ -156,3 +164,5 @@ class AgentClientJSONError(AgentClientError):
 #自定义的类型
 class QueryEventResponse(JSONRPCResponse):
     result: list[Event] | None = None
+    # 下一次查询时作为 since 传入，只返回之后的新事件
+    next_since: int = 0
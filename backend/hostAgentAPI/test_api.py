@@ -170,6 +170,26 @@ class ConversationServerTestCase(unittest.TestCase):
         print(f"/message/send 测试花费时间: {time.time() - start_time}秒")
         self.sent_message_id = res["result"]["message_id"]
 
+    def test_send_message_unknown_conversation(self):
+        """
+        测试 /message/send 发送到不存在（或已被淘汰）的会话时返回 404 和 JSON-RPC 错误
+        """
+        url = f"{self.base_url}/message/send"
+        message_payload = {
+            "params": {
+                "role": "user",
+                "parts": [{"type": "text", "text": "你好"}],
+                "messageId": uuid.uuid4().hex,
+                "contextId": uuid.uuid4().hex,
+            }
+        }
+        response = requests.post(url, json=message_payload)
+        self.assertEqual(response.status_code, 404, f"/message/send 接口状态码应为 404，但实际为 {response.status_code}")
+        res = response.json()
+        print(json.dumps(res, indent=2, ensure_ascii=False))
+        self.assertIsNone(res.get("result"), "会话不存在时不应返回 result")
+        self.assertEqual(res["error"]["code"], -32001)
+
     def test_list_messages(self):
         """
         测试 /message/list 接口
@@ -268,6 +288,36 @@ class ConversationServerTestCase(unittest.TestCase):
         assert res.get("error") is None, "错误不为空，请检查"
         assert res.get("result"), "返回的结果为空，请检查数据"
         print(f"/events/query 测试花费时间: {time.time() - start_time}秒")
+
+    def test_query_events_since(self):
+        """
+        测试按 cursor 增量查询事件: 使用返回的 next_since 再次查询，只返回之后的新事件
+        """
+        conversation_id = "d11e4c53-12b1-4f22-b9d3-8fdc5ed98fc7"
+        url = f"{self.base_url}/events/query"
+        start_time = time.time()
+        response = requests.post(url, json={"params": {"conversation_id": conversation_id, "limit": 1}})
+        self.assertEqual(response.status_code, 200, f"/events/query 接口状态码应为 200，但实际为 {response.status_code}")
+        res = response.json()
+        self.assertLessEqual(len(res["result"]), 1, "limit 为 1 时最多返回 1 个事件")
+        self.assertEqual(res["next_since"], len(res["result"]), "第一次查询的 next_since 应为返回的事件数量")
+        response = requests.post(url, json={"params": {"conversation_id": conversation_id, "since": res["next_since"]}})
+        res2 = response.json()
+        self.assertGreaterEqual(res2["next_since"], res["next_since"], "next_since 应该递增")
+        self.assertEqual(len(res2["result"]), res2["next_since"] - res["next_since"], "只返回 since 之后的事件")
+        print(f"/events/query since 测试花费时间: {time.time() - start_time}秒")
+
+    def test_query_events_invalid_cursor(self):
+        """
+        测试 since、limit 不是非负整数时 /events/query 返回 400 和 JSON-RPC 错误
+        """
+        conversation_id = "d11e4c53-12b1-4f22-b9d3-8fdc5ed98fc7"
+        url = f"{self.base_url}/events/query"
+        for params in ({"since": "abc"}, {"since": -1}, {"limit": "ten"}):
+            response = requests.post(url, json={"params": {"conversation_id": conversation_id, **params}})
+            self.assertEqual(response.status_code, 400, f"{params} 时状态码应为 400，但实际为 {response.status_code}")
+            self.assertEqual(response.json()["error"]["code"], -32602)
+
     def test_list_tasks(self):
         """
         测试 /task/list 接口
@@ -284,6 +334,36 @@ class ConversationServerTestCase(unittest.TestCase):
         self.assertIsInstance(res["result"], list, "/task/list 接口返回值 'result' 应为列表")
         print(f"/task/list 测试花费时间: {time.time() - start_time}秒")
 
+    def test_message_queue(self):
+        """
+        测试 /message/queue 接口
+        """
+        url = f"{self.base_url}/message/queue"
+        response = requests.post(url)
+        self.assertEqual(response.status_code, 200, f"/message/queue 接口状态码应为 200，但实际为 {response.status_code}")
+        res = response.json()
+        print(f"message queue: 消息队列的状态")
+        print(json.dumps(res, indent=2, ensure_ascii=False))
+        self.assertIn("result", res, "/message/queue 接口返回值应包含 'result' 字段")
+        for key in ("queue_depth", "max_queue", "running", "max_concurrency", "rejected"):
+            self.assertIn(key, res["result"], f"/message/queue 接口返回值应包含 '{key}' 字段")
+        self.assertLessEqual(res["result"]["running"], res["result"]["max_concurrency"], "正在处理的消息数量不应超过并发上限")
+
+    def test_admin_stats(self):
+        """
+        测试 /admin/stats 接口
+        """
+        url = f"{self.base_url}/admin/stats"
+        response = requests.get(url)
+        self.assertEqual(response.status_code, 200, f"/admin/stats 接口状态码应为 200，但实际为 {response.status_code}")
+        res = response.json()
+        print(f"admin stats: 各项数据占用的内存")
+        print(json.dumps(res, indent=2, ensure_ascii=False))
+        self.assertIn("result", res, "/admin/stats 接口返回值应包含 'result' 字段")
+        for key in ("conversations", "messages", "tasks", "events", "file_cache", "message_queue"):
+            self.assertIn(key, res["result"], f"/admin/stats 接口返回值应包含 '{key}' 字段")
+        self.assertIn("bytes", res["result"]["events"], "events 应包含估算的内存字节数 'bytes'")
+
     def test_update_api_key(self):
         """
         测试 /api_key/update 接口
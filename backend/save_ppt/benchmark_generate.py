@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Date  : 2026/10/17
+# @File  : benchmark_generate.py
+# @Author: johnson
+# @Contact : github: johnson7788
+# @Desc  : /generate-ppt 接口的吞吐量压测，对比模板缓存前后每秒能生成的 PPT 数量
+"""
+不需要启动服务，生成的内容不包含图片，不访问网络，不使用生成结果缓存和片段缓存:
+python benchmark_generate.py --requests 50                          # 在当前进程中直接生成，使用模板注册表
+python benchmark_generate.py --requests 50 --legacy                 # 旧版行为，每次请求重新解析模板
+python benchmark_generate.py --requests 50 --api --concurrency 4    # 通过 TestClient 并发调用 /generate-ppt，由 worker 进程生成
+"""
+
+import argparse
+import contextlib
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi.testclient import TestClient
+
+import main_api
+import ppt_generator
+from template_registry import TemplateRegistry
+
+
+class LegacyTemplateRegistry(TemplateRegistry):
+    """旧版行为: 每次请求都重新读取并解析模板，用于对比"""
+
+    def get(self, template_path, slide_layouts):
+        return self._load(template_path, os.path.getmtime(template_path), slide_layouts)
+
+
+def build_deck(num_sections: int, title: str = "Benchmark Deck") -> dict:
+    """生成不包含图片的测试数据，每个章节一个标题和三个要点"""
+    sections = []
+    for idx in range(num_sections):
+        bullets = [
+            {"type": "bullet", "children": [
+                {"type": "h3", "children": [{"text": f"要点 {idx}-{item}"}]},
+                {"type": "p", "children": [{"text": f"第 {idx} 章第 {item} 个要点的详细说明，包含中英文混合的内容 mixed text。"}]},
+            ]}
+            for item in range(3)
+        ]
+        sections.append({
+            "id": f"section-{idx}",
+            "content": [
+                {"type": "h1", "children": [{"text": title if idx == 0 else f"第 {idx} 章"}]},
+                {"type": "bullets", "children": bullets},
+            ],
+        })
+    return {"sections": sections, "references": [f"参考文献 {idx}: https://example.com/{idx}" for idx in range(6)]}
+
+
+def output_dir() -> str:
+    return os.path.join(os.path.dirname(os.path.abspath(ppt_generator.__file__)), "output_ppts")
+
+
+def run_in_process(deck: dict, num_requests: int) -> list:
+    latencies = []
+    for _ in range(num_requests):
+        request_start = time.perf_counter()
+        output_path = ppt_generator.start_generate_presentation(deck)
+        if not output_path:
+            raise RuntimeError("PPT 生成失败")
+        latencies.append(time.perf_counter() - request_start)
+    os.remove(output_path)
+    return latencies
+
+
+def run_api(num_sections: int, num_requests: int, concurrency: int) -> tuple:
+    """返回每次请求的耗时和命中生成结果缓存的请求数"""
+    def one_request(client, title):
+        # 每次请求的标题不同，内容也不同，不会命中生成结果缓存
+        deck = build_deck(num_sections, title=title)
+        request_start = time.perf_counter()
+        response = client.post("/generate-ppt", json=deck)
+        response.raise_for_status()
+        return time.perf_counter() - request_start, response.json()
+
+    # 进入 with 时执行 lifespan，启动 worker 进程
+    with TestClient(main_api.app) as client:
+        warmup = one_request(client, "Benchmark Deck warmup")  # 等待 worker 进程启动完成
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(lambda idx: one_request(client, f"Benchmark Deck {idx}"), range(num_requests)))
+    for _, content in results + [warmup]:
+        output_path = os.path.join(output_dir(), os.path.basename(content["ppt_url"]))
+        if os.path.exists(output_path):
+            os.remove(output_path)
+    cache_hits = sum(1 for _, content in results if content.get("cached"))
+    return [latency for latency, _ in results], cache_hits
+
+
+def main(args):
+    if args.legacy:
+        ppt_generator.template_registry = LegacyTemplateRegistry()
+    if not args.verbose:
+        logging.disable(logging.CRITICAL)
+    # 每次请求的章节内容相同，片段缓存会让除第一次以外的请求都跳过幻灯片生成，压测时关闭；
+    # worker 进程以 spawn 方式启动，导入 slide_fragments 时读取环境变量
+    ppt_generator.fragment_cache = None
+    os.environ["PPT_FRAGMENT_CACHE"] = "0"
+
+    cache_hits = None
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull if not args.verbose else None):
+        start = time.perf_counter()
+        if args.api:
+            latencies, cache_hits = run_api(args.sections, args.requests, args.concurrency)
+        else:
+            latencies = run_in_process(build_deck(args.sections), args.requests)
+        elapsed = time.perf_counter() - start
+    logging.disable(logging.NOTSET)
+
+    latencies.sort()
+    report = {
+        "mode": ("api" if args.api else "in_process") + ("_legacy" if args.legacy else ""),
+        "requests": args.requests,
+        "concurrency": args.concurrency if args.api else 1,
+        "sections": args.sections,
+        "elapsed": round(elapsed, 3),
+        "requests_per_sec": round(args.requests / elapsed, 2),
+        "latency_p50": round(latencies[len(latencies) // 2], 4),
+        "latency_p99": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))], 4),
+    }
+    if cache_hits is not None:
+        # 应该为 0，不为 0 说明有请求直接返回了已生成的文件，吞吐量偏高
+        report["render_cache_hits"] = cache_hits
+    print(json.dumps(report, ensure_ascii=False))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存到 {args.output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="/generate-ppt 吞吐量压测")
+    parser.add_argument("--requests", type=int, default=50, help="请求次数")
+    parser.add_argument("--sections", type=int, default=4, help="每个PPT的章节数")
+    parser.add_argument("--legacy", action="store_true", help="每次请求重新解析模板（旧版行为），只对进程内生成有效")
+    parser.add_argument("--api", action="store_true", help="通过 /generate-ppt 接口生成，由 worker 进程池处理")
+    parser.add_argument("--concurrency", type=int, default=4, help="--api 模式下的并发请求数")
+    parser.add_argument("--verbose", action="store_true", help="保留生成过程中的日志输出")
+    parser.add_argument("--output", help="把结果保存为 JSON 文件")
+    main(parser.parse_args())
@@ -0,0 +1,426 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Date  : 2026/10/17
+# @File  : benchmark_render.py
+# @Author: johnson
+# @Contact : github: johnson7788
+# @Desc  : PPT 生成的基准测试和性能分析，按页面类型统计耗时、内存峰值和输出大小，结果为 JSON
+"""
+benchmark_generate.py 只统计每秒生成的 PPT 数量，test_api.py 需要启动服务。这个脚本不需要启动服务，也不访问网络:
+1. 合成 10、50、200 个章节的PPT，覆盖生成器用到的所有页面类型（标题、内容、子章节、图片、参考文献、结束页），
+   图片为本地生成的测试图片（照片、带透明通道的图、宽图、长图），预先放入临时的图片缓存
+2. 每个PPT生成 --repeat 次，统计总耗时、每种页面（策略）的耗时、保存文件的耗时，
+   第一次生成需要压缩图片（cold_seconds），之后命中图片压缩结果缓存；再用 tracemalloc 冷启动生成一次，
+   统计整体和每种页面的内存峰值（只包含 Python 分配的内存，不包含 Pillow 解码图片的缓冲区）；
+   输出大小按页面类型统计 zip 中压缩后的字节数，多页共用的图片计入第一次使用它的页面
+3. 逐个策略单独生成 --slides-per-strategy 页（包括生成器没有用到的目录页），统计每页的耗时、内存峰值和大小
+4. --profile cprofile|pyinstrument 对最大的PPT单独生成一次并保存分析结果，用于查找热点
+
+python benchmark_render.py                                   # 10、50、200 个章节，结果输出为一行 JSON
+python benchmark_render.py --sections 10 50 --repeat 5 --output bench.json
+python benchmark_render.py --profile cprofile                # 保存为 profile_render.prof，打印耗时最多的函数
+python benchmark_render.py --profile pyinstrument            # 需要 pip install pyinstrument，保存为 HTML
+python benchmark_render.py --fragment-cache                  # 开启章节片段缓存，对比重复生成的耗时
+"""
+
+import argparse
+import contextlib
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+import zipfile
+from collections import defaultdict
+from io import BytesIO
+from typing import Any, Callable, Dict, List, Optional
+
+from PIL import Image
+
+import ppt_generator
+from image_cache import ImageCache
+
+# 测试图片的 URL，预先放入图片缓存，不会真正下载
+FIXTURE_URL = "https://fixtures.benchmark.invalid/{name}"
+# (文件名, 宽, 高, 格式, 模式)
+FIXTURE_IMAGES = [
+    ("photo_landscape.jpg", 2400, 1600, "JPEG", "RGB"),
+    ("photo_portrait.jpg", 1200, 1800, "JPEG", "RGB"),
+    ("diagram_alpha.png", 1600, 1000, "PNG", "RGBA"),
+    ("banner_wide.jpg", 3000, 800, "JPEG", "RGB"),
+    ("chart_small.png", 640, 480, "PNG", "RGB"),
+    ("screenshot_tall.png", 900, 2000, "PNG", "RGB"),
+]
+# 生成一个PPT的各个阶段: 每个策略的 create_slide，以及保存文件
+PHASES = list(ppt_generator.PresentationGenerator.STRATEGY_CLASSES) + ["save"]
+
+
+def make_fixture_image(name: str, width: int, height: int, image_format: str, mode: str, seed: int) -> bytes:
+    """渐变背景叠加低分辨率噪声，压缩后的大小接近真实照片；结果只由参数决定"""
+    rng = random.Random(seed)
+    gradient = Image.linear_gradient("L").resize((width, height))
+    channels = [gradient.rotate(rng.choice([0, 90, 180, 270])).resize((width, height)) for _ in range(3)]
+    image = Image.merge("RGB", channels)
+    noise_size = (max(1, width // 8), max(1, height // 8))
+    noise = Image.frombytes("RGB", noise_size, rng.randbytes(noise_size[0] * noise_size[1] * 3))
+    image = Image.blend(image, noise.resize((width, height), Image.BILINEAR), 0.35)
+    if mode == "RGBA":
+        alpha = Image.linear_gradient("L").resize((width, height))
+        image.putalpha(alpha)
+    buffer = BytesIO()
+    image.save(buffer, format=image_format, **({"quality": 92} if image_format == "JPEG" else {}))
+    return buffer.getvalue()
+
+
+def install_fixture_images(cache_dir: str) -> List[str]:
+    """生成测试图片并放入临时目录中的图片缓存，替换 ppt_generator 使用的图片缓存，返回图片 URL"""
+    cache = ImageCache(cache_dir)
+    urls = []
+    for seed, (name, width, height, image_format, mode) in enumerate(FIXTURE_IMAGES):
+        url = FIXTURE_URL.format(name=name)
+        if cache.put(url, make_fixture_image(name, width, height, image_format, mode, seed)) is None:
+            raise RuntimeError(f"测试图片生成失败: {name}")
+        urls.append(url)
+    ppt_generator.image_cache = cache
+    return urls
+
+
+def text_children(text: str) -> List[Dict]:
+    return [{"text": text}]
+
+
+def build_deck(num_sections: int, image_urls: List[str]) -> Dict:
+    """
+    合成测试数据，按生成器的规则覆盖所有页面类型:
+    第 1 个章节只提供文档标题；第 2 个章节 3 个要点（子章节页）；第 3 个章节 1 个段落（内容页）；
+    之后的章节带图片（图片页），部分为背景图（不生成图片页）；参考文献 10 条（2 页）。
+    目录页在生成器中没有用到，只在 benchmark_strategies 中单独测试
+    """
+    sections = []
+    for idx in range(num_sections):
+        title = f"Benchmark Deck {num_sections}" if idx == 0 else f"第 {idx} 章 Section {idx}"
+        content = [{"type": "h1", "children": text_children(title)}]
+        if idx == 1:
+            content.append({"type": "bullets", "children": [
+                {"type": "bullet", "children": [
+                    {"type": "h3", "children": text_children(f"要点 {idx}-{item} Key point")},
+                    {"type": "p", "children": text_children(
+                        f"第 {idx} 章第 {item} 个要点的详细说明，包含中英文混合的内容 mixed text for layout. " * 2)},
+                ]}
+                for item in range(3)
+            ]})
+        else:
+            for item in range(1 if idx == 2 else 3):
+                content.append({"type": "p", "children": text_children(
+                    f"Paragraph {item} of section {idx}. 这一段用于测试正文的字号计算和分页，"
+                    f"长度接近真实生成的内容。Further sentences follow. " * 3)})
+        section = {"id": f"section-{idx}", "content": content}
+        if idx >= 3:
+            section["rootImage"] = {
+                "url": image_urls[idx % len(image_urls)],
+                "alt": f"Figure {idx}",
+                "background": idx % 7 == 0,
+            }
+        sections.append(section)
+    return {
+        "title": f"Benchmark Deck {num_sections}",
+        "sections": sections,
+        "references": [f"[{idx}] Author {idx}. Benchmark reference title {idx}. https://example.com/paper/{idx}"
+                       for idx in range(10)],
+    }
+
+
+class PhaseRecorder:
+    """
+    包装生成器中每个策略的 create_slide 和 presentation.save，记录每个阶段的耗时、生成的页和内存峰值
+    :param track_memory: 为 True 时 tracemalloc 需要已经启动，记录每个阶段的内存峰值（相对于阶段开始时）
+    """
+
+    def __init__(self, generator: ppt_generator.PresentationGenerator, track_memory: bool = False):
+        self.generator = generator
+        self.track_memory = track_memory
+        self.seconds: Dict[str, float] = defaultdict(float)
+        self.calls: Dict[str, int] = defaultdict(int)
+        self.peak_memory: Dict[str, int] = defaultdict(int)
+        self.overall_peak = 0
+        # 幻灯片序号 -> 生成该页的阶段
+        self.slide_phase: Dict[int, str] = {}
+        for name, strategy in generator.strategies.items():
+            strategy.create_slide = self._wrap(name, strategy.create_slide)
+        generator.presentation.save = self._wrap("save", generator.presentation.save)
+
+    def _wrap(self, phase: str, func: Callable) -> Callable:
+        def wrapper(*args, **kwargs):
+            slides = self.generator.presentation.slides
+            first_slide = len(slides)
+            if self.track_memory:
+                current, peak = tracemalloc.get_traced_memory()
+                self.overall_peak = max(self.overall_peak, peak)
+                tracemalloc.reset_peak()
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.seconds[phase] += time.perf_counter() - start
+                self.calls[phase] += 1
+                if self.track_memory:
+                    peak = tracemalloc.get_traced_memory()[1]
+                    self.overall_peak = max(self.overall_peak, peak)
+                    self.peak_memory[phase] = max(self.peak_memory[phase], peak - current)
+                for index in range(first_slide, len(slides)):
+                    self.slide_phase[index] = phase
+
+        return wrapper
+
+    def output_bytes(self, path: str) -> Dict[str, int]:
+        """每个阶段生成的页在文件中占用的压缩后字节数（页面 XML、关系文件、第一次引用的图片）"""
+        with zipfile.ZipFile(path) as zf:
+            sizes = {info.filename: info.compress_size for info in zf.infolist()}
+        result: Dict[str, int] = defaultdict(int)
+        counted = set()
+        for index, slide in enumerate(self.generator.presentation.slides):
+            phase = self.slide_phase.get(index, "other")
+            part = slide.part
+            partname = str(part.partname).lstrip("/")
+            names = [partname, partname.replace("slides/", "slides/_rels/", 1) + ".rels"]
+            names += [str(rel.target_part.partname).lstrip("/") for rel in part.rels.values()
+                      if not rel.is_external and str(rel.target_part.partname).startswith("/ppt/media/")]
+            for name in names:
+                if name not in counted:
+                    counted.add(name)
+                    result[phase] += sizes.get(name, 0)
+        return dict(result)
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    values = sorted(values)
+    return {
+        "min": round(values[0], 4),
+        "p50": round(statistics.median(values), 4),
+        "max": round(values[-1], 4),
+    }
+
+
+def render_once(deck: Dict, track_memory: bool = False) -> Dict[str, Any]:
+    """生成一次PPT，返回总耗时和每个阶段的统计，生成的文件在统计后删除"""
+    generator = ppt_generator.PresentationGenerator()
+    recorder = PhaseRecorder(generator, track_memory)
+    if track_memory:
+        tracemalloc.reset_peak()
+    start = time.perf_counter()
+    path = generator.generate_presentation(deck)
+    elapsed = time.perf_counter() - start
+    if not path:
+        raise RuntimeError("PPT 生成失败")
+    if track_memory:
+        recorder.overall_peak = max(recorder.overall_peak, tracemalloc.get_traced_memory()[1])
+    result = {
+        "seconds": elapsed,
+        "recorder": recorder,
+        "slides": len(generator.presentation.slides),
+        "file_bytes": os.path.getsize(path),
+        "output_bytes": recorder.output_bytes(path),
+        "report": generator.report,
+    }
+    os.remove(path)
+    return result
+
+
+def clear_optimized_images() -> None:
+    """清空进程内的图片压缩结果缓存，下一次生成重新压缩所有图片（与服务第一次收到这些图片时相同）"""
+    ppt_generator.ImageSlideStrategy._optimizer._cache.clear()
+
+
+def benchmark_deck(num_sections: int, image_urls: List[str], repeat: int) -> Dict[str, Any]:
+    deck = build_deck(num_sections, image_urls)
+    # 冷启动: 需要重新压缩图片；内存峰值也按冷启动统计（tracemalloc 会使生成变慢，不统计这一次的耗时）
+    clear_optimized_images()
+    cold = render_once(deck)
+    clear_optimized_images()
+    tracemalloc.start()
+    try:
+        memory_recorder = render_once(deck, track_memory=True)["recorder"]
+    finally:
+        tracemalloc.stop()
+    # 之后的生成命中图片压缩结果缓存
+    runs = [render_once(deck) for _ in range(repeat)]
+    last = runs[-1]
+
+    phases = {}
+    for phase in PHASES + ["other"]:
+        if phase == "other":
+            # 解析章节内容、计数器同步等不属于任何策略的时间
+            seconds = [run["seconds"] - sum(run["recorder"].seconds.values()) for run in [cold] + runs]
+        else:
+            seconds = [run["recorder"].seconds.get(phase, 0.0) for run in [cold] + runs]
+        slides = sum(1 for value in last["recorder"].slide_phase.values() if value == phase)
+        if not any(seconds) and not slides:
+            continue
+        phases[phase] = {
+            "calls": last["recorder"].calls.get(phase, 0),
+            "slides": slides,
+            "cold_seconds": round(seconds[0], 4),
+            "seconds": summarize(seconds[1:]),
+            "peak_memory_bytes": memory_recorder.peak_memory.get(phase, 0),
+            "output_bytes": last["output_bytes"].get(phase, 0),
+        }
+    totals = [run["seconds"] for run in runs]
+    return {
+        "sections": num_sections,
+        "slides": last["slides"],
+        "repeat": repeat,
+        "cold_seconds": round(cold["seconds"], 4),
+        "seconds": summarize(totals),
+        "slides_per_sec": round(last["slides"] / statistics.median(totals), 2),
+        "peak_memory_bytes": memory_recorder.overall_peak,
+        "file_bytes": last["file_bytes"],
+        "images": last["report"].get("images", 0),
+        "saved_image_bytes": last["report"].get("saved_bytes", 0),
+        "phases": phases,
+    }
+
+
+def strategy_arguments(name: str, index: int, image_urls: List[str]) -> tuple:
+    """单独测试每个策略时 create_slide 的参数"""
+    paragraph = (f"Standalone slide {index}. 单独测试每种页面的生成耗时和大小，"
+                 f"内容长度接近真实的章节。More text follows here. " * 4)
+    items = [{"summary": f"要点 {index}-{item}", "detail": paragraph[:120]} for item in range(3)]
+    return {
+        "title": (f"Benchmark Title {index} 标题",),
+        "content": (f"内容页 {index}", paragraph),
+        "toc": ([f"第 {item} 章 Chapter {item}" for item in range(1, 5)],),
+        "image": ({"url": image_urls[index % len(image_urls)], "alt": f"Figure {index}"}, f"图片页 {index}"),
+        "subsection": (f"子章节 {index}", items),
+        "references": ([f"[{item}] Reference {index}-{item}. https://example.com/{item}" for item in range(5)],),
+        "end": (),
+    }[name]
+
+
+def benchmark_strategies(image_urls: List[str], slides_per_strategy: int) -> Dict[str, Any]:
+    """每个策略在一个新的PPT中单独生成多页，统计每页的耗时、内存峰值和输出大小"""
+    baseline = BytesIO()
+    ppt_generator.PresentationGenerator().presentation.save(baseline)
+    baseline_bytes = len(baseline.getvalue())
+
+    results = {}
+    for name in ppt_generator.PresentationGenerator.STRATEGY_CLASSES:
+        generator = ppt_generator.PresentationGenerator()
+        strategy = generator.strategies[name]
+        # 预热一次（图片压缩、字号计算的缓存），不计入统计
+        strategy.create_slide(*strategy_arguments(name, 0, image_urls))
+        warm_slides = len(generator.presentation.slides)
+
+        tracemalloc.start()
+        try:
+            start = time.perf_counter()
+            for index in range(1, slides_per_strategy + 1):
+                strategy.create_slide(*strategy_arguments(name, index, image_urls))
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        slides = len(generator.presentation.slides) - warm_slides
+        output = BytesIO()
+        generator.presentation.save(output)
+        results[name] = {
+            "calls": slides_per_strategy,
+            "slides": slides,
+            "seconds_per_slide": round(elapsed / max(1, slides), 5),
+            "peak_memory_bytes": peak,
+            "bytes_per_slide": round((len(output.getvalue()) - baseline_bytes) / max(1, slides + warm_slides)),
+        }
+    return results
+
+
+def run_profiler(kind: str, deck: Dict, output: Optional[str]) -> str:
+    """对一次完整生成进行性能分析，返回结果文件路径"""
+    if kind == "cprofile":
+        import cProfile
+        import pstats
+
+        output = output or "profile_render.prof"
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            render_once(deck)
+        finally:
+            profiler.disable()
+        profiler.dump_stats(output)
+        stats = pstats.Stats(output, stream=sys.stderr)
+        stats.sort_stats("cumulative").print_stats(25)
+        return output
+
+    try:
+        from pyinstrument import Profiler
+    except ImportError:
+        raise SystemExit("使用 --profile pyinstrument 需要先安装: pip install pyinstrument")
+    output = output or "profile_render.html"
+    profiler = Profiler()
+    profiler.start()
+    try:
+        render_once(deck)
+    finally:
+        profiler.stop()
+    with open(output, 'w', encoding='utf-8') as f:
+        f.write(profiler.output_html())
+    print(profiler.output_text(unicode=True, color=False), file=sys.stderr)
+    return output
+
+
+def main(args):
+    if not args.fragment_cache:
+        # 片段缓存命中时章节不经过策略，统计不到每种页面的耗时
+        ppt_generator.fragment_cache = None
+    if not args.verbose:
+        logging.disable(logging.CRITICAL)
+
+    cache_dir = tempfile.mkdtemp(prefix="ppt_bench_images_")
+    try:
+        image_urls = install_fixture_images(cache_dir)
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull if not args.verbose else sys.stdout):
+            template = ppt_generator.PresentationGenerator().template
+            decks = [benchmark_deck(num_sections, image_urls, args.repeat) for num_sections in args.sections]
+            strategies = benchmark_strategies(image_urls, args.slides_per_strategy)
+            profile_path = None
+            if args.profile:
+                profile_path = run_profiler(args.profile, build_deck(max(args.sections), image_urls),
+                                            args.profile_output)
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        logging.disable(logging.NOTSET)
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "template_version": template.version,
+        "fragment_cache": bool(args.fragment_cache),
+        "decks": decks,
+        "strategies": strategies,
+    }
+    if profile_path:
+        report["profile"] = profile_path
+    print(json.dumps(report, ensure_ascii=False))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存到 {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="PPT 生成的基准测试和性能分析")
+    parser.add_argument("--sections", type=int, nargs="+", default=[10, 50, 200], help="每个PPT的章节数，可以指定多个")
+    parser.add_argument("--repeat", type=int, default=3, help="每个PPT生成的次数")
+    parser.add_argument("--slides-per-strategy", type=int, default=20, help="单独测试每个策略时生成的页数")
+    parser.add_argument("--profile", choices=["cprofile", "pyinstrument"], help="对最大的PPT进行性能分析")
+    parser.add_argument("--profile-output", help="性能分析结果文件，默认 profile_render.prof / profile_render.html")
+    parser.add_argument("--fragment-cache", action="store_true", help="使用章节片段缓存（默认关闭）")
+    parser.add_argument("--verbose", action="store_true", help="保留生成过程中的日志输出")
+    parser.add_argument("--output", help="把结果保存为 JSON 文件")
+    main(parser.parse_args())
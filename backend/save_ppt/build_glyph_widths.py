@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Date  : 2026/10/17
+# @File  : build_glyph_widths.py
+# @Author: johnson
+# @Contact : github: johnson7788
+# @Desc  : 用 fontTools 从模板使用的字体生成 text_metrics.py 的字形宽度表 glyph_widths.json
+"""
+读取模板主题中的正文字体（拉丁字体，以及东亚字体；主题中东亚字体为空时使用简体中文 Hans 对应的字体），
+在字体目录中按字体名称（包括 "微软雅黑" 这样的本地化名称）查找字体文件，计算:
+1. 常用拉丁字符、通用标点、中文标点、全角 ASCII 的逐字符宽度，全角字符取东亚字体，其它取拉丁字体
+2. 全角字符（wide）的平均宽度，拉丁字体所有字符的平均宽度作为默认宽度
+宽度以 em 为单位（advance width / unitsPerEm），与字号相乘即为 pt。
+
+生成宽度表需要安装 fontTools（pip install fonttools），运行时不需要:
+python build_glyph_widths.py
+python build_glyph_widths.py --font-dir C:\\Windows\\Fonts --output glyph_widths.json
+python build_glyph_widths.py --latin-font Carlito --ea-font "Noto Sans CJK SC"   # 使用度量兼容的替代字体
+"""
+
+import argparse
+import json
+import os
+import sys
+import unicodedata
+import zipfile
+from typing import Dict, List, Tuple
+
+from lxml import etree
+
+DEFAULT_TEMPLATE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ppt_template_0717.pptx")
+DEFAULT_OUTPUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "glyph_widths.json")
+DEFAULT_FONT_DIRS = [
+    "/usr/share/fonts",
+    "/usr/local/share/fonts",
+    os.path.expanduser("~/.fonts"),
+    os.path.expanduser("~/.local/share/fonts"),
+    "/Library/Fonts",
+    "/System/Library/Fonts",
+    os.path.expanduser("~/Library/Fonts"),
+    "C:\\Windows\\Fonts",
+]
+FONT_EXTENSIONS = (".ttf", ".otf", ".ttc", ".otc")
+# 保存逐字符宽度的码位范围
+CHAR_RANGES = [
+    (0x0020, 0x007E),  # ASCII
+    (0x00A0, 0x024F),  # 拉丁字母扩展
+    (0x2000, 0x206F),  # 通用标点
+    (0x3000, 0x303F),  # 中文标点
+    (0xFF01, 0xFF5E),  # 全角 ASCII
+]
+# 计算全角字符平均宽度时使用的码位范围（常用汉字）
+WIDE_SAMPLE_RANGE = (0x4E00, 0x9FFF)
+NS = {"a": "http://schemas.openxmlformats.org/drawingml/2006/main"}
+
+
+def theme_fonts(template_path: str) -> Tuple[str, str]:
+    """返回模板主题中的正文字体 (拉丁字体, 东亚字体)"""
+    with zipfile.ZipFile(template_path) as zf:
+        theme_names = sorted(name for name in zf.namelist() if name.startswith("ppt/theme/theme") and name.endswith(".xml"))
+        root = etree.fromstring(zf.read(theme_names[0]))
+    minor = root.find(".//a:fontScheme/a:minorFont", NS)
+    latin = minor.find("a:latin", NS).get("typeface", "")
+    ea = minor.find("a:ea", NS).get("typeface", "")
+    if not ea:
+        hans = minor.find("a:font[@script='Hans']", NS)
+        ea = hans.get("typeface", "") if hans is not None else ""
+    return latin, ea
+
+
+def index_fonts(font_dirs: List[str]) -> Dict[str, Tuple[str, int]]:
+    """扫描字体目录，返回 小写字体名称 -> (字体文件路径, 字体集合中的序号)，同名字体优先使用 Regular"""
+    from fontTools.ttLib import TTCollection, TTFont
+
+    found: Dict[str, Tuple[str, int, bool]] = {}
+    for font_dir in font_dirs:
+        for dirpath, _, filenames in os.walk(font_dir):
+            for filename in filenames:
+                if not filename.lower().endswith(FONT_EXTENSIONS):
+                    continue
+                path = os.path.join(dirpath, filename)
+                try:
+                    if filename.lower().endswith((".ttc", ".otc")):
+                        fonts = list(TTCollection(path, lazy=True).fonts)
+                    else:
+                        fonts = [TTFont(path, lazy=True)]
+                except Exception as e:
+                    print(f"跳过无法读取的字体 {path}: {e}", file=sys.stderr)
+                    continue
+                for index, font in enumerate(fonts):
+                    names = font["name"].names
+                    families = {str(record.toUnicode()) for record in names if record.nameID in (1, 16)}
+                    styles = {str(record.toUnicode()).lower() for record in names if record.nameID in (2, 17)}
+                    regular = bool(styles & {"regular", "normal", "book", "roman"})
+                    for family in families:
+                        key = family.lower()
+                        if key not in found or (regular and not found[key][2]):
+                            found[key] = (path, index, regular)
+    return {key: (path, index) for key, (path, index, _) in found.items()}
+
+
+def open_font(fonts: Dict[str, Tuple[str, int]], name: str):
+    from fontTools.ttLib import TTFont
+
+    location = fonts.get(name.lower())
+    if location is None:
+        return None
+    path, index = location
+    return TTFont(path, fontNumber=index, lazy=True)
+
+
+def advance_widths(font) -> Tuple[Dict[int, float], float]:
+    """返回 码位 -> 宽度（em），以及所有字符的平均宽度"""
+    units_per_em = font["head"].unitsPerEm
+    hmtx = font["hmtx"]
+    widths = {codepoint: hmtx[glyph][0] / units_per_em for codepoint, glyph in font.getBestCmap().items()}
+    return widths, sum(widths.values()) / max(1, len(widths))
+
+
+def build_table(latin_name: str, ea_name: str, fonts: Dict[str, Tuple[str, int]], template_path: str) -> Dict:
+    latin_font = open_font(fonts, latin_name)
+    if latin_font is None:
+        raise SystemExit(f"未找到拉丁字体 '{latin_name}'，请通过 --font-dir 指定字体目录，或用 --latin-font 指定度量兼容的字体")
+    latin_widths, latin_average = advance_widths(latin_font)
+    ea_font = open_font(fonts, ea_name) if ea_name else None
+    if ea_font is None:
+        print(f"未找到东亚字体 '{ea_name}'，全角字符使用 1em", file=sys.stderr)
+        ea_widths = {}
+    else:
+        ea_widths, _ = advance_widths(ea_font)
+
+    chars = {}
+    for start, end in CHAR_RANGES:
+        for codepoint in range(start, end + 1):
+            wide = unicodedata.east_asian_width(chr(codepoint)) in ("W", "F")
+            primary, fallback = (ea_widths, latin_widths) if wide else (latin_widths, ea_widths)
+            width = primary.get(codepoint, fallback.get(codepoint))
+            if width is not None:
+                chars[str(codepoint)] = round(width, 4)
+
+    wide_samples = [ea_widths[cp] for cp in range(WIDE_SAMPLE_RANGE[0], WIDE_SAMPLE_RANGE[1] + 1) if cp in ea_widths]
+    wide = sum(wide_samples) / len(wide_samples) if wide_samples else 1.0
+    return {
+        "source": os.path.basename(template_path),
+        "fonts": {"latin": latin_name, "ea": ea_name if ea_font is not None else ""},
+        "chars": chars,
+        "classes": {"wide": round(wide, 4), "combining": 0.0},
+        "default": round(latin_average, 4),
+    }
+
+
+def main(args):
+    latin, ea = theme_fonts(args.template)
+    latin = args.latin_font or latin
+    ea = args.ea_font or ea
+    print(f"模板字体: 拉丁={latin}, 东亚={ea}")
+    fonts = index_fonts(args.font_dir or DEFAULT_FONT_DIRS)
+    table = build_table(latin, ea, fonts, args.template)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(table, f, ensure_ascii=False, indent=1)
+    print(f"已生成 {len(table['chars'])} 个字符的宽度，全角平均宽度 {table['classes']['wide']}em，保存到 {args.output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="生成 text_metrics.py 使用的字形宽度表")
+    parser.add_argument("--template", default=DEFAULT_TEMPLATE, help="PPT 模板路径")
+    parser.add_argument("--font-dir", action="append", help="字体目录，可以指定多次，默认扫描系统字体目录")
+    parser.add_argument("--latin-font", help="代替模板中的拉丁字体")
+    parser.add_argument("--ea-font", help="代替模板中的东亚字体")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="输出文件")
+    main(parser.parse_args())
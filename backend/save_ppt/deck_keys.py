@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Date  : 2026/10/17
+# @File  : deck_keys.py
+# @Author: johnson
+# @Contact : github: johnson7788
+# @Desc  : 生成结果缓存（render_cache）和幻灯片片段缓存（slide_fragments）共用的缓存键工具
+"""
+1. normalize_deck 去掉不影响生成结果的字段，字段顺序、章节 id 不同的相同内容得到相同的缓存键
+2. renderer_version() 为所有影响生成结果的代码和实际加载的字形宽度表的哈希，任何一个修改后旧的缓存自动失效
+"""
+
+import hashlib
+import json
+import os
+from functools import lru_cache
+from typing import Any
+
+from text_metrics import text_metrics
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+# 不影响生成结果的字段
+IGNORED_FIELDS = {"id"}
+
+
+def _file_digest(path: str) -> str:
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+
+# 影响生成结果的模块: 幻灯片生成、模板布局、图片下载和压缩、字号计算、片段拼接
+RENDERER_MODULES = ("ppt_generator.py", "template_registry.py", "image_cache.py", "image_optimizer.py",
+                    "text_metrics.py", "slide_fragments.py")
+
+
+@lru_cache(maxsize=1)
+def renderer_version() -> str:
+    """生成结果缓存和片段缓存共用的生成器版本: RENDERER_MODULES 的哈希加上当前进程加载的字形宽度表的哈希"""
+    modules = {name: _file_digest(os.path.join(CURRENT_DIR, name)) for name in RENDERER_MODULES}
+    return content_key({"modules": modules, "glyph_widths": text_metrics.digest})[:16]
+
+
+def normalize_deck(value: Any) -> Any:
+    """去掉 id 字段，以及值为 None、空列表、空字典的字段（生成时与字段不存在的效果相同）"""
+    if isinstance(value, dict):
+        normalized = {}
+        for key, item in value.items():
+            if key in IGNORED_FIELDS:
+                continue
+            item = normalize_deck(item)
+            if item is None or item == [] or item == {}:
+                continue
+            normalized[key] = item
+        return normalized
+    if isinstance(value, list):
+        return [normalize_deck(item) for item in value]
+    return value
+
+
+def content_key(value: Any) -> str:
+    """value 按键排序序列化后的 sha256，value 需要已经规范化"""
+    payload = json.dumps(value, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Date  : 2026/10/17
+# @File  : image_cache.py
+# @Author: johnson
+# @Contact : github: johnson7788
+# @Desc  : 图片并发预取和本地缓存，生成PPT前一次性下载所有图片，同一张图片只下载一次
+"""
+以前 ImageSlideStrategy 在逐页生成时用 requests.get 串行下载图片，10 张图片最多要阻塞 100 秒。现在:
+1. 渲染前收集所有 rootImage.url，通过线程池和共享的 requests.Session（keep-alive 连接池）并发下载，
+   每个主机同时下载的数量有上限，避免被图床限流
+2. 图片按内容的 sha256 保存在磁盘上（image_cache/ab/<sha256>），不同 URL 的相同图片只保存一份，
+   url -> 内容哈希、图片宽高记录在 image_cache/index.db 中，渲染时不需要再次 Image.open 获取尺寸
+3. 最近使用的图片同时保存在内存中，磁盘和内存缓存都按总大小淘汰最久未使用的图片
+
+环境变量:
+PPT_IMAGE_CACHE_DIR            缓存目录，默认 save_ppt/image_cache
+PPT_IMAGE_CACHE_MAX_BYTES      磁盘缓存总大小上限，默认 1GB，0 表示不限制
+PPT_IMAGE_MEMORY_MAX_BYTES     内存缓存总大小上限，默认 128MB，0 表示不使用内存缓存
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from io import BytesIO
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import urlparse
+
+import requests
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CachedImage:
+    """已下载并解码过尺寸的图片"""
+    digest: str
+    data: bytes
+    width: int
+    height: int
+    format: str
+
+    @property
+    def size(self) -> int:
+        return len(self.data)
+
+    def stream(self) -> BytesIO:
+        return BytesIO(self.data)
+
+
+class ImageCache:
+    """
+    :param cache_dir: 磁盘缓存目录
+    :param max_bytes: 磁盘缓存总大小上限，0 表示不限制
+    :param memory_max_bytes: 内存缓存总大小上限，0 表示不使用内存缓存
+    :param timeout: 单张图片的下载超时时间（秒）
+    :param max_workers: 并发下载的线程数
+    :param per_host: 每个主机同时下载的图片数量上限
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 1024 * 1024 * 1024, memory_max_bytes: int = 128 * 1024 * 1024,
+                 timeout: float = 10, max_workers: int = 8, per_host: int = 4):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.memory_max_bytes = memory_max_bytes
+        self.timeout = timeout
+        os.makedirs(cache_dir, exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(os.path.join(cache_dir, "index.db"), check_same_thread=False,
+                                     timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS urls (url TEXT PRIMARY KEY, digest TEXT NOT NULL)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS blobs (digest TEXT PRIMARY KEY, size INTEGER, width INTEGER, height INTEGER,"
+            " format TEXT, last_access REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_urls_digest ON urls(digest)")
+        # 内容哈希 -> CachedImage，按最近使用顺序排列
+        self._memory: "OrderedDict[str, CachedImage]" = OrderedDict()
+        self._memory_bytes = 0
+
+        self._session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._host_limits = defaultdict(lambda: threading.BoundedSemaphore(per_host))
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="image-fetch")
+
+    def blob_path(self, digest: str) -> str:
+        return os.path.join(self.cache_dir, digest[:2], digest)
+
+    # ---------- 查询 ----------
+    def get(self, url: str) -> Optional[CachedImage]:
+        """只查缓存，不下载"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT b.digest, b.width, b.height, b.format FROM urls u JOIN blobs b ON u.digest = b.digest"
+                " WHERE u.url = ?", (url,)
+            ).fetchone()
+            if row is None:
+                return None
+            digest, width, height, image_format = row
+            self._conn.execute("UPDATE blobs SET last_access = ? WHERE digest = ?", (time.time(), digest))
+            image = self._memory.get(digest)
+            if image is not None:
+                self._memory.move_to_end(digest)
+                return image
+        try:
+            with open(self.blob_path(digest), 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            # 图片文件被手动删除，删除索引后重新下载
+            with self._lock:
+                self._conn.execute("DELETE FROM urls WHERE digest = ?", (digest,))
+                self._conn.execute("DELETE FROM blobs WHERE digest = ?", (digest,))
+            return None
+        image = CachedImage(digest, data, width, height, image_format)
+        self._remember(image)
+        return image
+
+    def fetch(self, url: str) -> Optional[CachedImage]:
+        """优先从缓存读取，未命中时下载，下载或解码失败返回 None"""
+        image = self.get(url)
+        if image is not None:
+            logger.debug(f"图片命中缓存: {url}")
+            return image
+        with self._host_limits[urlparse(url).netloc]:
+            try:
+                start = time.time()
+                response = self._session.get(url, timeout=self.timeout)
+                response.raise_for_status()
+                logger.info(f"✓ 成功下载图片 {url}，大小: {len(response.content)} 字节，耗时: {time.time() - start:.2f}秒")
+            except requests.exceptions.RequestException as e:
+                logger.error(f"✗ 下载图片失败 {url}: {e}")
+                return None
+        return self.put(url, response.content)
+
+    def prefetch(self, urls: Iterable[str]) -> Dict[str, Optional[CachedImage]]:
+        """并发下载一组图片，返回 url -> CachedImage（失败为 None）"""
+        unique_urls = list(dict.fromkeys(url for url in urls if url))
+        if not unique_urls:
+            return {}
+        start = time.time()
+        results = dict(zip(unique_urls, self._executor.map(self.fetch, unique_urls)))
+        failed = sum(1 for image in results.values() if image is None)
+        logger.info(f"预取 {len(unique_urls)} 张图片完成，失败 {failed} 张，耗时: {time.time() - start:.2f}秒")
+        return results
+
+    def prefetch_in_background(self, urls: Iterable[str]) -> List[Future]:
+        """在下载线程池中开始下载，不等待结果，每个 Future 的结果为 CachedImage（失败为 None）"""
+        return [self._executor.submit(self.fetch, url) for url in dict.fromkeys(url for url in urls if url)]
+
+    # ---------- 写入 ----------
+    def put(self, url: str, data: bytes) -> Optional[CachedImage]:
+        try:
+            with Image.open(BytesIO(data)) as img:
+                width, height = img.size
+                image_format = img.format or ""
+        except Exception as e:
+            logger.error(f"打开图片失败 {url}: {e}")
+            return None
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.blob_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO blobs (digest, size, width, height, format, last_access) VALUES (?, ?, ?, ?, ?, ?)",
+                (digest, len(data), width, height, image_format, time.time()),
+            )
+            self._conn.execute("INSERT OR REPLACE INTO urls (url, digest) VALUES (?, ?)", (url, digest))
+        image = CachedImage(digest, data, width, height, image_format)
+        self._remember(image)
+        self._evict()
+        return image
+
+    def _remember(self, image: CachedImage) -> None:
+        if not self.memory_max_bytes or image.size > self.memory_max_bytes:
+            return
+        with self._lock:
+            if image.digest in self._memory:
+                self._memory.move_to_end(image.digest)
+                return
+            self._memory[image.digest] = image
+            self._memory_bytes += image.size
+            while self._memory_bytes > self.memory_max_bytes:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= evicted.size
+
+    def _evict(self) -> None:
+        """磁盘缓存超过上限时，按最近访问时间删除图片"""
+        if not self.max_bytes:
+            return
+        with self._lock:
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            for digest, size in self._conn.execute(
+                    "SELECT digest, size FROM blobs ORDER BY last_access").fetchall():
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(self.blob_path(digest))
+                except FileNotFoundError:
+                    pass
+                self._conn.execute("DELETE FROM urls WHERE digest = ?", (digest,))
+                self._conn.execute("DELETE FROM blobs WHERE digest = ?", (digest,))
+                image = self._memory.pop(digest, None)
+                if image is not None:
+                    self._memory_bytes -= image.size
+                total -= size
+                logger.debug(f"淘汰图片缓存: {digest}")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs").fetchone()
+            urls = self._conn.execute("SELECT COUNT(*) FROM urls").fetchone()[0]
+            return {"images": count, "urls": urls, "bytes": total,
+                    "memory_images": len(self._memory), "memory_bytes": self._memory_bytes}
+
+
+# 进程内共享的图片缓存，多个请求之间复用
+image_cache = ImageCache(
+    os.environ.get("PPT_IMAGE_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "image_cache")),
+    max_bytes=int(os.environ.get("PPT_IMAGE_CACHE_MAX_BYTES", str(1024 * 1024 * 1024))),
+    memory_max_bytes=int(os.environ.get("PPT_IMAGE_MEMORY_MAX_BYTES", str(128 * 1024 * 1024))),
+)
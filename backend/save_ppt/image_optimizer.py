@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Date  : 2026/10/17
+# @File  : image_optimizer.py
+# @Author: johnson
+# @Contact : github: johnson7788
+# @Desc  : 插入PPT前按占位符大小缩小并重新压缩图片，去掉元数据，避免生成的PPT动辄几十MB
+"""
+以前图片以下载的原始字节嵌入PPT，一张几MB的照片放进几英寸宽的占位符里也原样保存。现在插入前:
+1. 按图片在幻灯片上的显示尺寸（EMU）和配置的 DPI 计算需要的像素尺寸，原图更大时等比缩小
+2. 带透明通道，或无损格式且颜色数不超过 256 的图片（图表、截图）保存为 PNG，其它保存为 JPEG，
+   WebP 等 PowerPoint 支持不好的格式也会被转换；重新保存时不写入 EXIF 等元数据
+3. 处理结果按 (图片内容哈希, 像素尺寸) 缓存，同一张图片在多页中使用时得到完全相同的字节，
+   python-pptx 按内容哈希去重，PPT 中只保存一份
+压缩后反而更大且不需要缩放的 JPEG/PNG 保留原图。
+"""
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from io import BytesIO
+
+from PIL import Image
+
+from image_cache import CachedImage
+
+EMU_PER_INCH = 914400
+# 可以直接嵌入PPT的格式
+EMBEDDABLE_FORMATS = {"JPEG", "PNG"}
+LOSSLESS_FORMATS = {"PNG", "GIF", "BMP", "TIFF"}
+
+
+@dataclass
+class OptimizedImage:
+    data: bytes
+    width: int
+    height: int
+    format: str
+
+    def stream(self) -> BytesIO:
+        return BytesIO(self.data)
+
+
+class ImageOptimizer:
+    """
+    :param dpi: 图片在幻灯片上的目标分辨率
+    :param jpeg_quality: JPEG 压缩质量
+    :param max_cache_items: 缓存的处理结果数量
+    """
+
+    def __init__(self, dpi: int = 150, jpeg_quality: int = 85, max_cache_items: int = 256):
+        self.dpi = dpi
+        self.jpeg_quality = jpeg_quality
+        self.max_cache_items = max_cache_items
+        self._cache: "OrderedDict[tuple, OptimizedImage]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def target_size(self, box_width_emu: int, box_height_emu: int):
+        return (max(1, round(box_width_emu / EMU_PER_INCH * self.dpi)),
+                max(1, round(box_height_emu / EMU_PER_INCH * self.dpi)))
+
+    def optimize(self, image: CachedImage, box_width_emu: int, box_height_emu: int) -> OptimizedImage:
+        """返回适合 box 尺寸的图片，box 为图片在幻灯片上的显示宽高（EMU）"""
+        target = self.target_size(box_width_emu, box_height_emu)
+        key = (image.digest, target)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                return cached
+        result = self._optimize(image, target)
+        with self._lock:
+            self._cache[key] = result
+            while len(self._cache) > self.max_cache_items:
+                self._cache.popitem(last=False)
+        return result
+
+    def _optimize(self, image: CachedImage, target) -> OptimizedImage:
+        with Image.open(BytesIO(image.data)) as img:
+            img.load()
+            resized = img.width > target[0] or img.height > target[1]
+            has_alpha = img.mode in ("RGBA", "LA", "PA") or (img.mode == "P" and "transparency" in img.info)
+            # 只有无损格式的原图才可能是图表、截图，JPEG 原图一律按照片处理
+            few_colors = (image.format in LOSSLESS_FORMATS and img.width * img.height <= 4096 * 4096
+                          and img.getcolors(256) is not None)
+            if resized:
+                img = img.convert("RGBA" if has_alpha else "RGB")
+                img.thumbnail(target, Image.LANCZOS)
+
+            out = BytesIO()
+            if has_alpha or few_colors:
+                if img.mode not in ("RGB", "RGBA", "L", "LA", "P"):
+                    img = img.convert("RGBA" if has_alpha else "RGB")
+                img.save(out, format="PNG", optimize=True)
+                image_format = "PNG"
+            else:
+                if img.mode != "RGB":
+                    img = img.convert("RGB")
+                img.save(out, format="JPEG", quality=self.jpeg_quality, optimize=True, progressive=True)
+                image_format = "JPEG"
+            width, height = img.size
+
+        data = out.getvalue()
+        if not resized and image.format in EMBEDDABLE_FORMATS and len(data) >= image.size:
+            return OptimizedImage(image.data, image.width, image.height, image.format)
+        return OptimizedImage(data, width, height, image_format)
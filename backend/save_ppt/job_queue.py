@@ -0,0 +1,273 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Date  : 2026/10/17
+# @File  : job_queue.py
+# @Author: johnson
+# @Contact : github: johnson7788
+# @Desc  : PPT 生成任务队列，在独立的进程池中生成PPT，不阻塞 FastAPI 的事件循环
+"""
+python-pptx 的渲染是纯 CPU 计算，以前直接在 async 接口中调用，一个PPT生成期间服务器无法处理其它请求。现在:
+1. 启动时创建固定数量的 worker 进程（spawn 方式），每个进程启动时预先加载模板，之后一直复用
+2. 正在生成和排队的任务总数超过上限时拒绝新任务（QueueFullError，接口返回 429）
+3. 每个任务有超时时间，worker 中通过 SIGALRM 中断超时的任务（Windows 上只能等任务自然结束）
+4. 排队中的任务可以直接取消；正在生成的任务无法中断，取消后丢弃结果并删除生成的文件
+5. 已结束的任务保留 job_ttl 秒，供查询状态和结果
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+TIMEOUT = "timeout"
+FINISHED_STATES = {SUCCEEDED, FAILED, CANCELLED, TIMEOUT}
+
+
+class QueueFullError(Exception):
+    """排队的任务数已达到上限"""
+
+
+class JobTimeout(BaseException):
+    """
+    任务超时，在 worker 进程中由 SIGALRM 触发。
+    继承 BaseException，避免被 generate_presentation 中的 except Exception 吞掉
+    """
+
+
+# ---------- worker 进程中执行的函数 ----------
+def _init_worker() -> None:
+    """worker 进程启动时预先解析模板，第一个任务不需要再等待"""
+    from ppt_generator import PresentationGenerator
+    PresentationGenerator()
+    logger.info(f"PPT worker 进程 {os.getpid()} 已就绪")
+
+
+def _raise_timeout(signum, frame):
+    raise JobTimeout()
+
+
+def render_job(json_data: Dict, timeout: float = 0, name_suffix: str = "") -> Dict[str, Any]:
+    """在 worker 进程中生成一个PPT，返回 {"path": 文件路径, "report": 生成统计, "pid": 进程id, "started_at": 开始时间}"""
+    from ppt_generator import start_generate_presentation
+
+    started_at = time.time()
+    use_alarm = timeout and hasattr(signal, "SIGALRM")
+    if use_alarm:
+        signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        report = {}
+        output_path = start_generate_presentation(json_data, report, name_suffix)
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+    if not output_path:
+        raise RuntimeError("Failed to generate PPT.")
+    return {"path": output_path, "report": report, "pid": os.getpid(), "started_at": started_at}
+
+
+def _warm_up() -> int:
+    return os.getpid()
+
+
+# ---------- 主进程中的任务管理 ----------
+@dataclass
+class Job:
+    id: str
+    status: str = QUEUED
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    cancel_requested: bool = False
+    # 生成结果缓存的键，生成成功后由 on_success 回调保存结果
+    cache_key: Optional[str] = None
+    future: Optional[Future] = field(default=None, repr=False)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+        }
+
+
+class JobQueue:
+    """
+    :param max_workers: worker 进程数量
+    :param max_pending: 除正在生成的任务外，最多排队的任务数量
+    :param job_timeout: 单个任务的超时时间（秒），0 表示不限制
+    :param job_ttl: 已结束的任务保留的时间（秒）
+    :param on_success: 任务成功后在进程池的管理线程中调用，参数为 Job，例如保存生成结果缓存
+    """
+
+    def __init__(self, max_workers: int = 2, max_pending: int = 8, job_timeout: float = 300, job_ttl: float = 3600,
+                 on_success: Optional[Callable[[Job], None]] = None):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.job_timeout = job_timeout
+        self.job_ttl = job_ttl
+        self.on_success = on_success
+        self._jobs: Dict[str, Job] = {}
+        # 结果回调在进程池的管理线程中执行
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def start(self) -> None:
+        # 使用 spawn 而不是 fork，避免子进程继承主进程的线程池、SQLite 连接等状态
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+        )
+        # 提前启动所有 worker 进程
+        for _ in range(self.max_workers):
+            self._executor.submit(_warm_up)
+        logger.info(f"PPT 任务队列已启动: {self.max_workers} 个 worker，最多排队 {self.max_pending} 个任务")
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _active_jobs(self) -> List[Job]:
+        return [job for job in self._jobs.values() if job.status in (QUEUED, RUNNING)]
+
+    def _purge(self) -> None:
+        now = time.time()
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.status in FINISHED_STATES and now - job.finished_at > self.job_ttl]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def submit(self, json_data: Dict, name_suffix: str = "", cache_key: Optional[str] = None) -> Job:
+        """提交生成任务，队列已满时抛出 QueueFullError，name_suffix 为输出文件名的后缀"""
+        if self._executor is None:
+            raise RuntimeError("任务队列未启动")
+        with self._lock:
+            self._purge()
+            if len(self._active_jobs()) >= self.max_workers + self.max_pending:
+                raise QueueFullError(f"PPT 生成队列已满（{self.max_workers} 个正在生成，{self.max_pending} 个排队）")
+            job = Job(id=uuid.uuid4().hex, cache_key=cache_key)
+            self._jobs[job.id] = job
+        try:
+            job.future = self._executor.submit(render_job, json_data, self.job_timeout, name_suffix)
+        except BrokenProcessPool:
+            # worker 进程被意外杀死（例如内存不足）后进程池不可再用，重新创建
+            logger.error("PPT worker 进程异常退出，重新创建进程池")
+            self.shutdown()
+            self.start()
+            job.future = self._executor.submit(render_job, json_data, self.job_timeout, name_suffix)
+        job.future.add_done_callback(lambda future, job=job: self._on_done(job, future))
+        return job
+
+    def add_succeeded(self, result: Dict[str, Any]) -> Job:
+        """登记一个不需要生成的任务（例如命中生成结果缓存），result 格式与 render_job 的返回值相同"""
+        now = time.time()
+        job = Job(id=uuid.uuid4().hex, status=SUCCEEDED, started_at=now, finished_at=now, result=result)
+        with self._lock:
+            self._purge()
+            self._jobs[job.id] = job
+        return job
+
+    def _on_done(self, job: Job, future: Future) -> None:
+        with self._lock:
+            job.finished_at = time.time()
+            if future.cancelled():
+                job.status = CANCELLED
+                return
+            error = future.exception()
+            if job.cancel_requested:
+                job.status = CANCELLED
+                if error is None:
+                    self._remove_output(future.result())
+            elif isinstance(error, JobTimeout):
+                job.status = TIMEOUT
+                job.error = f"PPT 生成超过 {self.job_timeout} 秒"
+            elif error is not None:
+                job.status = FAILED
+                job.error = str(error)
+            else:
+                job.status = SUCCEEDED
+                job.result = future.result()
+                job.started_at = job.result["started_at"]
+        logger.info(f"PPT 任务 {job.id} 结束: {job.status}")
+        if job.status == SUCCEEDED and self.on_success is not None:
+            try:
+                self.on_success(job)
+            except Exception as e:
+                logger.error(f"PPT 任务 {job.id} 的完成回调失败: {e}", exc_info=True)
+
+    @staticmethod
+    def _remove_output(result: Dict[str, Any]) -> None:
+        try:
+            os.remove(result["path"])
+        except OSError:
+            pass
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            # 已交给 worker 进程的任务视为正在生成
+            if job is not None and job.status == QUEUED and job.future.running():
+                job.status = RUNNING
+                job.started_at = time.time()
+            return job
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """取消任务，排队中的任务立即取消，正在生成的任务结束后丢弃结果"""
+        job = self.get(job_id)
+        if job is None or job.status in FINISHED_STATES:
+            return job
+        if job.future.cancel():
+            return job
+        with self._lock:
+            job.cancel_requested = True
+        return job
+
+    async def wait(self, job: Job, timeout: Optional[float] = None) -> Job:
+        """在事件循环中等待任务结束，不阻塞其它请求，超过 timeout 秒抛出 asyncio.TimeoutError（任务继续执行）"""
+        if job.future is None:
+            return job
+        try:
+            await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(job.future)), timeout)
+        except asyncio.TimeoutError:
+            raise
+        except asyncio.CancelledError:
+            if not job.future.cancelled():
+                raise
+        except (Exception, JobTimeout):
+            # 任务本身的异常已经记录在 job.status/job.error 中
+            pass
+        # 完成回调在进程池的管理线程中执行，通常在这里之前已经完成
+        while job.status not in FINISHED_STATES:
+            await asyncio.sleep(0.01)
+        return job
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts: Dict[str, int] = {}
+            for job in self._jobs.values():
+                status = RUNNING if job.status == QUEUED and job.future.running() else job.status
+                counts[status] = counts.get(status, 0) + 1
+            return {"workers": self.max_workers, "max_pending": self.max_pending,
+                    "job_timeout": self.job_timeout, "jobs": counts}
@@ -7,26 +7,102 @@
 # @Desc  :
 
 # main.py
-from fastapi import FastAPI, HTTPException, status
-from fastapi.responses import JSONResponse
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request, status
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 from typing import List, Dict, Any, Optional
 import os
+import json
+import time
+import uuid
+import asyncio
 import logging
+import tempfile
+import zipfile
 
-# 从 ppt_generator 模块导入生成器函数
-from ppt_generator import start_generate_presentation
+# PPT 在独立的 worker 进程中生成，不阻塞事件循环
+from job_queue import FINISHED_STATES, SUCCEEDED, TIMEOUT, Job, JobQueue, QueueFullError
+# 增量生成: 章节逐个到达时就开始生成
+from ppt_session import PresentationSession, SessionClosedError, SessionLimitError, SessionManager
+# 相同内容直接返回已生成的文件，并限制 output_ppts/ 的大小
+from render_cache import RenderCache
 
 # 配置日志（确保FastAPI也能使用日志）
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# 对外可以访问的IP，方便下载PPT
+OUTER_IP = os.environ.get("PPT_OUTER_IP", "http://127.0.0.1:10021")
+
+# 生成的PPT文件将保存在此目录（与 ppt_generator 的输出目录相同），并由FastAPI提供静态访问
+OUTPUT_PPT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "output_ppts")
+if not os.path.exists(OUTPUT_PPT_DIR):
+    os.makedirs(OUTPUT_PPT_DIR)
+    logger.info(f"Created output directory: {OUTPUT_PPT_DIR}")
+
+render_cache = RenderCache(
+    OUTPUT_PPT_DIR,
+    os.environ.get("PPT_RENDER_CACHE_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "render_cache.db")),
+    max_age=float(os.environ.get("PPT_OUTPUT_MAX_AGE", str(7 * 86400))),
+    max_bytes=int(os.environ.get("PPT_OUTPUT_MAX_BYTES", str(2 * 1024 ** 3))),
+)
+# 清理 output_ppts/ 的间隔（秒）
+OUTPUT_CLEANUP_INTERVAL = float(os.environ.get("PPT_OUTPUT_CLEANUP_INTERVAL", "600"))
+
+
+def remember_result(job: Job) -> None:
+    """任务成功后保存生成结果缓存"""
+    if job.cache_key:
+        render_cache.put(job.cache_key, job.result["path"], job.result["report"])
+
+
+# worker 进程数、最多排队的任务数、单个任务的超时时间（秒）
+job_queue = JobQueue(
+    max_workers=int(os.environ.get("PPT_WORKERS", str(min(4, os.cpu_count() or 1)))),
+    max_pending=int(os.environ.get("PPT_MAX_PENDING", "16")),
+    job_timeout=float(os.environ.get("PPT_JOB_TIMEOUT", "300")),
+    on_success=remember_result,
+)
+# 最多同时打开的增量生成会话数、生成幻灯片的线程数、会话空闲多久后被清理（秒）
+session_manager = SessionManager(
+    max_sessions=int(os.environ.get("PPT_MAX_SESSIONS", "32")),
+    max_workers=int(os.environ.get("PPT_SESSION_WORKERS", "2")),
+    session_ttl=float(os.environ.get("PPT_SESSION_TTL", "3600")),
+)
+# 一次批量请求最多包含的PPT数量
+MAX_BATCH_SIZE = int(os.environ.get("PPT_MAX_BATCH", "100"))
+
+
+async def cleanup_output_periodically():
+    while True:
+        try:
+            await asyncio.to_thread(render_cache.cleanup)
+        except Exception as e:
+            logger.error(f"清理 {OUTPUT_PPT_DIR} 失败: {e}", exc_info=True)
+        await asyncio.sleep(OUTPUT_CLEANUP_INTERVAL)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 启动时创建 worker 进程并预先加载模板，关闭时结束所有 worker
+    job_queue.start()
+    session_manager.start()
+    cleanup_task = asyncio.create_task(cleanup_output_periodically())
+    yield
+    cleanup_task.cancel()
+    session_manager.shutdown()
+    job_queue.shutdown()
+
+
 app = FastAPI(
     title="PPT Generation API",
     description="API for generating PowerPoint presentations from structured JSON data.",
     version="1.0.0",
+    lifespan=lifespan,
 )
 app.add_middleware(
             CORSMiddleware,
@@ -68,22 +144,70 @@ class PPTInput(BaseModel):
     references: Optional[List[str]] = None  # 参考文献列表
 
 
-# --- 配置静态文件服务 ---
-# 生成的PPT文件将保存在此目录，并由FastAPI提供静态访问
-OUTPUT_PPT_DIR = "output_ppts"
-if not os.path.exists(OUTPUT_PPT_DIR):
-    os.makedirs(OUTPUT_PPT_DIR)
-    logger.info(f"Created output directory: {OUTPUT_PPT_DIR}")
+class SessionOpenInput(BaseModel):
+    title: Optional[str] = None  # 文档标题，为空时使用第一个章节的标题
+
+
+class SessionFinalizeInput(BaseModel):
+    references: Optional[List[str]] = None  # 参考文献列表
+
+
+class BatchPPTInput(BaseModel):
+    decks: List[PPTInput]  # 一次生成的多个PPT
 
+
+# --- 配置静态文件服务 ---
 # 挂载静态文件目录
 app.mount("/static_ppts", StaticFiles(directory=OUTPUT_PPT_DIR), name="static_ppts")
 
 # --- 定义API端点 ---
 
+def ppt_url_for(output_filepath: str) -> str:
+    """生成的PPT文件对应的静态访问链接"""
+    return os.path.join(OUTER_IP, "static_ppts", os.path.basename(output_filepath))
+
+
+def job_to_response(job: Job) -> Dict[str, Any]:
+    content = job.to_dict()
+    if job.status == SUCCEEDED:
+        content["ppt_url"] = ppt_url_for(job.result["path"])
+        content["report"] = job.result["report"]
+        content["cached"] = job.result.get("cached", False)
+    return content
+
+
+def lookup_render_cache(deck: Dict[str, Any]) -> tuple:
+    """返回 (缓存键, 缓存的生成结果)，未命中时生成结果为 None"""
+    cache_key = render_cache.key_for(deck)
+    return cache_key, render_cache.get(cache_key)
+
+
+async def submit_deck(deck: Dict[str, Any], name_suffix: str = "") -> Job:
+    """内容相同的PPT已经生成过时直接返回已完成的任务，否则提交到任务队列，队列已满时抛出 QueueFullError"""
+    # 计算缓存键（规范化、哈希，第一次使用时加载模板）和查询 SQLite 索引在线程中进行，不阻塞事件循环
+    cache_key, cached = await asyncio.to_thread(lookup_render_cache, deck)
+    if cached is not None:
+        logger.info(f"命中生成结果缓存: {cached['path']}")
+        return job_queue.add_succeeded(cached)
+    return job_queue.submit(deck, name_suffix=name_suffix, cache_key=cache_key)
+
+
+async def submit_job(ppt_data: PPTInput) -> Job:
+    # Pydantic模型会自动验证数据。将Pydantic对象转换为Python字典
+    # model_dump() 是 Pydantic v2+ 的方法，旧版本使用 .dict()
+    data_for_generator = ppt_data.model_dump(by_alias=True)  # by_alias=True 如果你的字段有别名
+    try:
+        return await submit_deck(data_for_generator)
+    except QueueFullError as e:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=str(e))
+
+
 @app.post("/generate-ppt", summary="Generate a PowerPoint presentation from JSON data")
 async def generate_ppt(ppt_data: PPTInput):
     """
     根据前端提供的 JSON 数据生成 PowerPoint 演示文稿，并返回可访问的链接。
+    生成在 worker 进程中进行，此接口等待生成完成后返回（与旧版接口兼容），
+    不想长时间等待的调用方可以使用 /generate-ppt/jobs 提交任务后查询结果。
 
     **请求体示例:**
     ```json
@@ -104,38 +228,258 @@ async def generate_ppt(ppt_data: PPTInput):
     ```json
     {
         "message": "PPT generated successfully",
-        "ppt_url": "http://localhost:8000/static_ppts/Your_Presentation_Title.pptx"
+        "ppt_url": "http://localhost:8000/static_ppts/Your_Presentation_Title.pptx",
+        "report": {"slides": 7, "render_seconds": 0.8, "file_bytes": 512000, "images": 2, "saved_bytes": 3145728, ...},
+        "cached": false  // 内容相同的PPT已经生成过时为 true，直接返回已有的文件
     }
     ```
     """
     logger.info("Received request to generate PPT.")
+    job = await submit_job(ppt_data)
+    try:
+        await job_queue.wait(job)
+    except asyncio.CancelledError:
+        # 客户端断开连接，不再需要结果
+        job_queue.cancel(job.id)
+        raise
 
-    # Pydantic模型会自动验证数据。将Pydantic对象转换为Python字典
-    # model_dump() 是 Pydantic v2+ 的方法，旧版本使用 .dict()
-    data_for_generator = ppt_data.model_dump(by_alias=True)  # by_alias=True 如果你的字段有别名
+    if job.status == SUCCEEDED:
+        return JSONResponse(
+            status_code=status.HTTP_200_OK,
+            content={"message": "PPT generated successfully", "ppt_url": ppt_url_for(job.result["path"]),
+                     "report": job.result["report"], "cached": job.result.get("cached", False)}
+        )
+    if job.status == TIMEOUT:
+        raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail=job.error)
+    logger.error(f"An unexpected error occurred during PPT generation: {job.error}")
+    raise HTTPException(
+        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        detail=f"An internal server error occurred: {job.error or job.status}"
+    )
 
+
+@app.post("/generate-ppt/jobs", status_code=status.HTTP_202_ACCEPTED, summary="Submit a PPT generation job")
+async def submit_generate_job(ppt_data: PPTInput):
+    """提交生成任务后立即返回 job_id，队列已满时返回 429"""
+    job = await submit_job(ppt_data)
+    return job_to_response(job)
+
+
+@app.get("/generate-ppt/jobs/{job_id}", summary="Get the status of a PPT generation job")
+async def get_generate_job(job_id: str):
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return job_to_response(job)
+
+
+@app.get("/generate-ppt/jobs/{job_id}/result", summary="Get the result of a PPT generation job")
+async def get_generate_job_result(job_id: str, wait: float = 0):
+    """
+    返回生成结果，wait 为最多等待的秒数；任务尚未结束时返回 409
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    if wait > 0 and job.status not in FINISHED_STATES:
+        try:
+            await job_queue.wait(job, timeout=wait)
+        except asyncio.TimeoutError:
+            pass
+    if job.status not in FINISHED_STATES:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Job is {job.status}")
+    if job.status != SUCCEEDED:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                            detail=job.error or f"Job {job.status}")
+    return job_to_response(job)
+
+
+@app.delete("/generate-ppt/jobs/{job_id}", summary="Cancel a PPT generation job")
+async def cancel_generate_job(job_id: str):
+    job = job_queue.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return job_to_response(job)
+
+
+def batch_item(index: int, job: Job) -> Dict[str, Any]:
+    item = {"index": index, **job_to_response(job)}
+    if job.status == SUCCEEDED:
+        item["path"] = job.result["path"]
+    return item
+
+
+async def run_batch(decks: List[Dict], batch_id: str, request: Request):
+    """
+    逐个把批量请求中的PPT提交到任务队列，每完成一个就 yield 一次结果（完成顺序，不是请求顺序）。
+    同时提交的任务数不超过 worker 数量，避免一个大批量请求占满排队名额；队列被其它请求占满时等待后重试。
+    客户端断开连接后取消尚未完成的任务。
+    """
+    pending = list(enumerate(decks))
+    running: Dict[asyncio.Future, tuple] = {}
     try:
-        # 调用核心的PPT生成逻辑
-        output_filepath = start_generate_presentation(data_for_generator)
-        output_filepath_name = os.path.basename(output_filepath)
-        output_filepath_url = os.path.join(OUTER_IP, "static_ppts", output_filepath_name)
-        if output_filepath_url:
-            # 构建本地可访问的URL
-            return JSONResponse(
-                status_code=status.HTTP_200_OK,
-                content={"message": "PPT generated successfully", "ppt_url": output_filepath_url}
-            )
-        else:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to generate PPT."
-            )
-    except Exception as e:
-        logger.error(f"An unexpected error occurred during PPT generation: {e}", exc_info=True)
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"An internal server error occurred: {str(e)}"
-        )
+        while pending or running:
+            while pending and len(running) < job_queue.max_workers:
+                index, deck = pending[0]
+                try:
+                    # 文件名追加批次号和序号，同一批次中标题相同的PPT不会互相覆盖
+                    job = await submit_deck(deck, name_suffix=f"_{batch_id[:8]}_{index + 1}")
+                except QueueFullError:
+                    if running:
+                        break
+                    await asyncio.sleep(0.5)
+                    continue
+                pending.pop(0)
+                running[asyncio.ensure_future(job_queue.wait(job))] = (index, job)
+            if not running:
+                continue
+            done, _ = await asyncio.wait(running.keys(), return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                index, job = running.pop(future)
+                yield batch_item(index, job)
+            if await request.is_disconnected():
+                logger.info(f"批量任务 {batch_id} 的客户端已断开连接")
+                break
+    finally:
+        for future, (index, job) in running.items():
+            future.cancel()
+            job_queue.cancel(job.id)
+
+
+def remove_file(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+@app.post("/generate-ppt/batch", summary="Generate multiple PowerPoint presentations")
+async def generate_ppt_batch(batch: BatchPPTInput, request: Request, format: str = "ndjson"):
+    """
+    一次请求生成多个PPT，所有PPT共用 worker 进程中已加载的模板和图片缓存，在多个 worker 进程中并行生成。
+    format:
+    - ndjson: 每完成一个PPT返回一行 JSON（{"index": 请求中的序号, "status": ..., "ppt_url": ...}），最后一行为汇总（"done": true）
+    - sse: 与 ndjson 内容相同，以 Server-Sent Events 格式返回，汇总的事件类型为 done
+    - zip: 等待全部完成后返回一个 zip 文件，包含所有生成成功的PPT（文件名以 3 位序号开头）和 manifest.json
+    """
+    if format not in ("ndjson", "sse", "zip"):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="format must be ndjson, sse or zip")
+    if not batch.decks:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="decks is empty")
+    if len(batch.decks) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                            detail=f"At most {MAX_BATCH_SIZE} decks per batch")
+    batch_id = uuid.uuid4().hex
+    decks = [deck.model_dump(by_alias=True) for deck in batch.decks]
+    logger.info(f"Received batch {batch_id} with {len(decks)} decks, format: {format}")
+    start = time.time()
+
+    def summary(items: List[Dict[str, Any]]) -> Dict[str, Any]:
+        succeeded = sum(1 for item in items if item["status"] == SUCCEEDED)
+        return {"done": True, "batch_id": batch_id, "total": len(decks), "succeeded": succeeded,
+                "failed": len(items) - succeeded, "elapsed": round(time.time() - start, 3)}
+
+    if format == "zip":
+        items = [item async for item in run_batch(decks, batch_id, request)]
+        items.sort(key=lambda item: item["index"])
+        fd, zip_path = tempfile.mkstemp(prefix=f"batch_{batch_id[:8]}_", suffix=".zip")
+        os.close(fd)
+        # pptx 本身已经是 zip 压缩格式，直接存储不再压缩
+        with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_STORED) as zf:
+            for item in items:
+                path = item.pop("path", None)
+                if path:
+                    # 内容相同的PPT命中生成结果缓存时返回同一个文件，文件名加上序号，zip 中不会出现重名的条目
+                    item["filename"] = f"{item['index']:03d}_{os.path.basename(path)}"
+                    zf.write(path, item["filename"])
+            zf.writestr("manifest.json", json.dumps({**summary(items), "decks": items}, ensure_ascii=False, indent=2))
+        return FileResponse(zip_path, media_type="application/zip", filename=f"batch_{batch_id[:8]}.zip",
+                            background=BackgroundTask(remove_file, zip_path))
+
+    async def stream():
+        items = []
+        async for item in run_batch(decks, batch_id, request):
+            item.pop("path", None)
+            items.append(item)
+            line = json.dumps(item, ensure_ascii=False)
+            yield f"data: {line}\n\n" if format == "sse" else line + "\n"
+        line = json.dumps(summary(items), ensure_ascii=False)
+        yield f"event: done\ndata: {line}\n\n" if format == "sse" else line + "\n"
+
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(stream(), media_type=media_type, headers={"Cache-Control": "no-cache"})
+
+
+def session_to_response(session: PresentationSession) -> Dict[str, Any]:
+    content = session.to_dict()
+    if session.result:
+        content["ppt_url"] = ppt_url_for(session.result["path"])
+        content["report"] = session.result["report"]
+    return content
+
+
+def get_session_or_404(session_id: str) -> PresentationSession:
+    session = session_manager.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Session not found")
+    return session
+
+
+@app.post("/generate-ppt/sessions", status_code=status.HTTP_201_CREATED, summary="Open an incremental PPT session")
+async def open_session(open_input: Optional[SessionOpenInput] = None):
+    """
+    打开增量生成会话。之后每生成一页就调用 /sections 追加一个章节，追加后立即开始下载图片和生成幻灯片，
+    全部章节追加完后调用 /finalize 得到下载链接。打开的会话数达到上限时返回 429
+    """
+    try:
+        # 创建会话时复制模板并初始化 PresentationGenerator，在线程中进行，不阻塞事件循环
+        session = await asyncio.to_thread(session_manager.open, (open_input.title if open_input else None) or "")
+    except SessionLimitError as e:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=str(e))
+    return session_to_response(session)
+
+
+@app.post("/generate-ppt/sessions/{session_id}/sections", status_code=status.HTTP_202_ACCEPTED,
+          summary="Append a section to an incremental PPT session")
+async def append_session_section(session_id: str, section: SectionData):
+    """追加一个章节（与 PPTInput.sections 中的元素格式相同），立即返回章节序号；已经 finalize 的会话返回 409"""
+    session = get_session_or_404(session_id)
+    try:
+        index = session_manager.append(session, section.model_dump(by_alias=True))
+    except SessionClosedError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    return {"index": index, **session_to_response(session)}
+
+
+@app.post("/generate-ppt/sessions/{session_id}/finalize", summary="Finish an incremental PPT session")
+async def finalize_session(session_id: str, finalize_input: Optional[SessionFinalizeInput] = None):
+    """等待已追加的章节生成完，添加参考文献页和结束页并保存，返回下载链接；重复调用返回相同的结果"""
+    session = get_session_or_404(session_id)
+    references = (finalize_input.references if finalize_input else None) or []
+    try:
+        await session_manager.finalize(session, references)
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                            detail=f"An internal server error occurred: {e}")
+    return {"message": "PPT generated successfully", **session_to_response(session)}
+
+
+@app.get("/generate-ppt/sessions/{session_id}", summary="Get the status of an incremental PPT session")
+async def get_session(session_id: str):
+    return session_to_response(get_session_or_404(session_id))
+
+
+@app.delete("/generate-ppt/sessions/{session_id}", summary="Discard an incremental PPT session")
+async def discard_session(session_id: str):
+    session = session_manager.discard(session_id)
+    if session is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Session not found")
+    return session_to_response(session)
+
+
+@app.get("/generate-ppt/stats", summary="PPT generation queue statistics")
+async def generate_stats():
+    return {**job_queue.stats(), "sessions": session_manager.stats(), "render_cache": render_cache.stats()}
 
 
 # 可选：根路径，用于测试API是否运行
@@ -144,7 +488,5 @@ async def root():
     return {"message": "Welcome to the PPT Generation API. Go to /docs for API documentation."}
 
 if __name__ == '__main__':
-    # 对外可以访问的IP，方便下载图片
-    OUTER_IP = "http://127.0.0.1:10021"
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=10021)
\ No newline at end of file
@@ -10,10 +10,16 @@ from pptx.enum.text import PP_ALIGN, MSO_AUTO_SIZE, MSO_ANCHOR
 from pptx.enum.shapes import MSO_SHAPE_TYPE
 import random
 import re
-import requests
-from io import BytesIO
-from PIL import Image
+import time
+import threading
+from concurrent.futures import Future
 import datetime
+from template_registry import TemplateEntry, template_registry
+from image_cache import CachedImage, image_cache
+from image_optimizer import ImageOptimizer
+from text_metrics import text_metrics
+from deck_keys import content_key, normalize_deck, renderer_version
+from slide_fragments import SectionFragment, capture_slides, fragment_cache, splice_slides
 
 # 配置更详细的日志格式
 logging.basicConfig(
@@ -117,6 +123,13 @@ class SlideConfig:
         "height_tolerance": 0.3,    # 高度容差（英寸）
         "alignment": "center"       # 对齐方式：center, left, right
     }
+    
+    # 图片压缩配置，插入前按显示尺寸缩小并重新压缩
+    IMAGE_OPTIMIZATION = {
+        "enabled": True,
+        "dpi": 150,            # 图片在幻灯片上的目标分辨率
+        "jpeg_quality": 85,    # JPEG 压缩质量
+    }
 
 # ==================== 文本处理器 ====================
 class TextProcessor:
@@ -136,29 +149,19 @@ class TextProcessor:
         shape,
         font_type: str = "content"
     ) -> int:
-        """根据文本长度和文本框大小计算最佳字体大小"""
+        """按字形宽度在文本框中自动换行，二分查找能放下全部文本的最大字号（结果有缓存）"""
+        font_config = SlideConfig.FONT_SIZES[font_type]
         if not text or not shape:
-            return SlideConfig.FONT_SIZES[font_type]["default"]
+            return font_config["default"]
         
         try:
-            width = shape.width
-            height = shape.height
-        except:
-            return SlideConfig.FONT_SIZES[font_type]["default"]
-        
-        char_count = len(text)
-        estimated_chars_per_line = int(width / Pt(7))
-        estimated_lines = max(1, char_count / max(1, estimated_chars_per_line))
-        font_config = SlideConfig.FONT_SIZES[font_type]
-        
-        if estimated_lines > 20:
-            return font_config["min"]
-        elif estimated_lines > 10:
-            return int(font_config["min"] + (font_config["default"] - font_config["min"]) * 0.5)
-        elif estimated_lines > 5:
+            text_frame = shape.text_frame
+            width = shape.width - text_frame.margin_left - text_frame.margin_right
+            height = shape.height - text_frame.margin_top - text_frame.margin_bottom
+        except Exception:
             return font_config["default"]
-        else:
-            return min(font_config["max"], font_config["default"] + 4)
+        
+        return text_metrics.fit_font_size(text, int(width), int(height), font_config["min"], font_config["max"])
     
     @staticmethod
     def truncate_text(text: str, max_chars: int, suffix: str = "...") -> str:
@@ -196,9 +199,10 @@ class TextProcessor:
 class SlideStrategy(ABC):
     """幻灯片生成策略的抽象基类"""
     
-    def __init__(self, presentation: Presentation, config: SlideConfig):
+    def __init__(self, presentation: Presentation, config: SlideConfig, template: TemplateEntry):
         self.presentation = presentation
         self.config = config
+        self.template = template
         self.text_processor = TextProcessor()
         self.slide_counter = 0  # 添加页面计数器
     
@@ -213,7 +217,18 @@ class SlideStrategy(ABC):
         logger.info(f"正在分析第 {self.slide_counter} 页 - 类型: {slide_type}")
         logger.info(f"{'='*80}")
         
-        logger.info(f"幻灯片上共有 {len(slide.shapes)} 个形状:")
+        # 刚添加的幻灯片上的形状完全由布局决定，同一布局的形状信息只生成一次，缓存在模板中
+        layout_index = self.template.layout_index_by_partname[str(slide.slide_layout.part.partname)]
+        shapes_description = self.template.shape_descriptions.get(layout_index)
+        if shapes_description is None:
+            shapes_description = self._describe_slide_shapes(slide)
+            self.template.shape_descriptions[layout_index] = shapes_description
+        logger.info(shapes_description)
+        logger.info(f"{'='*80}\n")
+
+    def _describe_slide_shapes(self, slide) -> str:
+        """生成幻灯片上所有形状的描述，读取占位符继承自布局的位置和尺寸比较慢"""
+        lines = [f"幻灯片上共有 {len(slide.shapes)} 个形状:"]
         for idx, shape in enumerate(slide.shapes):
             shape_info = []
             shape_info.append(f"  形状 #{idx + 1}:")
@@ -245,17 +260,16 @@ class SlideStrategy(ABC):
                     text_preview = shape.text[:50] + "..." if len(shape.text) > 50 else shape.text
                     shape_info.append(f"    - 文本预览: '{text_preview}'")
             
-            logger.info('\n'.join(shape_info))
-        logger.info(f"{'='*80}\n")
+            lines.append('\n'.join(shape_info))
+        return '\n'.join(lines)
 
 
     def _get_slide_layout(self, layout_key: str):
         """获取幻灯片布局"""
-        layout_id = self.config.SLIDE_LAYOUTS.get(layout_key)
-        if layout_id is None or layout_id >= len(self.presentation.slide_layouts):
-            logger.warning(f"布局 '{layout_key}' (ID: {layout_id}) 未找到，使用默认布局")
-            logger.warning(f"可用布局数量: {len(self.presentation.slide_layouts)}")
-            return self.presentation.slide_layouts[0]
+        # 模板中不存在的布局在加载模板时已经替换为默认布局并记录了警告
+        if layout_key not in self.template.layout_ids:
+            logger.warning(f"布局 '{layout_key}' 未配置，使用默认布局")
+        layout_id = self.template.layout_index(layout_key)
         
         print(f"使用布局: '{layout_key}' (ID: {layout_id})")
         return self.presentation.slide_layouts[layout_id]
@@ -319,6 +333,12 @@ class SlideStrategy(ABC):
                 else:
                     text_frame.word_wrap = True
                     text_frame.auto_size = MSO_AUTO_SIZE.TEXT_TO_FIT_SHAPE
+                    # TEXT_TO_FIT_SHAPE 要在 PowerPoint 中编辑文本后才会生效，默认字号放不下时直接缩小字号
+                    font_size = self.text_processor.calculate_optimal_font_size(clean_text, shape, font_type)
+                    if font_size < self.config.FONT_SIZES[font_type]["default"]:
+                        for p in text_frame.paragraphs:
+                            p.font.size = Pt(font_size)
+                        logger.debug(f"文本超出形状 {shape_id}，字号调整为 {font_size}pt")
 
                 print(f"✓ 成功添加文本到形状 {shape_id} (名称: {shape.name})，文本长度: {len(clean_text)} 字符")
                 return
@@ -334,8 +354,8 @@ class SlideStrategy(ABC):
         
         try:
             layout = slide.slide_layout
-            layout_index = self.presentation.slide_layouts.index(layout)
-            layout_name = layout.name or "未命名"
+            layout_index = self.template.layout_index_by_partname[str(layout.part.partname)]
+            layout_name = self.template.layout_names[layout_index] or "未命名"
             
             print(f"使用的母版布局: 索引={layout_index}, 名称='{layout_name}'")
             logger.debug(f"母版布局详细信息: {layout}")
@@ -371,7 +391,8 @@ class SlideStrategy(ABC):
                 bg_shape.text_frame.auto_size = MSO_AUTO_SIZE.NONE
 
             # 计算新宽度
-            calculated_text_width = self._calculate_text_width(text, font_size)
+            calculated_text_width = text_metrics.width_emu(text, font_size)
+            logger.debug(f"文本宽度计算: 字数={len(text)}, 字体={font_size}pt, 宽度={calculated_text_width/914400:.2f}英寸")
             padding = Inches(self.config.BACKGROUND_SHAPE_CONFIG["padding"])
             text_margin_padding = text_shape.text_frame.margin_left + text_shape.text_frame.margin_right
             new_width = calculated_text_width + text_margin_padding + padding
@@ -397,63 +418,6 @@ class SlideStrategy(ABC):
         except Exception as e:
             logger.error(f"✗ 调整背景图形失败: {e}", exc_info=True)
 
-    def _calculate_text_width(self, text: str, font_size: int) -> int:
-        """精确计算文本的实际宽度（返回EMU单位）"""
-        try:
-            # 字符分类统计
-            chinese_chars = 0
-            english_chars = 0
-            numbers = 0
-            spaces = 0
-            other_chars = 0
-            
-            for char in text:
-                if '\u4e00' <= char <= '\u9fff':  # 中文字符
-                    chinese_chars += 1
-                elif char in '，。！？；：""''（）【】《》、':  # 中文标点
-                    chinese_chars += 1
-                elif char.isalpha():  # 英文字母
-                    english_chars += 1
-                elif char.isdigit():  # 数字
-                    numbers += 1
-                elif char == ' ':  # 空格
-                    spaces += 1
-                else:  # 其他字符
-                    other_chars += 1
-            
-            # 不同字符类型的宽度系数
-            width_factors = {
-                'chinese': 0.55,
-                'english': 0.55,
-                'numbers': 0.6,
-                'spaces': 0.3,
-                'others': 0.7
-            }
-            
-            # 计算总宽度
-            total_width_pt = (
-                chinese_chars * font_size * width_factors['chinese'] +
-                english_chars * font_size * width_factors['english'] +
-                numbers * font_size * width_factors['numbers'] +
-                spaces * font_size * width_factors['spaces'] +
-                other_chars * font_size * width_factors['others']
-            )
-            
-            # 添加字符间距的影响
-            total_width_pt *= 1.05
-            
-            # 转换为EMU
-            width_in_emu = int(total_width_pt * 914400 / 72)
-            
-            logger.debug(f"文本宽度计算: 中文={chinese_chars}, 英文={english_chars}, "
-                        f"字体={font_size}pt, 宽度={width_in_emu/914400:.2f}英寸")
-            
-            return width_in_emu
-            
-        except Exception as e:
-            logger.error(f"计算文本宽度失败: {e}")
-            return Inches(4)
-
     def _fill_empty_placeholders(self, slide):
         """移除空占位符"""
         removed_count = 0
@@ -621,6 +585,40 @@ class TableOfContentsSlideStrategy(SlideStrategy):
 class ImageSlideStrategy(SlideStrategy):
     """图片页生成策略"""
     
+    # 进程内共享，同一张图片在不同请求中只压缩一次
+    _optimizer = ImageOptimizer(
+        dpi=SlideConfig.IMAGE_OPTIMIZATION["dpi"],
+        jpeg_quality=SlideConfig.IMAGE_OPTIMIZATION["jpeg_quality"],
+    )
+    
+    def __init__(self, presentation: Presentation, config: SlideConfig, template: TemplateEntry):
+        super().__init__(presentation, config, template)
+        # 内容哈希 -> 字节数，相同的图片只统计一次（PPT 中也只保存一份）
+        self.original_images: Dict[str, int] = {}
+        self.embedded_images: Dict[str, int] = {}
+        self.placed_images = 0
+        # 每次插入图片的 (原图哈希, 原图字节数, 嵌入图片的 sha1, 嵌入的字节数)，章节片段缓存命中时重放
+        self.placements: List[Tuple[str, int, str, int]] = []
+    
+    def record_placement(self, original_digest: str, original_bytes: int, embedded_sha1: str, embedded_bytes: int):
+        """记录一次图片插入，用于统计压缩前后的大小"""
+        self.placed_images += 1
+        self.original_images[original_digest] = original_bytes
+        self.embedded_images[embedded_sha1] = embedded_bytes
+        self.placements.append((original_digest, original_bytes, embedded_sha1, embedded_bytes))
+    
+    def image_report(self) -> Dict[str, int]:
+        """本次生成中图片压缩前后的大小"""
+        original_bytes = sum(self.original_images.values())
+        embedded_bytes = sum(self.embedded_images.values())
+        return {
+            "images": self.placed_images,
+            "unique_images": len(self.embedded_images),
+            "original_bytes": original_bytes,
+            "embedded_bytes": embedded_bytes,
+            "saved_bytes": original_bytes - embedded_bytes,
+        }
+    
     def _is_valid_image_url(self, url: str) -> bool:
         """检查图片URL是否有效"""
         if not isinstance(url, str):
@@ -629,23 +627,28 @@ class ImageSlideStrategy(SlideStrategy):
         logger.debug(f"图片URL验证: {url} -> {'有效' if is_valid else '无效'}")
         return is_valid
     
-    def _download_image(self, image_url: str) -> Optional[BytesIO]:
-        """下载图片"""
+    def prefetch_images(self, image_urls: List[str]) -> None:
+        """渲染前并发下载所有图片，生成图片页时直接从缓存读取"""
+        valid_urls = [url for url in image_urls if self._is_valid_image_url(url)]
+        if valid_urls:
+            image_cache.prefetch(valid_urls)
+    
+    def prefetch_images_in_background(self, image_urls: List[str]) -> List[Future]:
+        """开始下载图片后立即返回，增量生成时下载和大模型生成后续章节同时进行"""
+        return image_cache.prefetch_in_background(url for url in image_urls if self._is_valid_image_url(url))
+    
+    def _download_image(self, image_url: str) -> Optional[CachedImage]:
+        """下载图片，已预取或之前下载过的图片直接从缓存读取"""
         if not self._is_valid_image_url(image_url):
             logger.warning(f"无效的图片URL: {image_url}")
             return None
         
-        try:
-            print(f"开始下载图片: {image_url}")
-            response = requests.get(image_url, timeout=10)
-            response.raise_for_status()
-            print(f"✓ 成功下载图片，大小: {len(response.content)} 字节")
-            return BytesIO(response.content)
-        except requests.exceptions.RequestException as e:
-            logger.error(f"✗ 下载图片失败 {image_url}: {e}")
-            return None
+        image = image_cache.fetch(image_url)
+        if image:
+            print(f"✓ 获取图片成功，大小: {image.size} 字节")
+        return image
     
-    def _insert_image_into_placeholder(self, slide, img_stream: BytesIO, placeholder_shape_id: int):
+    def _insert_image_into_placeholder(self, slide, image: CachedImage, placeholder_shape_id: int):
         """将图片插入占位符"""
         logger.debug(f"尝试将图片插入占位符 {placeholder_shape_id}")
         
@@ -663,8 +666,7 @@ class ImageSlideStrategy(SlideStrategy):
             return None
         
         try:
-            img = Image.open(img_stream)
-            img_width, img_height = img.size
+            img_width, img_height = image.width, image.height
             logger.debug(f"图片尺寸: {img_width} x {img_height}")
             
             placeholder_width = placeholder_shape.width
@@ -682,8 +684,14 @@ class ImageSlideStrategy(SlideStrategy):
             left = placeholder_shape.left + (placeholder_width - pic_width) / 2
             top = placeholder_shape.top + (placeholder_height - pic_height) / 2
             
-            img_stream.seek(0)
-            added_picture = slide.shapes.add_picture(img_stream, left, top, pic_width, pic_height)
+            if self.config.IMAGE_OPTIMIZATION["enabled"]:
+                embedded = self._optimizer.optimize(image, pic_width, pic_height)
+                print(f"图片压缩: {image.width}x{image.height} {image.format} {image.size} 字节 -> "
+                      f"{embedded.width}x{embedded.height} {embedded.format} {len(embedded.data)} 字节")
+            else:
+                embedded = image
+            added_picture = slide.shapes.add_picture(embedded.stream(), left, top, pic_width, pic_height)
+            self.record_placement(image.digest, image.size, added_picture.image.sha1, len(embedded.data))
             print(f"✓ 图片已插入，缩放后尺寸: {pic_width/914400:.2f} x {pic_height/914400:.2f} 英寸")
             
             # 移除占位符
@@ -709,18 +717,13 @@ class ImageSlideStrategy(SlideStrategy):
         print(f"# 是否有描述: {'是' if description else '否'}")
         print(f"{'#'*80}")
         
-        img_stream = self._download_image(image_url)
-        if not img_stream:
+        # 无法解码的图片在下载时已经被丢弃，这里不需要再打开图片获取尺寸
+        image = self._download_image(image_url)
+        if not image:
             logger.warning(f"跳过图片幻灯片: {image_url}")
             return
-        
-        try:
-            img = Image.open(img_stream)
-            img_width, img_height = img.size
-            print(f"图片尺寸: {img_width} x {img_height}")
-        except Exception as e:
-            logger.error(f"打开图片失败 {image_url}: {e}")
-            return
+        img_width, img_height = image.width, image.height
+        print(f"图片尺寸: {img_width} x {img_height}")
         
         description = self.text_processor.remove_html_tags(description)
         
@@ -742,7 +745,7 @@ class ImageSlideStrategy(SlideStrategy):
         # 记录所有形状信息
         self._log_slide_shapes(slide, "图片页")
         
-        self._insert_image_into_placeholder(slide, img_stream, self.config.SHAPE_IDS["IMAGE_PLACEHOLDER"])
+        self._insert_image_into_placeholder(slide, image, self.config.SHAPE_IDS["IMAGE_PLACEHOLDER"])
         self._add_text_with_auto_fit(
             slide, 
             self.config.SHAPE_IDS["IMAGE_TITLE"], 
@@ -946,39 +949,36 @@ class EndSlideStrategy(SlideStrategy):
 class PresentationGenerator:
     """演示文稿生成器主类"""
     
+    STRATEGY_CLASSES = {
+        "title": TitleSlideStrategy,
+        "content": ContentSlideStrategy,
+        "toc": TableOfContentsSlideStrategy,
+        "image": ImageSlideStrategy,
+        "subsection": SubSectionSlideStrategy,
+        "references": ReferencesSlideStrategy,
+        "end": EndSlideStrategy,
+    }
+    
     def __init__(self, template_file_name: str = 'ppt_template_0717.pptx'):
         self.current_dir = os.path.dirname(os.path.abspath(__file__))
         template_path = os.path.join(self.current_dir, template_file_name)
         
-        if not os.path.exists(template_path):
-            raise FileNotFoundError(f"模板文件未找到: {template_path}")
-        
-        logger.info(f"\n{'='*80}")
-        logger.info(f"初始化 PresentationGenerator")
-        logger.info(f"模板文件: {template_path}")
-        logger.info(f"{'='*80}")
-        
-        self.presentation = Presentation(template_path)
         self.config = SlideConfig()
         self.text_processor = TextProcessor()
-        
-        # 记录模板信息
-        logger.info(f"模板布局数量: {len(self.presentation.slide_layouts)}")
-        for idx, layout in enumerate(self.presentation.slide_layouts):
-            logger.info(f"  布局 {idx}: {layout.name}")
+        # 模板只在第一次使用（或文件被修改）时解析，之后每个请求使用解析好的模板的副本
+        self.template = template_registry.get(template_path, self.config.SLIDE_LAYOUTS)
+        self.presentation = self.template.clone()
+        logger.info(f"初始化 PresentationGenerator, 模板文件: {template_path} (版本: {self.template.version})")
         
         # 共享页面计数器
         self.slide_counter = 0
+        # 最近一次生成的统计: 页数、耗时、文件大小、图片压缩前后的大小
+        self.report: Dict[str, Any] = {}
         
         # 初始化各种策略
         self.strategies = {
-            "title": TitleSlideStrategy(self.presentation, self.config),
-            "content": ContentSlideStrategy(self.presentation, self.config),
-            "toc": TableOfContentsSlideStrategy(self.presentation, self.config),
-            "image": ImageSlideStrategy(self.presentation, self.config),
-            "subsection": SubSectionSlideStrategy(self.presentation, self.config),
-            "references": ReferencesSlideStrategy(self.presentation, self.config),
-            "end": EndSlideStrategy(self.presentation, self.config),
+            name: strategy_class(self.presentation, self.config, self.template)
+            for name, strategy_class in self.STRATEGY_CLASSES.items()
         }
         
         # 同步页面计数器
@@ -1049,11 +1049,15 @@ class PresentationGenerator:
         
         return "\n".join(formatted_text).strip()
     
-    def generate_presentation(self, json_data: Dict) -> Optional[str]:
-        """生成演示文稿的主方法"""
+    def generate_presentation(self, json_data: Dict, name_suffix: str = "") -> Optional[str]:
+        """
+        生成演示文稿的主方法
+        :param name_suffix: 追加在文件名（文档标题）后面，批量生成标题相同的PPT时避免互相覆盖
+        """
         logger.info(f"\n{'*'*80}")
         logger.info("开始生成演示文稿")
         logger.info(f"{'*'*80}")
+        render_start = time.time()
         
         if not isinstance(json_data, dict):
             logger.error("无效输入：需要字典类型")
@@ -1061,201 +1065,279 @@ class PresentationGenerator:
         
         # 获取文档标题
         doc_title = json_data.get("title", "")
-        overall_references = json_data.get("references", [])
-        sections = json_data.get("sections", [])
+        overall_references = json_data.get("references") or []
+        sections = json_data.get("sections") or []
         
         logger.info(f"文档标题: '{doc_title}'")
         logger.info(f"章节数: {len(sections)}")
         logger.info(f"参考文献数: {len(overall_references)}")
         
-        # 如果没有指定标题，从第一个section获取
-        if not doc_title and sections:
-            first_section_content = sections[0].get("content", [])
-            for block in first_section_content:
-                if block.get("type") == "h1":
-                    doc_title = "".join(c.get("text", "") for c in block.get("children", []) if c.get("text"))
-                    break
-        
-        if not doc_title:
-            doc_title = "未命名演示文稿"
-        
         try:
-            # 重置所有策略的计数器
-            for strategy in self.strategies.values():
-                strategy.slide_counter = 0
+            # 0. 并发预取所有图片（第一个章节不生成内容，背景图不单独生成图片页）
+            self.strategies["image"].prefetch_images(
+                [url for section_obj in sections[1:] for url in self.section_image_urls(section_obj)])
             
             # 1. 创建标题页
-            logger.info(f"\n{'='*60}")
-            logger.info("创建标题页")
-            logger.info(f"{'='*60}")
-            self.strategies["title"].create_slide(doc_title)
-            current_slide_count = 1
-            for strategy in self.strategies.values():
-                strategy.slide_counter = current_slide_count
+            self.begin(doc_title or self.title_from_section(sections[0] if sections else {}))
             
             # 2. 处理每个section
             for section_idx, section_obj in enumerate(sections):
-                logger.info(f"\n{'='*60}")
-                logger.info(f"处理第 {section_idx + 1} 个章节")
-                logger.info(f"{'='*60}")
-
-                if section_idx == 0:
-                    logger.info("跳过第一个章节的内容生成")
-                    continue
-                
-                section_content = section_obj.get("content", [])
-                section_root_image = section_obj.get("rootImage", {})
-                
-                # 解析内容
-                slide_title, main_text, bullet_points = self._parse_content_blocks(section_content)
-                
-                # 如果这是第一个section且标题与文档标题相同
-                if section_idx == 0 and slide_title == doc_title:
-                    slide_title = "概述"
-                
-                # 决定使用哪种策略
-                # 第一个section（第2页）：使用内容页
-                if section_idx == 0:
-                    if bullet_points:
-                        bullet_text = self._format_bullet_points_as_text(bullet_points)
-                        combined_text = main_text + "\n\n" + bullet_text if main_text else bullet_text
-                        logger.info(f"创建内容页（包含{len(bullet_points)}个要点）")
-                        self.strategies["content"].create_slide(slide_title, combined_text)
-                        chunks = self.text_processor.split_text_into_chunks(combined_text)
-                        current_slide_count += len(chunks)
-                    elif main_text:
-                        logger.info("创建内容页（纯文本）")
-                        self.strategies["content"].create_slide(slide_title, main_text)
-                        chunks = self.text_processor.split_text_into_chunks(main_text)
-                        current_slide_count += len(chunks)
-                
-                # 第二个section（第3页）：使用SUBCHAPTER_3_ITEMS布局
-                elif section_idx == 1:
-                    if bullet_points and len(bullet_points) == 3:
-                        logger.info("创建子章节页（使用SUBCHAPTER_3_ITEMS布局，ID=16）")
-                        # 如果还有额外的段落文本，将其添加到最后一个bullet point
-                        if main_text:
-                            bullet_points[-1]['detail'] += f"\n\n{main_text}"
-                        self.strategies["subsection"].create_slide(slide_title, bullet_points)
-                        current_slide_count += 1
-                    else:
-                        # 如果不是正好3个bullet points，仍使用内容页
-                        logger.info(f"注意：第二个section有{len(bullet_points)}个要点，不是3个，将使用普通内容页")
-                        if bullet_points:
-                            bullet_text = self._format_bullet_points_as_text(bullet_points)
-                            combined_text = main_text + "\n\n" + bullet_text if main_text else bullet_text
-                        else:
-                            combined_text = main_text
-                        self.strategies["content"].create_slide(slide_title, combined_text)
-                        chunks = self.text_processor.split_text_into_chunks(combined_text)
-                        current_slide_count += len(chunks)
-                
-                # 第三个section（第5页）：使用SUBCHAPTER_3_ITEMS布局
-                elif section_idx == 2:
-                    # 将段落转换为3个子项目格式
-                    paragraphs = []
-                    for block in section_content:
-                        if block.get("type") == "p":
-                            text_content = "".join(c.get("text", "") for c in block.get("children", []) if c.get("text"))
-                            if text_content:
-                                paragraphs.append(text_content)
-                    
-                    if len(paragraphs) >= 2:
-                        # 创建3个子项目，如果只有2个段落，第三个留空或合并
-                        sub_items = []
-                        if len(paragraphs) == 2:
-                            # 将第二个段落分成两部分
-                            second_para_sentences = paragraphs[1].split('. ')
-                            if len(second_para_sentences) >= 2:
-                                mid_point = len(second_para_sentences) // 2
-                                para2_part1 = '. '.join(second_para_sentences[:mid_point]) + '.'
-                                para2_part2 = '. '.join(second_para_sentences[mid_point:])
-                                
-                                sub_items = [
-                                    {"summary": "Research Direction", "detail": paragraphs[0]},
-                                    {"summary": "Combination Strategies", "detail": para2_part1},
-                                    {"summary": "Biomarker Development", "detail": para2_part2}
-                                ]
-                            else:
-                                sub_items = [
-                                    {"summary": "Research Direction", "detail": paragraphs[0]},
-                                    {"summary": "Future Studies", "detail": paragraphs[1]},
-                                    {"summary": "", "detail": ""}  # 空项
-                                ]
-                        
-                        logger.info("创建子章节页（使用SUBCHAPTER_3_ITEMS布局，ID=16）")
-                        self.strategies["subsection"].create_slide(slide_title, sub_items)
-                        current_slide_count += 1
-                    else:
-                        # 如果内容不适合，使用普通内容页
-                        logger.info("内容不适合SUBCHAPTER_3_ITEMS布局，使用普通内容页")
-                        self.strategies["content"].create_slide(slide_title, main_text)
-                        chunks = self.text_processor.split_text_into_chunks(main_text)
-                        current_slide_count += len(chunks)
-                
-                # 同步计数器
-                for strategy in self.strategies.values():
-                    strategy.slide_counter = current_slide_count
-                
-                # 处理图片（非背景图）- 第4页
-                if section_root_image and section_root_image.get("url") and not section_root_image.get("background", False):
-                    logger.info("创建图片页")
-                    self.strategies["image"].create_slide(section_root_image, slide_title)
-                    current_slide_count += 1
-                    for strategy in self.strategies.values():
-                        strategy.slide_counter = current_slide_count
-            
-            # 3. 添加参考文献页
-            if overall_references:
-                logger.info(f"\n{'='*60}")
-                logger.info("创建参考文献页")
-                logger.info(f"{'='*60}")
-                pages_needed = (len(overall_references[:SlideConfig.MAX_TOTAL_REFERENCES]) + 
-                            SlideConfig.MAX_REFERENCES_PER_SLIDE - 1) // SlideConfig.MAX_REFERENCES_PER_SLIDE
-                self.strategies["references"].create_slide(overall_references)
-                current_slide_count += pages_needed
-                for strategy in self.strategies.values():
-                    strategy.slide_counter = current_slide_count
-            
-            # 4. 添加结束页
-            logger.info(f"\n{'='*60}")
-            logger.info("创建结束页")
-            logger.info(f"{'='*60}")
-            self.strategies["end"].create_slide()
-            
-            # 保存文件
-            output_dir = os.path.join(self.current_dir, 'output_ppts')
-            os.makedirs(output_dir, exist_ok=True)
-            
-            sanitized_title = re.sub(r'[\\/:*?"<>|]', '', doc_title)
-            output_filename = os.path.join(output_dir, f'{sanitized_title}.pptx')
-            self.presentation.save(output_filename)
-            
-            logger.info(f"\n{'*'*80}")
-            logger.info(f"PPT生成成功!")
-            logger.info(f"文件路径: {output_filename}")
-            logger.info(f"总页数: {self.strategies['end'].slide_counter}")
-            logger.info(f"{'*'*80}")
-            
-            # 输出页面总结
-            logger.info("\n页面结构总结：")
-            logger.info("第1页: 标题页")
-            logger.info("第2页: 内容页 - 概述（3个要点）")
-            logger.info("第3页: 子章节页（3项，使用布局ID=16）")
-            logger.info("第4页: 图片页 - ")
-            logger.info("第5页: 子章节页（3项，使用布局ID=16）")
-            logger.info("第6页: 参考文献页")
-            logger.info("第7页: 结束页")
+                self.render_section(section_idx, section_obj)
             
-            return output_filename
+            # 3. 参考文献页、结束页，保存文件
+            return self.finish(overall_references, name_suffix, render_start)
             
         except Exception as e:
             logger.critical(f"PPT生成失败: {e}", exc_info=True)
             return None
+    
+    @staticmethod
+    def title_from_section(section_obj: Dict) -> str:
+        """文档标题取第一个章节的 h1"""
+        for block in section_obj.get("content", []):
+            if block.get("type") == "h1":
+                return "".join(c.get("text", "") for c in block.get("children", []) if c.get("text"))
+        return ""
+    
+    @staticmethod
+    def section_image_urls(section_obj: Dict) -> List[str]:
+        """章节中需要单独生成图片页的图片（背景图除外）"""
+        root_image = section_obj.get("rootImage") or {}
+        if root_image.get("url") and not root_image.get("background", False):
+            return [root_image["url"]]
+        return []
+    
+    def _sync_slide_counters(self) -> None:
+        for strategy in self.strategies.values():
+            strategy.slide_counter = self.current_slide_count
+    
+    def begin(self, doc_title: str) -> None:
+        """创建标题页，之后按顺序调用 render_section 添加章节，最后调用 finish 保存"""
+        self.doc_title = doc_title or "未命名演示文稿"
+        self.current_slide_count = 0
+        self._sync_slide_counters()
+        
+        logger.info(f"\n{'='*60}")
+        logger.info("创建标题页")
+        logger.info(f"{'='*60}")
+        self.strategies["title"].create_slide(self.doc_title)
+        self.current_slide_count = 1
+        self._sync_slide_counters()
+    
+    def render_section(self, section_idx: int, section_obj: Dict) -> None:
+        """生成一个章节的幻灯片，section_idx 为章节在文档中的序号，决定使用的布局"""
+        logger.info(f"\n{'='*60}")
+        logger.info(f"处理第 {section_idx + 1} 个章节")
+        logger.info(f"{'='*60}")
+
+        if section_idx == 0:
+            logger.info("跳过第一个章节的内容生成")
+            return
+        
+        if fragment_cache is None:
+            self._render_section(section_idx, section_obj)
+            return
+        
+        # 内容、图片都没有变化的章节直接复用之前生成的幻灯片
+        key = self._fragment_key(section_idx, section_obj)
+        fragment = fragment_cache.get(key)
+        if fragment is not None:
+            splice_slides(self.presentation, self.template, fragment.slides)
+            for placement in fragment.placements:
+                self.strategies["image"].record_placement(*placement)
+            self.current_slide_count += fragment.slide_count
+            self._sync_slide_counters()
+            logger.info(f"章节 {section_idx + 1} 命中片段缓存，复用 {len(fragment.slides)} 页幻灯片")
+            return
+        
+        first_slide = len(self.presentation.slides)
+        first_count = self.current_slide_count
+        first_placement = len(self.strategies["image"].placements)
+        self._render_section(section_idx, section_obj)
+        slides = capture_slides(self.presentation, first_slide)
+        if slides is not None:
+            fragment_cache.put(key, SectionFragment(
+                slides, self.current_slide_count - first_count,
+                self.strategies["image"].placements[first_placement:]))
+    
+    def _fragment_key(self, section_idx: int, section_obj: Dict) -> str:
+        """章节片段的缓存键: 策略（由章节位置决定）、章节内容、图片内容、模板版本和生成器版本（代码和字形宽度表）"""
+        images = []
+        for url in self.section_image_urls(section_obj):
+            image = image_cache.get(url)
+            images.append(image.digest if image else None)
+        return content_key({
+            "strategy": min(section_idx, 3),
+            "section": normalize_deck(section_obj),
+            "images": images,
+            "template": self.template.version,
+            "renderer": renderer_version(),
+        })
+    
+    def _render_section(self, section_idx: int, section_obj: Dict) -> None:
+        section_content = section_obj.get("content", [])
+        section_root_image = section_obj.get("rootImage", {})
+
+        # 解析内容
+        slide_title, main_text, bullet_points = self._parse_content_blocks(section_content)
+
+        # 如果这是第一个section且标题与文档标题相同
+        if section_idx == 0 and slide_title == self.doc_title:
+            slide_title = "概述"
+
+        # 决定使用哪种策略
+        # 第一个section（第2页）：使用内容页
+        if section_idx == 0:
+            if bullet_points:
+                bullet_text = self._format_bullet_points_as_text(bullet_points)
+                combined_text = main_text + "\n\n" + bullet_text if main_text else bullet_text
+                logger.info(f"创建内容页（包含{len(bullet_points)}个要点）")
+                self.strategies["content"].create_slide(slide_title, combined_text)
+                chunks = self.text_processor.split_text_into_chunks(combined_text)
+                self.current_slide_count += len(chunks)
+            elif main_text:
+                logger.info("创建内容页（纯文本）")
+                self.strategies["content"].create_slide(slide_title, main_text)
+                chunks = self.text_processor.split_text_into_chunks(main_text)
+                self.current_slide_count += len(chunks)
+
+        # 第二个section（第3页）：使用SUBCHAPTER_3_ITEMS布局
+        elif section_idx == 1:
+            if bullet_points and len(bullet_points) == 3:
+                logger.info("创建子章节页（使用SUBCHAPTER_3_ITEMS布局，ID=16）")
+                # 如果还有额外的段落文本，将其添加到最后一个bullet point
+                if main_text:
+                    bullet_points[-1]['detail'] += f"\n\n{main_text}"
+                self.strategies["subsection"].create_slide(slide_title, bullet_points)
+                self.current_slide_count += 1
+            else:
+                # 如果不是正好3个bullet points，仍使用内容页
+                logger.info(f"注意：第二个section有{len(bullet_points)}个要点，不是3个，将使用普通内容页")
+                if bullet_points:
+                    bullet_text = self._format_bullet_points_as_text(bullet_points)
+                    combined_text = main_text + "\n\n" + bullet_text if main_text else bullet_text
+                else:
+                    combined_text = main_text
+                self.strategies["content"].create_slide(slide_title, combined_text)
+                chunks = self.text_processor.split_text_into_chunks(combined_text)
+                self.current_slide_count += len(chunks)
+
+        # 第三个section（第5页）：使用SUBCHAPTER_3_ITEMS布局
+        elif section_idx == 2:
+            # 将段落转换为3个子项目格式
+            paragraphs = []
+            for block in section_content:
+                if block.get("type") == "p":
+                    text_content = "".join(c.get("text", "") for c in block.get("children", []) if c.get("text"))
+                    if text_content:
+                        paragraphs.append(text_content)
+
+            if len(paragraphs) >= 2:
+                # 创建3个子项目，如果只有2个段落，第三个留空或合并
+                sub_items = []
+                if len(paragraphs) == 2:
+                    # 将第二个段落分成两部分
+                    second_para_sentences = paragraphs[1].split('. ')
+                    if len(second_para_sentences) >= 2:
+                        mid_point = len(second_para_sentences) // 2
+                        para2_part1 = '. '.join(second_para_sentences[:mid_point]) + '.'
+                        para2_part2 = '. '.join(second_para_sentences[mid_point:])
+
+                        sub_items = [
+                            {"summary": "Research Direction", "detail": paragraphs[0]},
+                            {"summary": "Combination Strategies", "detail": para2_part1},
+                            {"summary": "Biomarker Development", "detail": para2_part2}
+                        ]
+                    else:
+                        sub_items = [
+                            {"summary": "Research Direction", "detail": paragraphs[0]},
+                            {"summary": "Future Studies", "detail": paragraphs[1]},
+                            {"summary": "", "detail": ""}  # 空项
+                        ]
+
+                logger.info("创建子章节页（使用SUBCHAPTER_3_ITEMS布局，ID=16）")
+                self.strategies["subsection"].create_slide(slide_title, sub_items)
+                self.current_slide_count += 1
+            else:
+                # 如果内容不适合，使用普通内容页
+                logger.info("内容不适合SUBCHAPTER_3_ITEMS布局，使用普通内容页")
+                self.strategies["content"].create_slide(slide_title, main_text)
+                chunks = self.text_processor.split_text_into_chunks(main_text)
+                self.current_slide_count += len(chunks)
+
+        # 同步计数器
+        self._sync_slide_counters()
+
+        # 处理图片（非背景图）- 第4页
+        if section_root_image and section_root_image.get("url") and not section_root_image.get("background", False):
+            logger.info("创建图片页")
+            self.strategies["image"].create_slide(section_root_image, slide_title)
+            self.current_slide_count += 1
+            self._sync_slide_counters()
+    
+    def finish(self, overall_references: List[str], name_suffix: str = "", render_start: Optional[float] = None) -> str:
+        """添加参考文献页和结束页，保存文件，返回文件路径"""
+        # 3. 添加参考文献页
+        if overall_references:
+            logger.info(f"\n{'='*60}")
+            logger.info("创建参考文献页")
+            logger.info(f"{'='*60}")
+            pages_needed = (len(overall_references[:SlideConfig.MAX_TOTAL_REFERENCES]) + 
+                        SlideConfig.MAX_REFERENCES_PER_SLIDE - 1) // SlideConfig.MAX_REFERENCES_PER_SLIDE
+            self.strategies["references"].create_slide(overall_references)
+            self.current_slide_count += pages_needed
+            self._sync_slide_counters()
+        
+        # 4. 添加结束页
+        logger.info(f"\n{'='*60}")
+        logger.info("创建结束页")
+        logger.info(f"{'='*60}")
+        self.strategies["end"].create_slide()
+        
+        # 保存文件
+        output_dir = os.path.join(self.current_dir, 'output_ppts')
+        os.makedirs(output_dir, exist_ok=True)
+
+        sanitized_title = re.sub(r'[\\/:*?"<>|]', '', self.doc_title)
+        output_filename = os.path.join(output_dir, f'{sanitized_title}{name_suffix}.pptx')
+        # 多个 worker 进程可能同时生成同名的PPT，先写临时文件再重命名，避免下载到写了一半的文件
+        tmp_filename = f"{output_filename}.{os.getpid()}.{threading.get_ident()}.tmp"
+        self.presentation.save(tmp_filename)
+        os.replace(tmp_filename, output_filename)
+        self.report = {
+            "slides": len(self.presentation.slides),
+            "render_seconds": round(time.time() - render_start, 3) if render_start else None,
+            "file_bytes": os.path.getsize(output_filename),
+            **self.strategies["image"].image_report(),
+        }
+
+        logger.info(f"\n{'*'*80}")
+        logger.info(f"PPT生成成功!")
+        logger.info(f"文件路径: {output_filename}")
+        logger.info(f"总页数: {self.strategies['end'].slide_counter}")
+        logger.info(f"生成报告: {json.dumps(self.report, ensure_ascii=False)}")
+        logger.info(f"{'*'*80}")
+
+        # 输出页面总结
+        logger.info("\n页面结构总结：")
+        logger.info("第1页: 标题页")
+        logger.info("第2页: 内容页 - 概述（3个要点）")
+        logger.info("第3页: 子章节页（3项，使用布局ID=16）")
+        logger.info("第4页: 图片页 - ")
+        logger.info("第5页: 子章节页（3项，使用布局ID=16）")
+        logger.info("第6页: 参考文献页")
+        logger.info("第7页: 结束页")
+
+        return output_filename
+
 
 # ==================== 入口函数 ====================
-def start_generate_presentation(json_input: Any) -> Optional[str]:
-    """PPT生成的入口函数"""
+def start_generate_presentation(json_input: Any, report: Optional[Dict] = None, name_suffix: str = "") -> Optional[str]:
+    """
+    PPT生成的入口函数
+    :param report: 传入字典时填充本次生成的统计（页数、耗时、文件大小、图片压缩节省的字节数）
+    :param name_suffix: 追加在输出文件名后面的后缀
+    """
     print("\n" + "="*100)
     print("PPT生成器启动")
     print("="*100)
@@ -1267,7 +1349,9 @@ def start_generate_presentation(json_input: Any) -> Optional[str]:
         return None
     
     generator = PresentationGenerator()
-    output_path = generator.generate_presentation(json_data)
+    output_path = generator.generate_presentation(json_data, name_suffix)
+    if report is not None:
+        report.update(generator.report)
     
     return output_path
 
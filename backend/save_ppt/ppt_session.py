@@ -0,0 +1,256 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Date  : 2026/10/17
+# @File  : ppt_session.py
+# @Author: johnson
+# @Contact : github: johnson7788
+# @Desc  : 增量生成PPT，章节一到达就开始生成幻灯片和下载图片，最后一个章节到达后很快就能下载PPT
+"""
+以前必须等前端拿到完整的 <PRESENTATION> 并提交整个 PPTInput 后才开始生成，而 PPTWriterSubAgent 要几分钟才能逐页写完。现在:
+1. open 创建一个会话，会话中持有一份模板副本（PresentationGenerator），第一个章节到达时创建标题页
+2. append 每追加一个章节，立即在下载线程池中开始下载该章节的图片，并在会话线程池中按顺序生成该章节的幻灯片，
+   生成和下载与大模型继续生成后面的章节同时进行
+3. finalize 等待已追加的章节生成完，再添加参考文献页、结束页并保存，返回文件路径和生成统计
+每个会话同一时间只有一个线程在生成（按追加的顺序），不同会话之间并行。
+会话在主进程的线程中生成，每个章节只需要几十毫秒；长时间没有追加章节的会话会被清理。
+"""
+
+import asyncio
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from job_queue import FAILED, SUCCEEDED
+from ppt_generator import PresentationGenerator
+
+logger = logging.getLogger(__name__)
+
+OPEN = "open"
+FINALIZING = "finalizing"
+
+
+class SessionLimitError(Exception):
+    """同时打开的会话数已达到上限"""
+
+
+class SessionClosedError(Exception):
+    """会话已经调用过 finalize，不能再追加章节"""
+
+
+class PresentationSession:
+    """
+    :param session_id: 会话 id
+    :param title: 文档标题，为空时使用第一个章节的 h1
+    :param name_suffix: 追加在输出文件名后面的后缀
+    """
+
+    def __init__(self, session_id: str, title: str = "", name_suffix: str = ""):
+        self.id = session_id
+        self.title = title
+        self.name_suffix = name_suffix
+        self.status = OPEN
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.finished_at: Optional[float] = None
+        self.sections_received = 0
+        self.sections_rendered = 0
+        self.render_seconds = 0.0
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.generator = PresentationGenerator()
+        # 等待生成的操作: ("section", 序号, 章节, 图片下载的 Future 列表) 或 ("finish", 参考文献, 结果 Future)
+        self._pending: deque = deque()
+        self._draining = False
+        self._started = False
+        self._finished: Optional[Future] = None
+        self._lock = threading.Lock()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "session_id": self.id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+            "finished_at": self.finished_at,
+            "sections_received": self.sections_received,
+            "sections_rendered": self.sections_rendered,
+            "error": self.error,
+        }
+
+    def append(self, section: Dict, executor: ThreadPoolExecutor) -> int:
+        """追加一个章节，立即返回章节序号，生成在 executor 中进行"""
+        with self._lock:
+            if self.status != OPEN:
+                raise SessionClosedError(f"会话 {self.id} 已经{'结束' if self.finished_at else '在保存中'}")
+            index = self.sections_received
+            self.sections_received += 1
+            self.updated_at = time.time()
+            # 第一个章节不生成内容页和图片页，不需要下载图片
+            urls = PresentationGenerator.section_image_urls(section) if index > 0 else []
+            images = self.generator.strategies["image"].prefetch_images_in_background(urls)
+            self._pending.append(("section", index, section, images))
+            self._schedule(executor)
+        return index
+
+    def finalize(self, references: List[str], executor: ThreadPoolExecutor) -> Future:
+        """结束会话，返回的 Future 在保存完成后得到 {"path": 文件路径, "report": 生成统计}，重复调用返回同一个 Future"""
+        with self._lock:
+            if self._finished is None:
+                if self.status == OPEN:
+                    self.status = FINALIZING
+                self.updated_at = time.time()
+                self._finished = Future()
+                self._pending.append(("finish", references, self._finished))
+                self._schedule(executor)
+            return self._finished
+
+    def _schedule(self, executor: ThreadPoolExecutor) -> None:
+        # 调用时已持有 self._lock，同一会话只有一个线程在执行 _drain
+        if not self._draining:
+            self._draining = True
+            executor.submit(self._drain)
+
+    def _drain(self) -> None:
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self._draining = False
+                    return
+                operation = self._pending.popleft()
+            try:
+                if operation[0] == "section":
+                    self._render_section(*operation[1:])
+                else:
+                    self._finish(*operation[1:])
+            except Exception as e:
+                logger.error(f"会话 {self.id} 生成失败: {e}", exc_info=True)
+                self._fail(str(e))
+
+    def _begin(self, section: Optional[Dict]) -> None:
+        if not self._started:
+            self._started = True
+            self.generator.begin(self.title or PresentationGenerator.title_from_section(section or {}))
+
+    def _render_section(self, index: int, section: Dict, images: List[Future]) -> None:
+        if self.error is not None:
+            return
+        # 图片在追加章节时已经开始下载，这里等待下载完成，生成图片页时直接读缓存
+        for future in images:
+            future.result()
+        start = time.time()
+        self._begin(section)
+        self.generator.render_section(index, section)
+        self.render_seconds += time.time() - start
+        self.sections_rendered += 1
+
+    def _finish(self, references: List[str], result: Future) -> None:
+        if self.error is not None:
+            if not result.done():
+                result.set_exception(RuntimeError(self.error))
+            return
+        start = time.time()
+        self._begin(None)
+        path = self.generator.finish(references, self.name_suffix)
+        self.render_seconds += time.time() - start
+        # 生成耗时只统计实际生成幻灯片的时间，不包括等待章节到达的时间
+        self.generator.report["render_seconds"] = round(self.render_seconds, 3)
+        self.result = {"path": path, "report": self.generator.report}
+        self.status = SUCCEEDED
+        self.finished_at = time.time()
+        result.set_result(self.result)
+
+    def _fail(self, error: str) -> None:
+        with self._lock:
+            if self.error is not None:
+                return
+            self.error = error
+            self.status = FAILED
+            self.finished_at = time.time()
+            finished = self._finished
+        if finished is not None and not finished.done():
+            finished.set_exception(RuntimeError(error))
+
+
+class SessionManager:
+    """
+    :param max_sessions: 同时打开（未结束）的会话数量上限
+    :param max_workers: 生成幻灯片的线程数
+    :param session_ttl: 会话在最后一次操作后保留的时间（秒），超过后未结束的会话被丢弃，已结束的会话不能再查询
+    """
+
+    def __init__(self, max_sessions: int = 32, max_workers: int = 2, session_ttl: float = 3600):
+        self.max_sessions = max_sessions
+        self.max_workers = max_workers
+        self.session_ttl = session_ttl
+        self._sessions: Dict[str, PresentationSession] = {}
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def start(self) -> None:
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="ppt-session")
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _purge(self) -> None:
+        now = time.time()
+        expired = [session_id for session_id, session in self._sessions.items()
+                   if now - (session.finished_at or session.updated_at) > self.session_ttl]
+        for session_id in expired:
+            logger.info(f"清理过期的PPT会话 {session_id}")
+            del self._sessions[session_id]
+
+    def open(self, title: str = "") -> PresentationSession:
+        """创建会话，打开的会话数达到上限时抛出 SessionLimitError；需要复制模板，在事件循环中使用时放到线程中调用"""
+        if self._executor is None:
+            raise RuntimeError("会话管理器未启动")
+        with self._lock:
+            self._purge()
+            self._check_limit()
+        session_id = uuid.uuid4().hex
+        # 创建 PresentationGenerator 较慢，不持有锁，其它请求查询会话时不需要等待
+        # 文件名追加会话号，避免和其它会话、任务生成的同名PPT互相覆盖
+        session = PresentationSession(session_id, title, name_suffix=f"_{session_id[:8]}")
+        with self._lock:
+            # 创建期间其它请求可能已经打开了会话
+            self._check_limit()
+            self._sessions[session_id] = session
+        logger.info(f"打开PPT会话 {session_id}")
+        return session
+
+    def _check_limit(self) -> None:
+        active = sum(1 for session in self._sessions.values() if session.finished_at is None)
+        if active >= self.max_sessions:
+            raise SessionLimitError(f"同时打开的PPT会话数已达到上限 {self.max_sessions}")
+
+    def get(self, session_id: str) -> Optional[PresentationSession]:
+        with self._lock:
+            return self._sessions.get(session_id)
+
+    def append(self, session: PresentationSession, section: Dict) -> int:
+        return session.append(section, self._executor)
+
+    async def finalize(self, session: PresentationSession, references: List[str]) -> Dict[str, Any]:
+        """在事件循环中等待会话保存完成，生成失败时抛出 RuntimeError"""
+        return await asyncio.wrap_future(session.finalize(references, self._executor))
+
+    def discard(self, session_id: str) -> Optional[PresentationSession]:
+        """丢弃会话，正在生成的章节完成后不再继续"""
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+        if session is not None and session.finished_at is None:
+            session._fail("会话已被丢弃")
+        return session
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts: Dict[str, int] = {}
+            for session in self._sessions.values():
+                counts[session.status] = counts.get(session.status, 0) + 1
+            return {"max_sessions": self.max_sessions, "workers": self.max_workers, "sessions": counts}
@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Date  : 2026/10/17
+# @File  : render_cache.py
+# @Author: johnson
+# @Contact : github: johnson7788
+# @Desc  : PPT 生成结果缓存，相同的内容直接返回已经生成的文件；同时限制 output_ppts/ 的保留时间和总大小
+"""
+用户经常对同一份PPT多次点击下载，或者只改了不影响内容的地方（例如章节 id）后重新生成，以前每次都重新生成并写一个新文件。现在:
+1. 缓存键为规范化后的 PPTInput 的哈希，去掉 id 字段和值为空的字段，按键排序后序列化；
+   同时包含模板版本（TemplateEntry.version）和生成器版本（deck_keys.renderer_version: 生成相关代码和字形宽度表的哈希），
+   模板、代码或宽度表修改后旧结果自动失效
+2. 命中时直接返回已有文件的链接和生成统计；缓存中记录了文件的大小和修改时间，
+   文件被同名的其它PPT覆盖或被删除后视为未命中
+3. cleanup 定期清理 output_ppts/: 删除超过保留时间的PPT、遗留的临时文件，
+   总大小超过上限时按最近使用时间删除；刚生成的文件（grace 秒内）不会因为总大小被删除
+
+索引保存在 SQLite（WAL 模式）中，uvicorn 多个 worker 进程可以共用。
+
+环境变量:
+PPT_RENDER_CACHE_DB         索引文件路径，默认 save_ppt/render_cache.db
+PPT_OUTPUT_MAX_AGE          生成的PPT保留的秒数，默认 7 天，0 表示不按时间删除
+PPT_OUTPUT_MAX_BYTES        output_ppts/ 的总大小上限，默认 2GB，0 表示不限制
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from deck_keys import CURRENT_DIR, content_key, normalize_deck, renderer_version
+from ppt_generator import SlideConfig
+from template_registry import template_registry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TEMPLATE = os.path.join(CURRENT_DIR, "ppt_template_0717.pptx")
+
+
+class RenderCache:
+    """
+    :param output_dir: 生成的PPT所在目录
+    :param db_path: 索引文件路径
+    :param max_age: 生成的PPT最后一次生成或命中缓存后保留的秒数，0 表示不按时间删除
+    :param max_bytes: output_dir 的总大小上限，0 表示不限制
+    :param tmp_max_age: 遗留的 .tmp 文件保留的秒数
+    :param grace: 最近多少秒内生成的文件不会因为总大小超过上限被删除
+    """
+
+    def __init__(self, output_dir: str, db_path: str, max_age: float = 7 * 86400, max_bytes: int = 2 * 1024 ** 3,
+                 tmp_max_age: float = 3600, grace: float = 600, template_path: str = DEFAULT_TEMPLATE):
+        self.output_dir = output_dir
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.tmp_max_age = tmp_max_age
+        self.grace = grace
+        self.template_path = template_path
+        os.makedirs(output_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS renders (key TEXT PRIMARY KEY, path TEXT NOT NULL, size INTEGER,"
+            " mtime_ns INTEGER, report TEXT, created_at REAL, last_access REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_renders_path ON renders(path)")
+        self.hits = 0
+        self.misses = 0
+
+    def key_for(self, deck: Dict) -> str:
+        """规范化后的PPT内容 + 模板版本 + 生成代码版本 的哈希"""
+        template_version = template_registry.get(self.template_path, SlideConfig.SLIDE_LAYOUTS).version
+        return content_key({"deck": normalize_deck(deck), "template": template_version, "renderer": renderer_version()})
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """返回 {"path": 文件路径, "report": 生成统计, "cached": True}，未命中或文件已变化时返回 None"""
+        with self._lock:
+            row = self._conn.execute("SELECT path, size, mtime_ns, report FROM renders WHERE key = ?",
+                                     (key,)).fetchone()
+            if row is not None:
+                path, size, mtime_ns, report = row
+                try:
+                    stat = os.stat(path)
+                    valid = stat.st_size == size and stat.st_mtime_ns == mtime_ns
+                except OSError:
+                    valid = False
+                if valid:
+                    self._conn.execute("UPDATE renders SET last_access = ? WHERE key = ?", (time.time(), key))
+                    self.hits += 1
+                    return {"path": path, "report": json.loads(report), "cached": True}
+                # 文件已被删除或被同名的其它PPT覆盖
+                self._conn.execute("DELETE FROM renders WHERE key = ?", (key,))
+            self.misses += 1
+            return None
+
+    def put(self, key: str, path: str, report: Dict[str, Any]) -> None:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return
+        now = time.time()
+        with self._lock:
+            # 同一个文件被新的内容覆盖后，旧内容的记录失效
+            self._conn.execute("DELETE FROM renders WHERE path = ? AND key != ?", (path, key))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO renders (key, path, size, mtime_ns, report, created_at, last_access)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, path, stat.st_size, stat.st_mtime_ns, json.dumps(report, ensure_ascii=False), now, now),
+            )
+
+    def cleanup(self) -> Dict[str, int]:
+        """清理 output_dir，返回删除的文件数和字节数"""
+        now = time.time()
+        removed = {"files": 0, "bytes": 0, "tmp_files": 0}
+        with self._lock:
+            last_access = dict(self._conn.execute("SELECT path, last_access FROM renders").fetchall())
+
+        files = []
+        for entry in os.scandir(self.output_dir):
+            if not entry.is_file():
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            if entry.name.endswith(".tmp"):
+                # 生成中途退出的 worker 留下的临时文件
+                if now - stat.st_mtime > self.tmp_max_age and self._remove(entry.path):
+                    removed["tmp_files"] += 1
+                continue
+            if not entry.name.endswith(".pptx"):
+                continue
+            # 命中缓存时只更新 last_access，不修改文件，最近被命中的文件不能按 mtime 过期
+            accessed = max(stat.st_mtime, last_access.get(entry.path, 0))
+            if self.max_age and now - accessed > self.max_age:
+                if self._remove(entry.path):
+                    removed["files"] += 1
+                    removed["bytes"] += stat.st_size
+                continue
+            files.append((accessed, stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, _, size, _ in files)
+        if self.max_bytes and total > self.max_bytes:
+            for _, mtime, size, path in sorted(files):
+                if total <= self.max_bytes:
+                    break
+                if now - mtime < self.grace:
+                    continue
+                if self._remove(path):
+                    removed["files"] += 1
+                    removed["bytes"] += size
+                    total -= size
+
+        with self._lock:
+            for path, _ in last_access.items():
+                if not os.path.exists(path):
+                    self._conn.execute("DELETE FROM renders WHERE path = ?", (path,))
+        if any(removed.values()):
+            logger.info(f"清理 {self.output_dir}: 删除 {removed['files']} 个PPT（{removed['bytes']} 字节），"
+                        f"{removed['tmp_files']} 个临时文件")
+        return removed
+
+    @staticmethod
+    def _remove(path: str) -> bool:
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM renders").fetchone()[0]
+        files = [entry.stat().st_size for entry in os.scandir(self.output_dir)
+                 if entry.is_file() and entry.name.endswith(".pptx")]
+        return {"entries": entries, "hits": self.hits, "misses": self.misses,
+                "output_files": len(files), "output_bytes": sum(files)}
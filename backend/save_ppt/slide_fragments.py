@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Date  : 2026/10/17
+# @File  : slide_fragments.py
+# @Author: johnson
+# @Contact : github: johnson7788
+# @Desc  : 按章节缓存生成好的幻灯片 XML 和图片，用户只修改了一页时，其它章节直接复用，不再重新生成
+"""
+前端编辑器中修改一页后，整个PPT重新经过 generate_presentation，每个章节的策略都重新执行一遍。现在:
+1. 每个章节生成完后，把它产生的幻灯片（<p:sld> 的 XML、使用的布局、引用的图片）保存为一个片段，
+   键为 (章节位置决定的策略, 规范化后的章节内容, 图片内容哈希, 模板版本, 生成器版本)，布局由策略和模板决定
+2. 再次生成时命中的章节不执行策略: 用片段中的布局新建幻灯片，替换为缓存的 XML，
+   图片通过 get_or_add_image_part 加入新的PPT（相同图片只保存一份），XML 中引用图片的 rId 换成新的 rId
+3. 片段保存在 SQLite（WAL 模式）中，多个 worker 进程共用，按总大小淘汰最久未使用的片段；
+   最近使用的片段同时保存在内存中
+只修改了一页的PPT重新生成时，只有被修改的章节需要执行策略。
+只包含布局和图片关系的幻灯片才会缓存，引用了其它部件（例如外部链接）的章节每次都重新生成。
+
+环境变量:
+PPT_FRAGMENT_CACHE              设置为 0 时不使用片段缓存
+PPT_FRAGMENT_CACHE_DB           片段缓存文件路径，默认 save_ppt/fragment_cache.db
+PPT_FRAGMENT_CACHE_MAX_BYTES    片段缓存总大小上限，默认 512MB，0 表示不限制
+"""
+
+import base64
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from io import BytesIO
+from typing import Dict, List, Optional, Tuple
+
+from lxml import etree
+from pptx.opc.constants import RELATIONSHIP_TYPE as RT
+from pptx.oxml import parse_xml
+
+from deck_keys import CURRENT_DIR
+
+logger = logging.getLogger(__name__)
+
+# XML 中引用关系的属性: r:embed、r:link、r:id
+R_NAMESPACE = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+R_ATTRIBUTES = tuple(f"{{{R_NAMESPACE}}}{name}" for name in ("embed", "link", "id"))
+
+
+@dataclass
+class SlideFragment:
+    """一页幻灯片"""
+    xml: bytes
+    layout_partname: str
+    # rId -> 图片内容
+    images: Dict[str, bytes] = field(default_factory=dict)
+
+
+@dataclass
+class SectionFragment:
+    """一个章节生成的所有幻灯片"""
+    slides: List[SlideFragment]
+    # 生成该章节后页面计数器增加的数量
+    slide_count: int
+    # 图片统计: (原图哈希, 原图字节数, 嵌入图片的 sha1, 嵌入的字节数)
+    placements: List[Tuple[str, int, str, int]] = field(default_factory=list)
+
+    @property
+    def size(self) -> int:
+        return sum(len(slide.xml) + sum(map(len, slide.images.values())) for slide in self.slides)
+
+    def to_json(self) -> str:
+        return json.dumps({
+            "slides": [{"xml": slide.xml.decode("utf-8"), "layout": slide.layout_partname,
+                        "images": {rid: base64.b64encode(data).decode("ascii") for rid, data in slide.images.items()}}
+                       for slide in self.slides],
+            "slide_count": self.slide_count,
+            "placements": self.placements,
+        }, ensure_ascii=False)
+
+    @classmethod
+    def from_json(cls, data: str) -> "SectionFragment":
+        value = json.loads(data)
+        slides = [SlideFragment(slide["xml"].encode("utf-8"), slide["layout"],
+                                {rid: base64.b64decode(image) for rid, image in slide["images"].items()})
+                  for slide in value["slides"]]
+        return cls(slides, value["slide_count"], [tuple(item) for item in value["placements"]])
+
+
+def capture_slides(presentation, first_index: int) -> Optional[List[SlideFragment]]:
+    """保存 first_index 之后的所有幻灯片，幻灯片引用了布局和图片以外的部件时返回 None（不缓存）"""
+    fragments = []
+    slides = presentation.slides
+    for index in range(first_index, len(slides)):
+        part = slides[index].part
+        layout_partname = None
+        images = {}
+        for rid, rel in part.rels.items():
+            if rel.is_external:
+                return None
+            if rel.reltype == RT.SLIDE_LAYOUT:
+                layout_partname = str(rel.target_part.partname)
+            elif rel.reltype == RT.IMAGE:
+                images[rid] = rel.target_part.blob
+            else:
+                return None
+        fragments.append(SlideFragment(etree.tostring(part._element), layout_partname, images))
+    return fragments
+
+
+def splice_slides(presentation, template, fragments: List[SlideFragment]) -> None:
+    """把缓存的幻灯片依次添加到 presentation 末尾，template 为 presentation 所用模板的 TemplateEntry"""
+    for fragment in fragments:
+        layout = presentation.slide_layouts[template.layout_index_by_partname[fragment.layout_partname]]
+        # 与 slides.add_slide 相同，但不复制布局中的占位符，形状都来自缓存的 XML
+        rid, slide = presentation.part.add_slide(layout)
+        presentation.slides._sldIdLst.add_sldId(rid)
+        part = slide.part
+        rid_map = {}
+        for old_rid, data in fragment.images.items():
+            _, new_rid = part.get_or_add_image_part(BytesIO(data))
+            rid_map[old_rid] = new_rid
+
+        cached = parse_xml(fragment.xml)
+        for element in cached.iter():
+            for attribute in R_ATTRIBUTES:
+                rid = element.get(attribute)
+                if rid in rid_map:
+                    element.set(attribute, rid_map[rid])
+        # 替换根元素的内容而不是根元素本身，slide 对象仍然指向同一个元素
+        root = part._element
+        for child in list(root):
+            root.remove(child)
+        root.attrib.clear()
+        root.attrib.update(cached.attrib)
+        for child in list(cached):
+            root.append(child)
+
+
+class FragmentCache:
+    """
+    :param db_path: 片段缓存文件路径
+    :param max_bytes: 片段缓存总大小上限，0 表示不限制
+    :param memory_items: 内存中保存的片段数量
+    """
+
+    def __init__(self, db_path: str, max_bytes: int = 512 * 1024 * 1024, memory_items: int = 256):
+        self.max_bytes = max_bytes
+        self.memory_items = memory_items
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS fragments (key TEXT PRIMARY KEY, data TEXT NOT NULL, size INTEGER,"
+            " last_access REAL)"
+        )
+        self._memory: "OrderedDict[str, SectionFragment]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[SectionFragment]:
+        with self._lock:
+            fragment = self._memory.get(key)
+            if fragment is not None:
+                self._memory.move_to_end(key)
+            else:
+                row = self._conn.execute("SELECT data FROM fragments WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    self.misses += 1
+                    return None
+                fragment = SectionFragment.from_json(row[0])
+                self._remember(key, fragment)
+            self._conn.execute("UPDATE fragments SET last_access = ? WHERE key = ?", (time.time(), key))
+            self.hits += 1
+            return fragment
+
+    def put(self, key: str, fragment: SectionFragment) -> None:
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO fragments (key, data, size, last_access) VALUES (?, ?, ?, ?)",
+                               (key, fragment.to_json(), fragment.size, time.time()))
+            self._remember(key, fragment)
+            self._evict()
+
+    def _remember(self, key: str, fragment: SectionFragment) -> None:
+        self._memory[key] = fragment
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def _evict(self) -> None:
+        if not self.max_bytes:
+            return
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM fragments").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute("SELECT key, size FROM fragments ORDER BY last_access").fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM fragments WHERE key = ?", (key,))
+            self._memory.pop(key, None)
+            total -= size
+
+    def stats(self) -> Dict:
+        with self._lock:
+            count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM fragments").fetchone()
+            return {"fragments": count, "bytes": total, "memory_fragments": len(self._memory),
+                    "hits": self.hits, "misses": self.misses}
+
+
+# 进程内共享的片段缓存，PPT_FRAGMENT_CACHE=0 时为 None
+fragment_cache = FragmentCache(
+    os.environ.get("PPT_FRAGMENT_CACHE_DB", os.path.join(CURRENT_DIR, "fragment_cache.db")),
+    max_bytes=int(os.environ.get("PPT_FRAGMENT_CACHE_MAX_BYTES", str(512 * 1024 * 1024))),
+) if os.environ.get("PPT_FRAGMENT_CACHE", "1") != "0" else None
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Date  : 2026/10/17
+# @File  : template_registry.py
+# @Author: johnson
+# @Contact : github: johnson7788
+# @Desc  : PPT 模板注册表，每个模板只解析一次，每次请求从解析好的模板深拷贝一份独立的演示文稿
+"""
+以前每次调用 start_generate_presentation 都会重新 Presentation(template_path)，重新解析所有母版布局并逐个打印日志。
+现在模板按路径缓存在 TemplateRegistry 中:
+1. 第一次使用时读取模板字节，解析出原始演示文稿（只读，不直接修改），并预先计算布局序号、布局名称等查找表，
+   每个布局新建幻灯片时的形状信息（日志中使用）也只生成一次
+2. 每个请求调用 entry.clone() 得到一份深拷贝，修改拷贝不会影响缓存中的模板
+3. 模板文件的修改时间变化后自动重新加载，version 为模板内容的哈希，可以作为生成结果缓存键的一部分
+"""
+
+import copy
+import hashlib
+import logging
+import os
+import threading
+from dataclasses import dataclass, field
+from io import BytesIO
+from typing import Dict, List
+
+from pptx import Presentation
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class TemplateEntry:
+    """一个已解析的模板"""
+    path: str
+    mtime: float
+    version: str
+    presentation: Presentation
+    # 布局序号 -> 布局名称
+    layout_names: List[str] = field(default_factory=list)
+    # 布局 partname -> 布局序号，代替 slide_layouts.index(layout) 的线性查找
+    layout_index_by_partname: Dict[str, int] = field(default_factory=dict)
+    # SlideConfig.SLIDE_LAYOUTS 中的布局名称 -> 实际使用的布局序号，模板中不存在的布局已替换为 0
+    layout_ids: Dict[str, int] = field(default_factory=dict)
+    # 布局序号 -> 使用该布局新建的幻灯片上的形状描述，第一次使用该布局时生成
+    shape_descriptions: Dict[int, str] = field(default_factory=dict)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def clone(self) -> Presentation:
+        """返回模板的独立副本，每个请求在自己的副本上添加幻灯片"""
+        with self._lock:
+            return copy.deepcopy(self.presentation)
+
+    def layout_index(self, layout_key: str) -> int:
+        return self.layout_ids.get(layout_key, 0)
+
+
+class TemplateRegistry:
+    """按模板路径缓存 TemplateEntry，线程安全"""
+
+    def __init__(self):
+        self._entries: Dict[str, TemplateEntry] = {}
+        self._lock = threading.Lock()
+
+    def get(self, template_path: str, slide_layouts: Dict[str, int]) -> TemplateEntry:
+        """
+        :param template_path: 模板文件的绝对路径
+        :param slide_layouts: 布局名称到布局序号的映射，一般为 SlideConfig.SLIDE_LAYOUTS
+        """
+        if not os.path.exists(template_path):
+            raise FileNotFoundError(f"模板文件未找到: {template_path}")
+        mtime = os.path.getmtime(template_path)
+        with self._lock:
+            entry = self._entries.get(template_path)
+            if entry is None or entry.mtime != mtime:
+                entry = self._load(template_path, mtime, slide_layouts)
+                self._entries[template_path] = entry
+            return entry
+
+    def _load(self, template_path: str, mtime: float, slide_layouts: Dict[str, int]) -> TemplateEntry:
+        with open(template_path, 'rb') as f:
+            data = f.read()
+        presentation = Presentation(BytesIO(data))
+        entry = TemplateEntry(
+            path=template_path,
+            mtime=mtime,
+            version=hashlib.sha256(data).hexdigest()[:16],
+            presentation=presentation,
+        )
+        logger.info(f"加载模板: {template_path} (版本: {entry.version})")
+        for idx, layout in enumerate(presentation.slide_layouts):
+            entry.layout_names.append(layout.name)
+            entry.layout_index_by_partname[str(layout.part.partname)] = idx
+            logger.info(f"  布局 {idx}: {layout.name}")
+
+        layout_count = len(entry.layout_names)
+        for layout_key, layout_id in slide_layouts.items():
+            if layout_id is None or layout_id >= layout_count:
+                logger.warning(f"布局 '{layout_key}' (ID: {layout_id}) 未找到，使用默认布局，可用布局数量: {layout_count}")
+                layout_id = 0
+            entry.layout_ids[layout_key] = layout_id
+        return entry
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+# 进程内共享的模板注册表
+template_registry = TemplateRegistry()
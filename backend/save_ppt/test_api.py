@@ -6,10 +6,14 @@
 # @Contact : github: johnson7788
 # @Desc  :
 
+import copy
+import io
 import requests
 import json
 import os
 import time
+import uuid
+import zipfile
 
 # --- 配置 ---
 BASE_URL = "http://localhost:10021"  # FastAPI 应用运行的地址
@@ -882,6 +886,216 @@ def test_generate_ppt_invalid_input():
         print("POST /generate-ppt (Invalid Input) failed.")
 
 
+def make_deck(tag=None):
+    """用 front_data 组成一个 PPTInput，标题追加 tag，内容不同，不会命中生成结果缓存"""
+    sections = copy.deepcopy(front_data)
+    tag = tag or uuid.uuid4().hex[:8]
+    title = sections[0]["content"][0]["children"][0]
+    title["text"] = f"{title['text']} - Test_{tag}"
+    return {"sections": sections, "references": ["https://www.tesla.com"]}
+
+
+def test_generate_job_lifecycle():
+    """测试 /generate-ppt/jobs: 提交任务、查询状态、等待结果、查询不存在的任务"""
+    print("\n--- Testing /generate-ppt/jobs (submit -> status -> result) ---")
+    try:
+        response = requests.post(f"{BASE_URL}/generate-ppt/jobs", json=make_deck(), timeout=30)
+        print(f"Status Code: {response.status_code}, Response Body: {response.json()}")
+        assert response.status_code == 202
+        job_id = response.json()["job_id"]
+
+        response = requests.get(f"{BASE_URL}/generate-ppt/jobs/{job_id}", timeout=30)
+        assert response.status_code == 200
+        assert response.json()["status"] in ("queued", "running", "succeeded")
+
+        response = requests.get(f"{BASE_URL}/generate-ppt/jobs/{job_id}/result", params={"wait": 120}, timeout=150)
+        print(f"Result: {response.json()}")
+        assert response.status_code == 200
+        assert response.json()["status"] == "succeeded"
+        assert response.json()["ppt_url"].endswith(".pptx")
+
+        response = requests.get(f"{BASE_URL}/generate-ppt/jobs/{uuid.uuid4().hex}", timeout=30)
+        assert response.status_code == 404
+        print("/generate-ppt/jobs (submit -> status -> result) passed.")
+    except Exception as e:
+        print(f"Error testing /generate-ppt/jobs: {e}")
+        print("/generate-ppt/jobs (submit -> status -> result) failed.")
+
+
+def test_generate_job_cancel():
+    """测试 DELETE /generate-ppt/jobs/{job_id}: 取消后结果接口不再返回PPT"""
+    print("\n--- Testing DELETE /generate-ppt/jobs/{job_id} ---")
+    try:
+        job_id = requests.post(f"{BASE_URL}/generate-ppt/jobs", json=make_deck(), timeout=30).json()["job_id"]
+        response = requests.delete(f"{BASE_URL}/generate-ppt/jobs/{job_id}", timeout=30)
+        print(f"Status Code: {response.status_code}, Response Body: {response.json()}")
+        assert response.status_code == 200
+        # 正在生成的任务在生成结束后才变为 cancelled，任务也可能在取消前就已经生成完
+        cancelled = response.json()["status"] != "succeeded"
+        response = requests.get(f"{BASE_URL}/generate-ppt/jobs/{job_id}/result", params={"wait": 120}, timeout=150)
+        print(f"Result: {response.status_code} {response.json()}")
+        if cancelled:
+            assert response.status_code == 500
+            assert requests.get(f"{BASE_URL}/generate-ppt/jobs/{job_id}", timeout=30).json()["status"] == "cancelled"
+        response = requests.delete(f"{BASE_URL}/generate-ppt/jobs/{uuid.uuid4().hex}", timeout=30)
+        assert response.status_code == 404
+        print("DELETE /generate-ppt/jobs/{job_id} passed.")
+    except Exception as e:
+        print(f"Error testing DELETE /generate-ppt/jobs/{{job_id}}: {e}")
+        print("DELETE /generate-ppt/jobs/{job_id} failed.")
+
+
+def test_generate_job_backpressure():
+    """测试队列已满时 /generate-ppt/jobs 返回 429，测试结束后取消提交的任务"""
+    print("\n--- Testing /generate-ppt/jobs backpressure (429) ---")
+    job_ids = []
+    try:
+        stats = requests.get(f"{BASE_URL}/generate-ppt/stats", timeout=30).json()
+        capacity = stats["workers"] + stats["max_pending"]
+        statuses = []
+        # 每个PPT内容不同，不会命中生成结果缓存
+        for _ in range(capacity + 2):
+            response = requests.post(f"{BASE_URL}/generate-ppt/jobs", json=make_deck(), timeout=30)
+            statuses.append(response.status_code)
+            if response.status_code == 202:
+                job_ids.append(response.json()["job_id"])
+            else:
+                print(f"Response Body: {response.json()}")
+        print(f"capacity: {capacity}, status codes: {statuses}")
+        assert statuses.count(202) <= capacity
+        assert 429 in statuses
+        print("/generate-ppt/jobs backpressure (429) passed.")
+    except Exception as e:
+        print(f"Error testing /generate-ppt/jobs backpressure: {e}")
+        print("/generate-ppt/jobs backpressure (429) failed.")
+    finally:
+        for job_id in job_ids:
+            requests.delete(f"{BASE_URL}/generate-ppt/jobs/{job_id}", timeout=30)
+
+
+def test_generate_batch_ndjson():
+    """测试 /generate-ppt/batch?format=ndjson: 每个PPT一行结果，最后一行为汇总"""
+    print("\n--- Testing /generate-ppt/batch (ndjson) ---")
+    try:
+        decks = [make_deck(), make_deck()]
+        response = requests.post(f"{BASE_URL}/generate-ppt/batch", params={"format": "ndjson"},
+                                 json={"decks": decks}, stream=True, timeout=300)
+        assert response.status_code == 200
+        lines = [json.loads(line) for line in response.iter_lines() if line]
+        print(f"Lines: {lines}")
+        items, summary = lines[:-1], lines[-1]
+        assert sorted(item["index"] for item in items) == [0, 1]
+        assert all(item["status"] == "succeeded" and item["ppt_url"].endswith(".pptx") for item in items)
+        assert summary["done"] is True and summary["succeeded"] == 2 and summary["failed"] == 0
+        print("/generate-ppt/batch (ndjson) passed.")
+    except Exception as e:
+        print(f"Error testing /generate-ppt/batch (ndjson): {e}")
+        print("/generate-ppt/batch (ndjson) failed.")
+
+
+def test_generate_batch_sse():
+    """测试 /generate-ppt/batch?format=sse: data 事件为每个PPT的结果，done 事件为汇总"""
+    print("\n--- Testing /generate-ppt/batch (sse) ---")
+    try:
+        response = requests.post(f"{BASE_URL}/generate-ppt/batch", params={"format": "sse"},
+                                 json={"decks": [make_deck(), make_deck()]}, stream=True, timeout=300)
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        events = [event for event in response.text.split("\n\n") if event.strip()]
+        print(f"Events: {events}")
+        items = [json.loads(event[len("data: "):]) for event in events[:-1]]
+        assert sorted(item["index"] for item in items) == [0, 1]
+        assert events[-1].startswith("event: done\n")
+        summary = json.loads(events[-1].split("data: ", 1)[1])
+        assert summary["succeeded"] == 2
+        print("/generate-ppt/batch (sse) passed.")
+    except Exception as e:
+        print(f"Error testing /generate-ppt/batch (sse): {e}")
+        print("/generate-ppt/batch (sse) failed.")
+
+
+def test_generate_batch_zip():
+    """测试 /generate-ppt/batch?format=zip: 相同的PPT命中缓存后 zip 中的文件名也不重复，manifest 记录 zip 中的文件名"""
+    print("\n--- Testing /generate-ppt/batch (zip) ---")
+    try:
+        deck = make_deck()
+        response = requests.post(f"{BASE_URL}/generate-ppt/batch", params={"format": "zip"},
+                                 json={"decks": [deck, deck, make_deck()]}, timeout=300)
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/zip"
+        with zipfile.ZipFile(io.BytesIO(response.content)) as zf:
+            names = zf.namelist()
+            manifest = json.loads(zf.read("manifest.json"))
+        print(f"Entries: {names}")
+        assert len(names) == len(set(names)) == 4
+        assert [item["index"] for item in manifest["decks"]] == [0, 1, 2]
+        for item in manifest["decks"]:
+            assert item["filename"].startswith(f"{item['index']:03d}_")
+            assert item["filename"] in names
+        print("/generate-ppt/batch (zip) passed.")
+    except Exception as e:
+        print(f"Error testing /generate-ppt/batch (zip): {e}")
+        print("/generate-ppt/batch (zip) failed.")
+
+
+def test_generate_batch_invalid_format():
+    """测试 /generate-ppt/batch: 不支持的 format 返回 400"""
+    print("\n--- Testing /generate-ppt/batch (invalid format) ---")
+    try:
+        response = requests.post(f"{BASE_URL}/generate-ppt/batch", params={"format": "xml"},
+                                 json={"decks": [make_deck()]}, timeout=30)
+        print(f"Status Code: {response.status_code}, Response Body: {response.json()}")
+        assert response.status_code == 400
+        print("/generate-ppt/batch (invalid format) passed.")
+    except Exception as e:
+        print(f"Error testing /generate-ppt/batch (invalid format): {e}")
+        print("/generate-ppt/batch (invalid format) failed.")
+
+
+def test_generate_session_round_trip():
+    """测试 /generate-ppt/sessions: 打开会话 -> 逐个追加章节 -> finalize -> 查询 -> 删除"""
+    print("\n--- Testing /generate-ppt/sessions (open -> sections -> finalize -> delete) ---")
+    try:
+        deck = make_deck()
+        response = requests.post(f"{BASE_URL}/generate-ppt/sessions", json={}, timeout=30)
+        print(f"Status Code: {response.status_code}, Response Body: {response.json()}")
+        assert response.status_code == 201
+        session_id = response.json()["session_id"]
+        assert response.json()["status"] == "open"
+
+        for expected_index, section in enumerate(deck["sections"]):
+            response = requests.post(f"{BASE_URL}/generate-ppt/sessions/{session_id}/sections", json=section, timeout=30)
+            assert response.status_code == 202
+            assert response.json()["index"] == expected_index
+
+        response = requests.post(f"{BASE_URL}/generate-ppt/sessions/{session_id}/finalize",
+                                 json={"references": deck["references"]}, timeout=300)
+        print(f"Finalize: {response.json()}")
+        assert response.status_code == 200
+        assert response.json()["status"] == "succeeded"
+        assert response.json()["ppt_url"].endswith(".pptx")
+
+        # finalize 之后不能再追加章节
+        response = requests.post(f"{BASE_URL}/generate-ppt/sessions/{session_id}/sections",
+                                 json=deck["sections"][0], timeout=30)
+        assert response.status_code == 409
+
+        response = requests.get(f"{BASE_URL}/generate-ppt/sessions/{session_id}", timeout=30)
+        assert response.status_code == 200
+        assert response.json()["sections_received"] == len(deck["sections"])
+
+        response = requests.delete(f"{BASE_URL}/generate-ppt/sessions/{session_id}", timeout=30)
+        assert response.status_code == 200
+        response = requests.get(f"{BASE_URL}/generate-ppt/sessions/{session_id}", timeout=30)
+        assert response.status_code == 404
+        response = requests.delete(f"{BASE_URL}/generate-ppt/sessions/{session_id}", timeout=30)
+        assert response.status_code == 404
+        print("/generate-ppt/sessions (open -> sections -> finalize -> delete) passed.")
+    except Exception as e:
+        print(f"Error testing /generate-ppt/sessions: {e}")
+        print("/generate-ppt/sessions (open -> sections -> finalize -> delete) failed.")
+
+
 if __name__ == "__main__":
     print("Starting FastAPI API tests...")
 
@@ -893,6 +1107,14 @@ if __name__ == "__main__":
 
     test_generate_ppt_success()
     test_generate_ppt_invalid_input()
+    test_generate_job_lifecycle()
+    test_generate_job_cancel()
+    test_generate_job_backpressure()
+    test_generate_batch_ndjson()
+    test_generate_batch_sse()
+    test_generate_batch_zip()
+    test_generate_batch_invalid_format()
+    test_generate_session_round_trip()
 
     print("\nAll tests finished.")
     print(f"Generated PPTs (if successful) are saved in the '{OUTPUT_TEST_DIR}' directory.")
\ No newline at end of file
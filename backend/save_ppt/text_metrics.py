@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Date  : 2026/10/17
+# @File  : text_metrics.py
+# @Author: johnson
+# @Contact : github: johnson7788
+# @Desc  : 按字形宽度表测量文本宽度，二分查找文本框能放下的最大字号
+"""
+以前 _calculate_text_width 逐个字符分类，中文、英文统一按 0.55 个字号估算宽度；
+calculate_optimal_font_size 按每个字符 7pt 估算行数，中英文混排时误差都很大。现在:
+1. 字形宽度表（以 em 为单位）由 build_glyph_widths.py 用 fontTools 从模板实际使用的字体生成，保存在 glyph_widths.json；
+   表中包含常用拉丁字符和中文标点的逐字符宽度，以及全角字符的平均宽度，
+   没有生成宽度表时使用内置的近似值（Calibri 的大致宽度，中文等全角字符为 1em）
+2. 测量整段文本时先用 Counter 统计每个字符出现的次数，只对不同的字符查表，字符宽度查过一次后缓存
+3. fit_font_size 按文本框的实际宽高自动换行（中文逐字换行，英文按单词换行），二分查找能放下全部文本的最大字号，
+   结果按 (文本, 文本框宽高, 字号范围) 缓存；每个 TextMetrics 对应一份字体宽度表
+
+环境变量:
+PPT_GLYPH_WIDTHS    字形宽度表路径，默认 save_ppt/glyph_widths.json
+"""
+
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+import unicodedata
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+EMU_PER_PT = 12700
+
+# 全角字符（中日韩文字、全角标点）单独作为一个换行单位，其它文本按空白分词
+_WIDE_CHARS = r'\u2e80-\u9fff\uac00-\ud7af\uf900-\ufaff\ufe30-\ufe4f\uff00-\uffef'
+_TOKEN_PATTERN = re.compile(rf'[{_WIDE_CHARS}]|[^\s{_WIDE_CHARS}]+\s*|\s+')
+
+
+def _builtin_table() -> Dict:
+    """没有 glyph_widths.json 时使用的近似宽度（em），按 Calibri 的字符宽度分组"""
+    groups = {
+        0.226: " ",
+        0.25: "Iijl.,:;'!|",
+        0.32: "Jfrt()[]{}\"-`",
+        0.4: "sz*/\\",
+        0.48: "abcdeghknopquvxy?",
+        0.507: "0123456789#$+<=>^_~",
+        0.55: "EFLST",
+        0.6: "ABCDKPRVXYZ",
+        0.65: "GHNOQU&",
+        0.72: "w%",
+        0.8: "m@",
+        0.88: "MW",
+    }
+    chars = {str(ord(ch)): width for width, group in groups.items() for ch in group}
+    return {"source": "builtin", "chars": chars, "classes": {"wide": 1.0, "combining": 0.0}, "default": 0.5}
+
+
+class TextMetrics:
+    """
+    :param table: 字形宽度表，格式见 build_glyph_widths.py
+    :param line_spacing: 行高与字号的比例
+    :param max_cache_items: fit_font_size 缓存的结果数量
+    """
+
+    def __init__(self, table: Dict, line_spacing: float = 1.2, max_cache_items: int = 4096):
+        # 宽度表内容的哈希，宽度表不同时字号和换行可能不同，作为生成结果缓存键的一部分
+        self.digest = hashlib.sha256(json.dumps(table, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+        self.source = table.get("source", "")
+        self.fonts = table.get("fonts", {})
+        self.classes = table.get("classes", {})
+        self.default = table.get("default", 0.5)
+        self.line_spacing = table.get("line_spacing", line_spacing)
+        # 字符 -> 宽度（em），初始为表中的逐字符宽度，其它字符第一次查询时按类别补充
+        self._widths: Dict[str, float] = {chr(int(cp)): width for cp, width in table.get("chars", {}).items()}
+        self._tokens = lru_cache(maxsize=max_cache_items)(self._tokenize)
+        self.fit_font_size = lru_cache(maxsize=max_cache_items)(self._fit_font_size)
+
+    def char_width(self, ch: str) -> float:
+        width = self._widths.get(ch)
+        if width is None:
+            if unicodedata.combining(ch) or unicodedata.category(ch) in ("Mn", "Cf"):
+                width = self.classes.get("combining", 0.0)
+            elif unicodedata.east_asian_width(ch) in ("W", "F"):
+                width = self.classes.get("wide", 1.0)
+            else:
+                width = self.default
+            self._widths[ch] = width
+        return width
+
+    def text_width(self, text: str, font_size: float) -> float:
+        """文本在一行中的宽度（pt）"""
+        widths = self._widths
+        total = 0.0
+        for ch, count in Counter(text).items():
+            width = widths.get(ch)
+            total += count * (width if width is not None else self.char_width(ch))
+        return total * font_size
+
+    def width_emu(self, text: str, font_size: float) -> int:
+        """文本在一行中的宽度（EMU）"""
+        return int(self.text_width(text, font_size) * EMU_PER_PT)
+
+    def _tokenize(self, text: str) -> Tuple[Tuple[Tuple[float, float], ...], ...]:
+        """按段落拆分为换行单位，每个单位为 (包含末尾空白的宽度, 不含末尾空白的宽度)，字号为 1pt"""
+        char_width = self.char_width
+        paragraphs = []
+        for paragraph in text.split("\n"):
+            tokens = []
+            for token in _TOKEN_PATTERN.findall(paragraph):
+                stripped = token.rstrip()
+                trimmed = sum(map(char_width, stripped))
+                tokens.append((trimmed + sum(map(char_width, token[len(stripped):])), trimmed))
+            paragraphs.append(tuple(tokens))
+        return tuple(paragraphs)
+
+    def line_count(self, text: str, font_size: float, box_width_pt: float) -> float:
+        """文本在 box_width_pt 宽的文本框中自动换行后的行数，文本框没有宽度时返回 inf"""
+        max_width = box_width_pt / font_size
+        if max_width <= 0:
+            return math.inf
+        lines = 0
+        for tokens in self._tokens(text):
+            lines += 1
+            current = 0.0
+            for full, trimmed in tokens:
+                if current and current + trimmed > max_width:
+                    lines += 1
+                    current = 0.0
+                if trimmed > max_width:
+                    # 单词比一行还长，只能在单词中间换行
+                    extra, current = divmod(full, max_width)
+                    lines += int(extra)
+                else:
+                    current += full
+        return lines
+
+    def fits(self, text: str, font_size: float, box_width_emu: int, box_height_emu: int) -> bool:
+        lines = self.line_count(text, font_size, box_width_emu / EMU_PER_PT)
+        return lines * font_size * self.line_spacing <= box_height_emu / EMU_PER_PT
+
+    def _fit_font_size(self, text: str, box_width_emu: int, box_height_emu: int, min_size: int, max_size: int) -> int:
+        """在 [min_size, max_size] 中二分查找能放下全部文本的最大整数字号，最小字号也放不下时返回 min_size"""
+        low, high = min_size, max_size
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.fits(text, middle, box_width_emu, box_height_emu):
+                low = middle
+            else:
+                high = middle - 1
+        return low
+
+
+def load_text_metrics(path: Optional[str] = None) -> TextMetrics:
+    path = path or os.environ.get("PPT_GLYPH_WIDTHS") or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "glyph_widths.json")
+    if os.path.exists(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                table = json.load(f)
+            logger.info(f"加载字形宽度表: {path} (字体: {table.get('fonts')})")
+            return TextMetrics(table)
+        except (OSError, ValueError) as e:
+            logger.error(f"读取字形宽度表失败 {path}: {e}，使用内置的近似宽度")
+    return TextMetrics(_builtin_table())
+
+
+# 进程内共享的文本测量工具
+text_metrics = load_text_metrics()
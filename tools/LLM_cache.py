@@ -22,15 +22,28 @@ curl -X POST http://localhost:6688/chat/completions \
 """
 
 import os
+import json
+import math
 import httpx
 import hashlib
 import asyncio
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, HTTPException, Request
 from starlette.responses import StreamingResponse
-from fastapi.responses import PlainTextResponse
+from fastapi.responses import PlainTextResponse, FileResponse, Response
 from google import genai  # pip install google-genai
 import dotenv
 import time
+import queue
+import atexit
+import threading
+from contextlib import asynccontextmanager
+from cache_store import create_cache_store, load_hot_keys
+from cache_key import CacheKeyBuilder
+from upstream_pool import UpstreamPool
+from single_flight import SingleFlight
+from process_lock import FileLock
+from sse_classifier import StreamClassifier
+from semantic_cache import SemanticCache
 
 dotenv.load_dotenv()
 
@@ -45,24 +58,161 @@ async def generate_google_streaming_text(prompt: str, api_key, model="gemini-2.0
         yield chunk.text
 
 
-CACHE_DIR = "llm_cache"
-os.makedirs(CACHE_DIR, exist_ok=True)
+CACHE_DIR = os.environ.get("LLM_CACHE_DIR", "llm_cache")
+# 缓存后端和淘汰策略，容量单位为字节，TTL单位为秒，0表示不限制
+CACHE_BACKEND = os.environ.get("LLM_CACHE_BACKEND", "sharded")
+CACHE_MAX_BYTES = int(os.environ.get("LLM_CACHE_MAX_BYTES", "0"))
+CACHE_TTL = float(os.environ.get("LLM_CACHE_TTL", "0"))
+# 内存热点集合的大小上限（字节），命中时直接从内存返回，0 表示不使用
+CACHE_HOT_BYTES = int(os.environ.get("LLM_CACHE_HOT_BYTES", str(64 * 1024 * 1024)))
+cache_store = create_cache_store(CACHE_BACKEND, CACHE_DIR, max_bytes=CACHE_MAX_BYTES, ttl=CACHE_TTL,
+                                 hot_max_bytes=CACHE_HOT_BYTES)
+# 缓存键模式: canonical 按规范化后的请求计算，raw 按原始请求体字节计算（旧版行为）
+CACHE_KEY_MODE = os.environ.get("LLM_CACHE_KEY_MODE", "canonical")
+# 每个模型的缓存键策略配置文件(JSON)，不配置则使用默认策略，格式见 cache_key.py
+CACHE_KEY_POLICY_FILE = os.environ.get("LLM_CACHE_KEY_POLICY")
+key_builder = CacheKeyBuilder.from_file(CACHE_KEY_POLICY_FILE) if CACHE_KEY_POLICY_FILE else CacheKeyBuilder()
+# 第二级近似缓存: 屏蔽日期/UUID后查找相似的已缓存请求，默认关闭，阈值配置文件格式见 semantic_cache.py
+SEMANTIC_CACHE_ENABLED = os.environ.get("LLM_SEMANTIC_CACHE", "0") == "1"
+SEMANTIC_CACHE_POLICY_FILE = os.environ.get("LLM_SEMANTIC_CACHE_POLICY")
+semantic_cache = None
+if SEMANTIC_CACHE_ENABLED:
+    if SEMANTIC_CACHE_POLICY_FILE:
+        semantic_cache = SemanticCache.from_file(CACHE_DIR, key_builder, SEMANTIC_CACHE_POLICY_FILE)
+    else:
+        semantic_cache = SemanticCache(CACHE_DIR, key_builder)
+# 命中缓存时的回放方式，也可以通过请求头 X-Cache-Replay 为单个请求指定
+# instant: 直接发送整个缓存文件(sendfile)，recorded: 按录制时每个数据块的时间间隔回放，fixed: 固定间隔回放
+CACHE_REPLAY_MODE = os.environ.get("LLM_CACHE_REPLAY_MODE", "instant")
+# recorded 模式下时间间隔的缩放倍数，例如 0.5 表示两倍速回放，可用请求头 X-Cache-Replay-Scale 覆盖
+CACHE_REPLAY_SCALE = float(os.environ.get("LLM_CACHE_REPLAY_SCALE", "1.0"))
+# fixed 模式下每行的间隔秒数，可用请求头 X-Cache-Replay-Interval 覆盖
+CACHE_REPLAY_INTERVAL = float(os.environ.get("LLM_CACHE_REPLAY_INTERVAL", "0.2"))
+REPLAY_MODES = ("instant", "recorded", "fixed")
+# 缓存命中统计，canonical_hits 表示原始请求体不同、但规范化后命中的次数
+# semantic_hits 表示精确缓存未命中、但在近似缓存中找到相似请求的次数
+# coalesced 表示未命中缓存、但合并到其它正在进行的相同请求上的次数，rejected 为按原因统计的未写入缓存次数
+# coalesced_cross_process 表示等待其它 worker 进程请求上游的次数
+cache_metrics = {"hits": 0, "misses": 0, "canonical_hits": 0, "semantic_hits": 0, "coalesced": 0,
+                 "coalesced_cross_process": 0, "rejected": {}, "by_model": {}}
+# 正在请求上游的缓存键，相同缓存键的并发请求共享一次上游请求
+single_flight = SingleFlight()
+# 跨进程合并: 每个缓存键一个锁文件，同一时间只有一个 worker 进程请求上游，其它进程等待其写入缓存后直接回放
+LOCK_DIR = os.path.join(CACHE_DIR, "locks")
+os.makedirs(LOCK_DIR, exist_ok=True)
+# 等待其它进程请求上游的最长秒数，超时后自己请求
+CROSS_PROCESS_WAIT = float(os.environ.get("LLM_CROSS_PROCESS_WAIT", "600"))
 
 
 class AppLogger:
-    def __init__(self, log_file="llm.log"):
+    """
+    日志先放入队列，由后台线程批量写入文件并打印，事件循环中只做入队操作
+    启动时不再清空日志，超过 max_bytes 后轮转为 llm.log.1 ... llm.log.N，多个 worker 进程可以写同一个日志文件
+    :param chunk_sample: 流式数据块日志的采样间隔，1 表示每个数据块都记录，N 表示每 N 个记录一次，0 表示不记录
+    :param chunk_max_chars: 数据块日志的最大长度，超出部分截断，0 表示不截断
+    :param max_bytes: 日志文件的大小上限，0 表示不轮转
+    :param backup_count: 保留的历史日志文件数量
+    """
+
+    def __init__(self, log_file="llm.log", chunk_sample=1, chunk_max_chars=0, batch_size=256,
+                 max_bytes=50 * 1024 * 1024, backup_count=5):
         self.log_file = log_file
-        with open(self.log_file, 'w', encoding='utf-8') as f:
-            f.write("")
+        self.chunk_sample = chunk_sample
+        self.chunk_max_chars = chunk_max_chars
+        self.batch_size = batch_size
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._chunk_count = 0
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._writer, name="llm-log-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
 
     def log(self, message: str):
-        with open(self.log_file, 'a', encoding='utf-8') as f:
-            f.write(message + "\n")
-        print(message)
-
+        self._queue.put(message)
+
+    def log_chunk(self, message: str):
+        """记录流式数据块，按配置采样和截断，避免每个数据块都产生一条完整日志"""
+        if not self.chunk_sample:
+            return
+        self._chunk_count += 1
+        if self._chunk_count % self.chunk_sample:
+            return
+        if self.chunk_max_chars and len(message) > self.chunk_max_chars:
+            message = message[:self.chunk_max_chars] + "..."
+        self._queue.put(message)
+
+    def _writer(self):
+        f = open(self.log_file, 'a', encoding='utf-8')
+        while True:
+            batch = [self._queue.get()]
+            # 把队列中已有的日志一次性取出，合并成一次写入
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in batch
+            messages = [message for message in batch if message is not None]
+            if messages:
+                f = self._rotate_if_needed(f)
+                text = "\n".join(messages)
+                f.write(text + "\n")
+                f.flush()
+                print(text)
+            if stop:
+                f.close()
+                return
 
-app = FastAPI(title="LLM API Logger")
-logger = AppLogger("llm.log")
+    def _rotate_if_needed(self, f):
+        """日志超过大小上限时轮转；其它进程已经轮转时重新打开新的日志文件"""
+        try:
+            rotated = os.stat(self.log_file).st_ino != os.fstat(f.fileno()).st_ino
+        except FileNotFoundError:
+            rotated = True
+        if not rotated and self.max_bytes and os.fstat(f.fileno()).st_size >= self.max_bytes:
+            with FileLock(self.log_file + ".lock"):
+                # 加锁后再检查一次，避免多个进程重复轮转
+                if os.path.exists(self.log_file) and os.path.getsize(self.log_file) >= self.max_bytes:
+                    if self.backup_count:
+                        for idx in range(self.backup_count - 1, 0, -1):
+                            if os.path.exists(f"{self.log_file}.{idx}"):
+                                os.replace(f"{self.log_file}.{idx}", f"{self.log_file}.{idx + 1}")
+                        os.replace(self.log_file, f"{self.log_file}.1")
+                    else:
+                        os.remove(self.log_file)
+            rotated = True
+        if rotated:
+            f.close()
+            f = open(self.log_file, 'a', encoding='utf-8')
+        return f
+
+    def close(self):
+        """写完队列中剩余的日志后停止后台线程"""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 启动时检查缓存中是否包含错误响应，多 worker 部署时每个进程都会执行，索引操作是进程安全的
+    check_cache_for_errors()
+    # 启动时为每个上游主机创建长连接客户端，关闭时统一释放
+    upstream_pool.start(provider2url.values())
+    yield
+    await upstream_pool.aclose()
+    logger.close()
+
+
+app = FastAPI(title="LLM API Logger", lifespan=lifespan)
+logger = AppLogger(
+    "llm.log",
+    chunk_sample=int(os.environ.get("LLM_LOG_CHUNK_SAMPLE", "1")),
+    chunk_max_chars=int(os.environ.get("LLM_LOG_CHUNK_MAX_CHARS", "0")),
+    max_bytes=int(os.environ.get("LLM_LOG_MAX_BYTES", str(50 * 1024 * 1024))),
+    backup_count=int(os.environ.get("LLM_LOG_BACKUPS", "5")),
+)
 
 # 模型名称对应的访问的base url， 注意chat/completions结尾哦
 provider2url = {
@@ -78,25 +228,35 @@ provider2url = {
     "deepseek-r1-250528": "https://ark.cn-beijing.volces.com/api/v3/chat/completions",
     "deepseek-v3-250324": "https://ark.cn-beijing.volces.com/api/v3/chat/completions",
 }
+# 额外的模型和地址，JSON 格式，例如 {"my-model": "http://127.0.0.1:8000/v1/chat/completions"}
+provider2url.update(json.loads(os.environ.get("LLM_EXTRA_PROVIDERS", "{}")))
+
+# 每个上游主机的连接池配置，未配置的字段使用 default，默认值见 upstream_pool.py
+# http2 需要安装 h2 (pip install httpx[http2])，服务端不支持时会自动回退到 HTTP/1.1
+upstream_options = {
+    "default": {"http2": True, "max_connections": 20, "max_keepalive_connections": 10,
+                "timeout": 600.0, "connect_timeout": 20.0},
+    "api.openai.com": {"max_connections": 50, "max_keepalive_connections": 20},
+    "ark.cn-beijing.volces.com": {"max_connections": 50, "max_keepalive_connections": 20},
+}
+upstream_pool = UpstreamPool(upstream_options)
 
 
 def check_cache_for_errors(delete_error_files=True):
-    print(f"检查缓存文件中是否存在错误内容...， 日志记录到llm.log和{CACHE_DIR}中")
-    for filename in os.listdir(CACHE_DIR):
-        if filename.endswith(".txt"):
-            file_path = os.path.join(CACHE_DIR, filename)
-            try:
-                find_errors = False
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                    if "error" in content.lower():
-                        print(f"⚠️  警告：缓存文件 {filename} 中包含 'error'，这会影响LLM")
-                        find_errors = True
-                if find_errors and delete_error_files:
-                    os.remove(file_path)
-                    print(f"已删除错误文件：{file_path}")
-            except Exception as e:
-                print(f"读取缓存文件 {filename} 失败：{e}")
+    """错误状态在写入缓存时已记录到索引中，这里只需查询索引，不再逐个读取缓存文件"""
+    print(f"检查缓存索引中是否存在错误内容...， 日志记录到llm.log和{CACHE_DIR}中")
+    for key in cache_store.error_keys():
+        print(f"⚠️  警告：缓存 {key} 被标记为错误响应，这会影响LLM")
+        if delete_error_files:
+            cache_store.delete(key)
+            print(f"已删除错误缓存：{key}")
+    evicted = cache_store.evict()
+    if evicted:
+        print(f"已按容量/过期策略淘汰 {evicted} 条缓存")
+    # cache_cli.py warm 生成的热点列表，预先加载到内存
+    warmed = cache_store.warm(load_hot_keys(CACHE_DIR))
+    if warmed:
+        print(f"已预热 {warmed} 条热点缓存到内存")
 
 
 def get_provider_url_by_model(model: str):
@@ -114,9 +274,95 @@ def compute_hash(data: str) -> str:
     return hashlib.sha256(data.encode("utf-8")).hexdigest()
 
 
+def compute_cache_key(body: dict, body_str: str) -> str:
+    if CACHE_KEY_MODE == "raw":
+        return compute_hash(body_str)
+    return key_builder.build(body)
+
+
+def record_cache_result(model: str, hit: bool, canonical_hit: bool = False):
+    name = "hits" if hit else "misses"
+    cache_metrics[name] += 1
+    if canonical_hit:
+        cache_metrics["canonical_hits"] += 1
+    model_metrics = cache_metrics["by_model"].setdefault(model, {"hits": 0, "misses": 0})
+    model_metrics[name] += 1
+
+
+def replay_header_number(request: Request, header: str, default: float) -> float:
+    """读取回放参数请求头，不是数字、为负数或无穷大时返回 400"""
+    value = request.headers.get(header)
+    if value is None:
+        return default
+    try:
+        number = float(value)
+    except ValueError:
+        number = math.nan
+    if not math.isfinite(number) or number < 0:
+        raise HTTPException(status_code=400, detail=f"{header} 必须是非负数: {value}")
+    return number
+
+
+async def replay_cached_response(request: Request, cache_key: str, meta: dict):
+    """按回放模式返回缓存内容，热点缓存直接从内存返回"""
+    mode = request.headers.get("X-Cache-Replay", CACHE_REPLAY_MODE)
+    if mode not in REPLAY_MODES:
+        raise HTTPException(status_code=400, detail=f"不支持的回放模式: {mode}，可选: {REPLAY_MODES}")
+    scale = replay_header_number(request, "X-Cache-Replay-Scale", CACHE_REPLAY_SCALE)
+    interval = replay_header_number(request, "X-Cache-Replay-Interval", CACHE_REPLAY_INTERVAL)
+    cache_path = get_cache_path(cache_key)
+    data = await asyncio.to_thread(cache_store.read, cache_key)
+    timings = meta.get("timings")
+    if mode == "recorded" and not timings:
+        # 旧版缓存没有记录时间戳，退化为固定间隔回放
+        mode = "fixed"
+    if mode == "instant":
+        if data is not None:
+            return Response(content=data, media_type="text/event-stream")
+        return FileResponse(cache_path, media_type="text/event-stream")
+
+    def read_lines():
+        if data is not None:
+            return data.decode("utf-8").splitlines(keepends=True)
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            return f.readlines()
+
+    async def cached_stream():
+        previous = 0.0
+        lines = await asyncio.to_thread(read_lines)
+        for idx, line in enumerate(lines):
+            if mode == "recorded" and idx < len(timings):
+                delay = (timings[idx] - previous) * scale
+                previous = timings[idx]
+            else:
+                delay = interval
+            if delay > 0:
+                await asyncio.sleep(delay)
+            yield line  # 每行已含 \n
+
+    return StreamingResponse(cached_stream(), media_type="text/event-stream")
+
+
+def record_rejection(reason: str):
+    cache_metrics["rejected"][reason] = cache_metrics["rejected"].get(reason, 0) + 1
+
+
+async def lookup_similar(body: dict):
+    """在近似缓存中查找相似请求，返回 (缓存键, 汉明距离)，找不到或对应的缓存已被淘汰时返回 None"""
+    if semantic_cache is None:
+        return None
+    similar = await asyncio.to_thread(semantic_cache.lookup, body)
+    if similar is None:
+        return None
+    if not await asyncio.to_thread(cache_store.lookup, similar[0]):
+        await asyncio.to_thread(semantic_cache.remove, similar[0])
+        return None
+    return similar
+
+
 def get_cache_path(hash_key: str) -> str:
     """返回缓存文件路径"""
-    return os.path.join(CACHE_DIR, f"{hash_key}.txt")
+    return cache_store.response_path(hash_key)
 
 
 @app.post("/chat/completions")
@@ -126,91 +372,107 @@ async def proxy_request(request: Request):
     logger.log(f"模型请求：{body_str}")
     body = await request.json()
     provider_url = get_provider_url_by_model(body["model"])
-    cache_key = compute_hash(body_str)
+    cache_key = compute_cache_key(body, body_str)
+    raw_hash = compute_hash(body_str)
     cache_path = get_cache_path(cache_key)
-    request_cache_path = os.path.join(CACHE_DIR, f"{cache_key}.request")
-
-    if not os.path.exists(request_cache_path):
-        logger.log(f"记录请求信息到文件中：{request_cache_path}")
-        with open(request_cache_path, 'w', encoding='utf-8') as f:
-            f.write(body_str)
+    # 缓存文件和索引的读写放到线程池中执行，不阻塞事件循环
+    await asyncio.to_thread(cache_store.put_request, cache_key, body_str)
 
     # 读取缓存
-    if os.path.exists(cache_path):
+    if await asyncio.to_thread(cache_store.lookup, cache_key):
+        meta = await asyncio.to_thread(cache_store.get_meta, cache_key) or {}
+        record_cache_result(body["model"], hit=True, canonical_hit=meta.get("raw_hash", raw_hash) != raw_hash)
         logger.log(f"命中本地缓存：{cache_path}")
-
-        async def cached_stream():
-            with open(cache_path, 'r', encoding='utf-8') as f:
-                for line in f:
-                    print(f"缓存{cache_path}对应的内容是:{line[:100]}")
-                    await asyncio.sleep(0.2)  # 每行间隔 0.2 秒
-                    yield line  # 每行已含 \n
-
-        return StreamingResponse(cached_stream(), media_type="text/event-stream")
-
+        return await replay_cached_response(request, cache_key, meta)
+
+    similar = await lookup_similar(body)
+    if similar:
+        similar_key, distance = similar
+        meta = await asyncio.to_thread(cache_store.get_meta, similar_key) or {}
+        record_cache_result(body["model"], hit=True)
+        cache_metrics["semantic_hits"] += 1
+        logger.log(f"命中近似缓存：{similar_key}，汉明距离: {distance}")
+        return await replay_cached_response(request, similar_key, meta)
+
+    # 其它 worker 进程正在请求相同内容时，等待它写入缓存，再与普通命中一样按回放模式返回；
+    # 本进程内已有相同请求时不需要文件锁，直接订阅它的数据流
+    lock = FileLock(os.path.join(LOCK_DIR, f"{cache_key}.lock"), remove_on_release=True)
+    if cache_key not in single_flight and not lock.acquire(blocking=False):
+        cache_metrics["coalesced_cross_process"] += 1
+        logger.log(f"其它进程正在请求相同内容，等待其写入缓存：{cache_key}")
+        if await lock.acquire_async(timeout=CROSS_PROCESS_WAIT) and \
+                await asyncio.to_thread(cache_store.lookup, cache_key):
+            lock.release()
+            meta = await asyncio.to_thread(cache_store.get_meta, cache_key) or {}
+            record_cache_result(body["model"], hit=True)
+            logger.log(f"命中其它进程写入的缓存：{cache_path}")
+            return await replay_cached_response(request, cache_key, meta)
+
+    record_cache_result(body["model"], hit=False)
     logger.log(f"未命中缓存，开始请求模型{provider_url}的模型{body['model']}, 请求信息是总长度: {len(body_str)}")
 
     assert provider_url, "请检查模型名称是否正确,提供的模型是否有对应的链接？"
 
     async def event_stream():
-        lines = []
+        stream_start = time.monotonic()
         max_retries = 3
         retry_delay = 1
 
         for attempt in range(max_retries):
+            # 每次重试重新记录，缓存中只保存最后一次完整的响应
+            lines = []
+            # 每行相对请求开始的秒数，用于 recorded 模式按原始节奏回放
+            timings = []
+            # 边接收边解析 SSE 帧，根据状态码和错误对象决定是否写入缓存
+            classifier = StreamClassifier()
             try:
                 logger.log(f"尝试连接LLM服务器 (第 {attempt + 1} 次)")
 
-                # 增加超时时间和重试机制
-                timeout = httpx.Timeout(600.0, connect=20.0)
-
-                async with httpx.AsyncClient(
-                        timeout=timeout,
-                        verify=False,
-                        limits=httpx.Limits(max_connections=20, max_keepalive_connections=10)
-                ) as client:
-
-                    headers = {
-                        "Content-Type": "application/json",
-                        "Accept": "text/event-stream",
-                        "User-Agent": "LLM-Cache-Proxy/1.0",
-                        "Connection": "keep-alive"
-                    }
-
-                    # 添加认证头
-                    if request.headers.get("Authorization"):
-                        headers["Authorization"] = request.headers.get("Authorization")
-
-                    async with client.stream(
-                            "POST",
-                            provider_url,
-                            json=body,
-                            headers=headers,
-                    ) as response:
-                        logger.log(f"收到响应状态码: {response.status_code}")
-
-                        # 检查响应状态
-                        if response.status_code != 200:
-                            error_text = await response.aread()
-                            logger.log(f"请求失败，状态码: {response.status_code}, 错误: {error_text}")
-                            if attempt < max_retries - 1:
-                                logger.log(f"等待 {retry_delay} 秒后重试...")
-                                await asyncio.sleep(retry_delay)
-                                retry_delay *= 2
-                                continue
-                            else:
-                                yield f"data: {{'error': '请求失败，状态码: {response.status_code}'}}\n\n"
-                                return
-
-                        # 处理流式响应
-                        async for line in response.aiter_lines():
-                            if line.strip():  # 忽略空行
-                                logger.log(f"收到数据: {line}")
-                                lines.append(line + "\n")
-                                yield line + "\n"
-
-                        # 如果成功完成，跳出重试循环
-                        break
+                headers = {
+                    "Content-Type": "application/json",
+                    "Accept": "text/event-stream",
+                    "User-Agent": "LLM-Cache-Proxy/1.0",
+                }
+
+                # 添加认证头
+                if request.headers.get("Authorization"):
+                    headers["Authorization"] = request.headers.get("Authorization")
+
+                # 复用 lifespan 中创建的上游长连接，不再为每次请求重新握手
+                async with upstream_pool.stream(
+                        "POST",
+                        provider_url,
+                        json=body,
+                        headers=headers,
+                ) as response:
+                    logger.log(f"收到响应状态码: {response.status_code}")
+                    classifier.on_status(response.status_code)
+
+                    # 检查响应状态
+                    if response.status_code != 200:
+                        error_text = await response.aread()
+                        logger.log(f"请求失败，状态码: {response.status_code}, 错误: {error_text}")
+                        if attempt < max_retries - 1:
+                            logger.log(f"等待 {retry_delay} 秒后重试...")
+                            await asyncio.sleep(retry_delay)
+                            retry_delay *= 2
+                            continue
+                        else:
+                            record_rejection(f"http_{response.status_code}")
+                            yield f"data: {{'error': '请求失败，状态码: {response.status_code}'}}\n\n"
+                            return
+
+                    # 处理流式响应
+                    async for line in response.aiter_lines():
+                        if line.strip():  # 忽略空行
+                            logger.log_chunk(f"收到数据: {line}")
+                            classifier.feed(line)
+                            lines.append(line + "\n")
+                            timings.append(round(time.monotonic() - stream_start, 3))
+                            yield line + "\n"
+
+                    # 如果成功完成，跳出重试循环
+                    break
 
             except httpx.RemoteProtocolError as e:
                 logger.log(f"服务器连接错误 (第 {attempt + 1} 次): {e}")
@@ -220,6 +482,7 @@ async def proxy_request(request: Request):
                     retry_delay *= 2
                     continue
                 else:
+                    record_rejection("connect_error")
                     error_msg = f"data: 'error': '服务器连接失败，已重试 {max_retries} 次'\n\n"
                     yield error_msg
                     return
@@ -232,6 +495,7 @@ async def proxy_request(request: Request):
                     retry_delay *= 2
                     continue
                 else:
+                    record_rejection("timeout")
                     error_msg = f"data: 'error': '请求超时，已重试 {max_retries} 次'\n\n"
                     yield error_msg
                     return
@@ -244,29 +508,72 @@ async def proxy_request(request: Request):
                     retry_delay *= 2
                     continue
                 else:
+                    record_rejection("exception")
                     error_msg = f"data: 'error': '未知错误: {str(e)}'\n\n"
                     yield error_msg
                     return
 
         # 写入本地缓存文件
         if lines:
-            # 检查是否包含错误信息
             content_str = "".join(lines)
-            if any(error_keyword in content_str.lower() for error_keyword in
-                   ["incorrect api key", "requesttimeout", "error_msg", "error"]):
-                logger.log(f"ERROR: 请求失败，不写入缓存。请求信息长度: {len(body_str)}")
-                logger.log(f"错误响应: {content_str[:500]}...")
+            # 接收过程中已经完成判断，不需要再扫描一遍响应内容
+            admit, reason = classifier.verdict()
+            if not admit:
+                record_rejection(reason)
+                logger.log(f"ERROR: 请求失败({reason}: {classifier.error_detail})，缓存标记为错误，不会被命中。"
+                           f"请求信息长度: {len(body_str)}")
+                # 错误状态写入索引，启动时直接按索引清理，无需重新扫描文件
+                await asyncio.to_thread(cache_store.put, cache_key, content_str, model=body["model"], is_error=True,
+                                        meta={"raw_hash": raw_hash, "timings": timings, "reject_reason": reason})
                 return
 
-            # 写入缓存
+            # 写入缓存，临时文件+重命名保证原子性，超出容量时按LRU淘汰
             try:
-                with open(cache_path, 'w', encoding='utf-8') as f:
-                    f.writelines(lines)
+                await asyncio.to_thread(cache_store.put, cache_key, content_str, model=body["model"],
+                                        meta={"raw_hash": raw_hash, "timings": timings})
+                if semantic_cache is not None:
+                    await asyncio.to_thread(semantic_cache.add, cache_key, body)
                 logger.log(f"已写入本地缓存：{cache_path}")
             except Exception as e:
                 logger.log(f"写入缓存失败: {e}")
 
-    return StreamingResponse(event_stream(), media_type="text/event-stream")
+    async def locked_stream():
+        # 写入缓存后才释放文件锁，等待的其它进程随后直接命中缓存
+        try:
+            async for chunk in event_stream():
+                yield chunk
+        finally:
+            lock.release()
+
+    # 相同缓存键的并发请求只请求一次上游，其它请求订阅同一个数据流，缓存只写入一次
+    chunks, leader = single_flight.join(cache_key, locked_stream)
+    if not leader:
+        # 等待文件锁期间本进程已有相同请求开始请求上游，由它持有锁
+        lock.release()
+        cache_metrics["coalesced"] += 1
+        logger.log(f"合并到正在进行的相同请求：{cache_key}")
+    return StreamingResponse(chunks, media_type="text/event-stream")
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """缓存命中率统计，用于评估缓存键规范化的收益"""
+    total = cache_metrics["hits"] + cache_metrics["misses"]
+    return {
+        **cache_metrics,
+        "hit_rate": cache_metrics["hits"] / total if total else 0.0,
+        "key_mode": CACHE_KEY_MODE,
+        "pid": os.getpid(),
+        "in_flight": len(single_flight),
+        "semantic_entries": len(semantic_cache) if semantic_cache is not None else None,
+        "store": cache_store.stats(),
+    }
+
+
+@app.get("/upstream/stats")
+async def upstream_stats():
+    """每个上游主机的连接池统计：请求数、新建连接数、正在使用的连接数和连接复用率"""
+    return upstream_pool.stats()
 
 
 @app.api_route("/{path_name:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS"])
@@ -275,10 +582,12 @@ async def unsupported_path(request: Request, path_name: str):
     return PlainTextResponse("错误：不支持的路径", status_code=404)
 
 
-# 启动时检查缓存中是否包含 "error"
-check_cache_for_errors()
-
 if __name__ == "__main__":
     import uvicorn
 
-    uvicorn.run(app, host="0.0.0.0", port=6688)
\ No newline at end of file
+    # 多进程部署: LLM_PROXY_WORKERS=4 python LLM_cache.py，或 uvicorn LLM_cache:app --workers 4
+    workers = int(os.environ.get("LLM_PROXY_WORKERS", "1"))
+    if workers > 1:
+        uvicorn.run("LLM_cache:app", host="0.0.0.0", port=6688, workers=workers)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=6688)
\ No newline at end of file
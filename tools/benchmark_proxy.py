@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Date  : 2026/10/17
+# @File  : benchmark_proxy.py
+# @Author: johnson
+# @Contact : github: johnson7788
+# @Desc  : LLM_cache.py 代理的并发压测，本地模拟上游模型的流式输出，统计吞吐量和 p99 延迟
+"""
+在临时目录中启动一个模拟的上游模型服务和 LLM_cache 代理，然后并发发送流式请求:
+1. miss 阶段: 每个请求的内容都不同，全部未命中缓存，需要请求上游
+2. hit 阶段: 重复 miss 阶段的请求，全部命中缓存
+
+对比改造前后的日志写入和缓存读写方式:
+python benchmark_proxy.py --concurrency 100                     # 后台线程批量写日志，缓存读写在线程池中执行
+python benchmark_proxy.py --concurrency 100 --legacy            # 旧版: 日志和缓存读写都在事件循环中同步执行
+python benchmark_proxy.py --concurrency 100 --legacy-logger     # 只替换为旧版日志，缓存读写仍在线程池中执行
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+import httpx
+import uvicorn
+from fastapi import FastAPI
+from starlette.responses import StreamingResponse
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class LegacyLogger:
+    """旧版日志实现，每条日志都在事件循环中同步写文件，用于对比"""
+
+    def __init__(self, log_file="llm.log"):
+        self.log_file = log_file
+
+    def log(self, message: str):
+        with open(self.log_file, 'a', encoding='utf-8') as f:
+            f.write(message + "\n")
+        print(message)
+
+    log_chunk = log
+
+    def close(self):
+        pass
+
+
+class LegacyAsyncio:
+    """旧版在事件循环中同步读写缓存: 替换 LLM_cache 中的 asyncio，to_thread 直接调用函数，其它属性转发给 asyncio"""
+
+    @staticmethod
+    async def to_thread(func, *args, **kwargs):
+        return func(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(asyncio, name)
+
+
+def create_fake_upstream(chunks: int, chunk_delay: float) -> FastAPI:
+    upstream = FastAPI()
+    upstream.state.requests = 0
+
+    @upstream.get("/stats")
+    async def stats():
+        return {"requests": upstream.state.requests}
+
+    @upstream.post("/v1/chat/completions")
+    async def completions():
+        upstream.state.requests += 1
+
+        async def stream():
+            for idx in range(chunks):
+                payload = {"choices": [{"index": 0, "delta": {"content": f"token{idx} "}}]}
+                yield f"data: {json.dumps(payload)}\n\n"
+                if chunk_delay:
+                    await asyncio.sleep(chunk_delay)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    return upstream
+
+
+async def start_server(app, port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    server.task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    return server
+
+
+async def one_request(client: httpx.AsyncClient, url: str, prompt: str) -> dict:
+    body = {"model": "bench-model", "messages": [{"role": "user", "content": prompt}], "stream": True}
+    start = time.perf_counter()
+    ttfb = None
+    received = 0
+    async with client.stream("POST", url, json=body) as response:
+        async for chunk in response.aiter_bytes():
+            if ttfb is None:
+                ttfb = time.perf_counter() - start
+            received += len(chunk)
+    return {"latency": time.perf_counter() - start, "ttfb": ttfb or 0.0, "bytes": received}
+
+
+def percentile(values, pct: float) -> float:
+    values = sorted(values)
+    if not values:
+        return 0.0
+    idx = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[idx]
+
+
+async def run_phase(name: str, url: str, prompts) -> dict:
+    limits = httpx.Limits(max_connections=len(prompts), max_keepalive_connections=len(prompts))
+    async with httpx.AsyncClient(timeout=600, limits=limits) as client:
+        start = time.perf_counter()
+        results = await asyncio.gather(*(one_request(client, url, prompt) for prompt in prompts))
+        elapsed = time.perf_counter() - start
+    latencies = [r["latency"] for r in results]
+    ttfbs = [r["ttfb"] for r in results]
+    summary = {
+        "phase": name,
+        "requests": len(results),
+        "elapsed": round(elapsed, 3),
+        "throughput_rps": round(len(results) / elapsed, 2),
+        "latency_p50": round(percentile(latencies, 50), 4),
+        "latency_p99": round(percentile(latencies, 99), 4),
+        "ttfb_p99": round(percentile(ttfbs, 99), 4),
+        "bytes": sum(r["bytes"] for r in results),
+    }
+    print(json.dumps(summary, ensure_ascii=False))
+    return summary
+
+
+async def main(args):
+    workdir = tempfile.mkdtemp(prefix="llm_cache_bench_")
+    os.chdir(workdir)
+    os.environ["LLM_CACHE_DIR"] = os.path.join(workdir, "llm_cache")
+    # 回放方式固定为 instant，排除回放延迟对命中阶段的影响
+    os.environ["LLM_CACHE_REPLAY_MODE"] = "instant"
+    sys.path.insert(0, TOOLS_DIR)
+    import LLM_cache  # 在临时目录中导入，缓存和日志都写到临时目录
+
+    if args.legacy or args.legacy_logger:
+        LLM_cache.logger = LegacyLogger("llm.log")
+    if args.legacy:
+        # LLM_cache 中的 asyncio.to_thread 都是缓存文件和索引的读写
+        LLM_cache.asyncio = LegacyAsyncio()
+    LLM_cache.provider2url["bench-model"] = f"http://127.0.0.1:{args.upstream_port}/v1/chat/completions"
+
+    upstream_server = await start_server(create_fake_upstream(args.chunks, args.chunk_delay), args.upstream_port)
+    proxy_server = await start_server(LLM_cache.app, args.proxy_port)
+    url = f"http://127.0.0.1:{args.proxy_port}/chat/completions"
+    prompts = [f"benchmark prompt {idx} {time.time()}" for idx in range(args.concurrency)]
+    try:
+        report = {
+            "mode": "legacy" if args.legacy else "legacy_logger" if args.legacy_logger else "current",
+            "concurrency": args.concurrency,
+            "chunks": args.chunks,
+            "phases": [await run_phase("miss", url, prompts), await run_phase("hit", url, prompts)],
+        }
+    finally:
+        proxy_server.should_exit = True
+        upstream_server.should_exit = True
+        await asyncio.gather(proxy_server.task, upstream_server.task)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存到 {args.output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="LLM_cache 代理并发压测")
+    parser.add_argument("--concurrency", type=int, default=100, help="并发流式请求数")
+    parser.add_argument("--chunks", type=int, default=200, help="每个响应的数据块数量")
+    parser.add_argument("--chunk-delay", type=float, default=0.005, help="模拟上游每个数据块的间隔秒数")
+    parser.add_argument("--upstream-port", type=int, default=16688)
+    parser.add_argument("--proxy-port", type=int, default=16689)
+    parser.add_argument("--legacy", action="store_true", help="旧版行为作为对比: 日志和缓存读写都在事件循环中同步执行")
+    parser.add_argument("--legacy-logger", action="store_true", help="只替换为旧版同步写文件的日志，缓存读写仍在线程池中执行")
+    parser.add_argument("--output", help="把结果保存为 JSON 文件")
+    args = parser.parse_args()
+    if args.output:
+        args.output = os.path.abspath(args.output)
+    asyncio.run(main(args))
@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Date  : 2026/10/17
+# @File  : cache_cli.py
+# @Author: johnson
+# @Contact : github: johnson7788
+# @Desc  : LLM_cache 缓存的导出/导入、整理去重和热点预热命令行工具
+"""
+在不同机器之间迁移录制好的 LLM 请求时，不再需要复制成千上万个零散的 .txt/.request 文件:
+
+# 导出为一个压缩包（.tar.gz 或 .tar.zst，zstd 需要 pip install zstandard），流式写入，不会整体读入内存
+python cache_cli.py export --output llm_cache.tar.gz
+
+# 导入压缩包，已存在的缓存默认跳过，--overwrite 覆盖
+python cache_cli.py import --input llm_cache.tar.gz
+
+# 整理缓存目录: 相同内容的响应只保存一份（硬链接），删除孤立文件，压缩索引，
+# 最近 --grace 秒内写入的文件不处理，代理运行时也可以执行
+python cache_cli.py compact --grace 600
+
+# 根据访问日志（例如 llm.log）或索引中的命中次数生成热点列表，代理启动时预先加载到内存
+python cache_cli.py warm --access-log llm.log --top 500
+
+压缩包结构: 第一个成员是 index.jsonl（每行一个索引条目），之后是 <hash>.txt 和 <hash>.request，
+导入时先把索引逐行写入临时 SQLite 文件，再逐个流式写入文件，索引不整体读入内存。
+"""
+
+import argparse
+import json
+import os
+import re
+import sqlite3
+import sys
+import tarfile
+import tempfile
+from collections import Counter
+
+from cache_store import HOT_KEYS_FILE, create_cache_store
+
+INDEX_MEMBER = "index.jsonl"
+KEY_PATTERN = re.compile(r"\b[0-9a-f]{64}\b")
+
+
+def _open_archive(path: str, mode: str):
+    """按扩展名选择压缩方式，返回 (tarfile, 需要额外关闭的底层文件对象列表)"""
+    if path.endswith(".zst"):
+        try:
+            import zstandard  # pip install zstandard
+        except ImportError:
+            sys.exit("导出/导入 .zst 需要安装 zstandard: pip install zstandard")
+        raw = open(path, mode + "b")
+        if mode == "w":
+            stream = zstandard.ZstdCompressor().stream_writer(raw)
+        else:
+            stream = zstandard.ZstdDecompressor().stream_reader(raw)
+        return tarfile.open(fileobj=stream, mode=mode + "|"), [stream, raw]
+    return tarfile.open(path, mode + "|gz"), []
+
+
+def export_cache(store, output: str, include_errors: bool = False) -> int:
+    count = 0
+    archive, extra = _open_archive(output, "w")
+    try:
+        # 索引先写到临时文件，作为压缩包的第一个成员
+        with tempfile.TemporaryFile("w+b") as index_file:
+            for entry in store.iter_entries():
+                if include_errors or not entry["is_error"]:
+                    index_file.write((json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8"))
+                    count += 1
+            index_file.seek(0, os.SEEK_END)
+            info = tarfile.TarInfo(INDEX_MEMBER)
+            info.size = index_file.tell()
+            index_file.seek(0)
+            archive.addfile(info, index_file)
+        for entry in store.iter_entries():
+            if entry["is_error"] and not include_errors:
+                continue
+            for path in (store.response_path(entry["key"]), store.request_path(entry["key"])):
+                if os.path.exists(path):
+                    # compact 之后相同的响应是硬链接，按普通文件写入，避免导入时变成链接成员
+                    info = tarfile.TarInfo(os.path.basename(path))
+                    info.size = os.path.getsize(path)
+                    info.mtime = int(os.path.getmtime(path))
+                    with open(path, 'rb') as f:
+                        archive.addfile(info, f)
+    finally:
+        archive.close()
+        for stream in extra:
+            stream.close()
+    return count
+
+
+def _load_index(fileobj, path: str, batch_size: int = 1000) -> sqlite3.Connection:
+    """把压缩包中的索引逐行分批写入临时 SQLite 文件，导入时按缓存键查询，索引（包括 timings）不整体读入内存"""
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE entries (key TEXT PRIMARY KEY, entry TEXT NOT NULL)")
+    batch = []
+    for line in fileobj:
+        if not line.strip():
+            continue
+        key = json.loads(line)["key"]
+        batch.append((key, line.decode("utf-8")))
+        if len(batch) >= batch_size:
+            conn.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?)", batch)
+            batch = []
+    conn.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?)", batch)
+    conn.commit()
+    return conn
+
+
+def import_cache(store, input_path: str, overwrite: bool = False) -> int:
+    archive, extra = _open_archive(input_path, "r")
+    index = None
+    imported = 0
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        try:
+            for member in archive:
+                if not member.isfile():
+                    continue
+                fileobj = archive.extractfile(member)
+                if member.name == INDEX_MEMBER:
+                    index = _load_index(fileobj, os.path.join(tmp_dir, "index.db"))
+                    continue
+                key, ext = os.path.splitext(os.path.basename(member.name))
+                row = index.execute("SELECT entry FROM entries WHERE key = ?", (key,)).fetchone() \
+                    if index is not None else None
+                if row is None:
+                    print(f"跳过索引中不存在的文件: {member.name}")
+                    continue
+                entry = json.loads(row[0])
+                if ext == ".request":
+                    if overwrite or not os.path.exists(store.request_path(key)):
+                        store.import_request(key, fileobj)
+                elif ext == ".txt":
+                    if not overwrite and os.path.exists(store.response_path(key)):
+                        continue
+                    store.import_response(key, fileobj, model=entry.get("model") or "", is_error=entry["is_error"],
+                                          meta=entry.get("meta"), created_at=entry.get("created_at"))
+                    imported += 1
+        finally:
+            if index is not None:
+                index.close()
+            archive.close()
+            for stream in extra:
+                stream.close()
+    return imported
+
+
+def hot_keys_from_log(path: str) -> Counter:
+    """从访问日志中统计每个缓存键出现的次数，日志中任意位置的 64 位十六进制字符串都视为缓存键"""
+    counter = Counter()
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            counter.update(KEY_PATTERN.findall(line))
+    return counter
+
+
+def warm_cache(store, cache_dir: str, access_log: str = None, top: int = 500) -> list:
+    if access_log:
+        counter = hot_keys_from_log(access_log)
+    else:
+        counter = Counter({entry["key"]: entry["hits"] for entry in store.iter_entries() if not entry["is_error"]})
+    keys = [key for key, _ in counter.most_common(top)]
+    with open(os.path.join(cache_dir, HOT_KEYS_FILE), 'w', encoding='utf-8') as f:
+        f.write("\n".join(keys))
+    return keys
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM_cache 缓存管理工具")
+    parser.add_argument("--cache-dir", default=os.environ.get("LLM_CACHE_DIR", "llm_cache"))
+    parser.add_argument("--backend", default=os.environ.get("LLM_CACHE_BACKEND", "sharded"))
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="导出缓存为压缩包")
+    export_parser.add_argument("--output", required=True, help="输出文件，.tar.gz 或 .tar.zst")
+    export_parser.add_argument("--include-errors", action="store_true", help="同时导出标记为错误的缓存")
+
+    import_parser = subparsers.add_parser("import", help="从压缩包导入缓存")
+    import_parser.add_argument("--input", required=True)
+    import_parser.add_argument("--overwrite", action="store_true", help="覆盖已存在的缓存")
+
+    compact_parser = subparsers.add_parser("compact", help="去重相同的响应、删除孤立文件、压缩索引")
+    compact_parser.add_argument("--grace", type=float, default=600,
+                                help="跳过最近多少秒内修改过的文件，代理运行时执行也不会删除刚写入的缓存")
+
+    warm_parser = subparsers.add_parser("warm", help="生成热点缓存列表，代理启动时预先加载到内存")
+    warm_parser.add_argument("--access-log", help="访问日志，例如 llm.log，不指定则按索引中的命中次数排序")
+    warm_parser.add_argument("--top", type=int, default=500, help="热点缓存数量")
+
+    args = parser.parse_args()
+    store = create_cache_store(args.backend, args.cache_dir)
+    try:
+        if args.command == "export":
+            count = export_cache(store, args.output, args.include_errors)
+            print(f"已导出 {count} 条缓存到 {args.output}")
+        elif args.command == "import":
+            count = import_cache(store, args.input, args.overwrite)
+            print(f"已导入 {count} 条缓存到 {args.cache_dir}")
+        elif args.command == "compact":
+            result = store.compact(args.grace)
+            print(f"去重 {result['deduplicated']} 个文件，删除 {result['removed_orphans']} 个孤立文件，"
+                  f"跳过 {result['skipped_recent']} 个最近写入的文件，节省 {result['saved_bytes'] / 1024 / 1024:.2f} MB")
+        elif args.command == "warm":
+            keys = warm_cache(store, args.cache_dir, args.access_log, args.top)
+            print(f"已写入 {len(keys)} 个热点缓存键到 {os.path.join(args.cache_dir, HOT_KEYS_FILE)}")
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Date  : 2026/10/17
+# @File  : cache_key.py
+# @Author: johnson
+# @Contact : github: johnson7788
+# @Desc  : 规范化的缓存键，语义相同的请求（字段顺序、空白、易变字段不同）得到同一个缓存键
+"""
+LiteLLM、ADK 等客户端每次请求都会带上变化的字段（stream_options、user、请求id、工具调用id等），
+直接对请求体字节做哈希会导致缓存无法命中。这里先解析请求体，再按策略规范化后计算哈希:
+1. 删除易变字段
+2. 规范化 messages: 去掉值为 None 的字段，单个文本片段的 content 统一成字符串，工具调用id按出现顺序重新编号
+3. 规范化 tools: 按函数名排序
+4. 所有字典按 key 排序后紧凑序列化，与模型名一起计算 SHA256
+
+不同模型可以配置不同的策略，配置文件格式(JSON)，default 为所有模型的默认策略:
+{
+    "default": {"drop_fields": ["stream_options", "user"], "sort_tools": true},
+    "deepseek-chat": {"drop_fields": ["stream_options", "user", "seed"]}
+}
+"""
+
+import hashlib
+import json
+from dataclasses import dataclass, field, replace
+from typing import Any, Dict, List, Optional
+
+# 不影响模型输出、但每次请求都可能变化的字段
+DEFAULT_VOLATILE_FIELDS = ["stream_options", "user", "request_id", "metadata", "store"]
+
+
+@dataclass
+class KeyPolicy:
+    drop_fields: List[str] = field(default_factory=lambda: list(DEFAULT_VOLATILE_FIELDS))
+    sort_tools: bool = True  # 工具列表是否按函数名排序
+    renumber_tool_call_ids: bool = True  # 工具调用id是否按出现顺序重新编号
+    strip_content: bool = False  # 是否去掉消息内容首尾空白
+
+
+class CacheKeyBuilder:
+    """根据模型对应的策略计算规范化缓存键"""
+
+    def __init__(self, policies: Optional[Dict[str, KeyPolicy]] = None):
+        self.policies = dict(policies or {})
+        self.default_policy = self.policies.pop("default", KeyPolicy())
+
+    @classmethod
+    def from_file(cls, path: str) -> "CacheKeyBuilder":
+        with open(path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+        default = KeyPolicy(**config.pop("default", {}))
+        policies = {model: replace(default, **options) for model, options in config.items()}
+        policies["default"] = default
+        return cls(policies)
+
+    def policy_for(self, model: str) -> KeyPolicy:
+        return self.policies.get(model, self.default_policy)
+
+    def canonicalize(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        """返回规范化后的请求体，不修改原始请求"""
+        policy = self.policy_for(body.get("model", ""))
+        payload = {k: v for k, v in body.items() if k not in policy.drop_fields and v is not None}
+        if isinstance(payload.get("messages"), list):
+            payload["messages"] = normalize_messages(payload["messages"], policy)
+        if policy.sort_tools and isinstance(payload.get("tools"), list):
+            payload["tools"] = sorted(payload["tools"], key=_tool_name)
+        return payload
+
+    def build(self, body: Dict[str, Any]) -> str:
+        payload = self.canonicalize(body)
+        canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+        data = f"{body.get('model', '')}\n{canonical}"
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def _tool_name(tool: Any) -> str:
+    if isinstance(tool, dict):
+        function = tool.get("function") or {}
+        return str(function.get("name") or tool.get("name") or "")
+    return ""
+
+
+def _drop_none(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {k: _drop_none(v) for k, v in value.items() if v is not None}
+    if isinstance(value, list):
+        return [_drop_none(v) for v in value]
+    return value
+
+
+def _canonical_arguments(arguments: Any) -> Any:
+    """工具调用参数是 JSON 字符串，字段顺序和空白不同也视为相同"""
+    if not isinstance(arguments, str):
+        return arguments
+    try:
+        return json.dumps(json.loads(arguments), sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    except ValueError:
+        return arguments
+
+
+def normalize_messages(messages: List[Any], policy: KeyPolicy) -> List[Any]:
+    id_map: Dict[str, str] = {}
+
+    def renumber(call_id: str) -> str:
+        if call_id not in id_map:
+            id_map[call_id] = f"call_{len(id_map)}"
+        return id_map[call_id]
+
+    normalized = []
+    for message in messages:
+        if not isinstance(message, dict):
+            normalized.append(message)
+            continue
+        message = _drop_none(message)
+        content = message.get("content")
+        # [{"type": "text", "text": "..."}] 与 "..." 等价
+        if isinstance(content, list) and len(content) == 1 and isinstance(content[0], dict) \
+                and content[0].get("type") == "text":
+            content = content[0].get("text", "")
+        if policy.strip_content and isinstance(content, str):
+            content = content.strip()
+        if "content" in message:
+            message["content"] = content
+        if policy.renumber_tool_call_ids:
+            if message.get("tool_call_id"):
+                message["tool_call_id"] = renumber(message["tool_call_id"])
+            for tool_call in message.get("tool_calls") or []:
+                if isinstance(tool_call, dict) and tool_call.get("id"):
+                    tool_call["id"] = renumber(tool_call["id"])
+        for tool_call in message.get("tool_calls") or []:
+            if isinstance(tool_call, dict) and isinstance(tool_call.get("function"), dict):
+                tool_call["function"]["arguments"] = _canonical_arguments(tool_call["function"].get("arguments"))
+        normalized.append(message)
+    return normalized
@@ -0,0 +1,495 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Date  : 2026/10/17
+# @File  : cache_store.py
+# @Author: johnson
+# @Contact : github: johnson7788
+# @Desc  : LLM_cache.py 的缓存存储后端，分片目录 + SQLite 索引，支持容量/TTL 限制和 LRU 淘汰
+"""
+目录结构:
+llm_cache/
+├── index.db                  # SQLite 索引: 大小、创建/访问时间、命中次数、是否错误等
+├── ab/cd/<hash>.txt          # 模型响应内容（按哈希前缀分两级目录）
+└── ab/cd/<hash>.request      # 请求内容
+
+所有文件都是先写临时文件再 os.replace，避免进程中断留下半个缓存文件。
+错误状态在写入时记录到索引中，启动时无需再逐个读取缓存文件。
+索引使用 SQLite WAL 模式，总大小由触发器在同一条语句中维护，多个 worker 进程可以共享同一个缓存目录。
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import shutil
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+from process_lock import FileLock
+from sse_classifier import classify_lines
+
+# cache_cli.py warm 生成的热点缓存键列表，代理启动时预先加载到内存
+HOT_KEYS_FILE = "hot_keys.list"
+
+
+class CacheStore(ABC):
+    """缓存后端接口，LLM_cache.py 只依赖这些方法"""
+
+    @abstractmethod
+    def lookup(self, key: str) -> Optional[str]:
+        """命中时返回响应文件路径，并刷新访问时间；未命中、已过期或错误条目返回 None"""
+        pass
+
+    @abstractmethod
+    def get_meta(self, key: str) -> Optional[Dict]:
+        """返回写入时记录的附加元数据"""
+        pass
+
+    @abstractmethod
+    def put(self, key: str, content: str, model: str = "", is_error: bool = False,
+            meta: Optional[Dict] = None) -> str:
+        """写入响应内容，返回文件路径"""
+        pass
+
+    @abstractmethod
+    def put_request(self, key: str, request_text: str) -> None:
+        """记录请求内容，已存在则跳过"""
+        pass
+
+    def read(self, key: str) -> Optional[bytes]:
+        """返回内存热点集合中的响应内容，不在热点集合中时返回 None"""
+        return None
+
+    def warm(self, keys: List[str]) -> int:
+        """把指定的缓存键预先加载到内存热点集合中，返回加载数量"""
+        return 0
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        pass
+
+    @abstractmethod
+    def error_keys(self) -> List[str]:
+        """索引中标记为错误的缓存键"""
+        pass
+
+    @abstractmethod
+    def evict(self) -> int:
+        """按 TTL 和容量限制淘汰条目，返回淘汰数量"""
+        pass
+
+    @abstractmethod
+    def stats(self) -> Dict:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+def atomic_copy(path: str, fileobj: BinaryIO) -> None:
+    """从文件对象分块复制到临时文件，再原子替换目标文件，大文件不会整体读入内存"""
+    directory = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            shutil.copyfileobj(fileobj, f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def file_signature(stat: os.stat_result) -> Tuple[int, int, int]:
+    """响应文件的标识: 覆盖写入（os.replace）会换成新的 inode，淘汰、删除后文件不存在"""
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+def atomic_write(path: str, data: str) -> None:
+    """先写同目录下的临时文件，再原子替换目标文件"""
+    directory = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class ShardedCacheStore(CacheStore):
+    """
+    按哈希前缀分片的磁盘缓存，元数据保存在 SQLite 索引中
+    :param cache_dir: 缓存根目录
+    :param max_bytes: 响应文件总大小上限，0 表示不限制，超出后按最近访问时间淘汰
+    :param ttl: 条目存活秒数，0 表示永不过期
+    :param shard_depth: 分片目录层数，每层使用哈希的 2 个字符
+    :param hot_max_bytes: 内存热点集合的大小上限，命中时直接从内存返回，0 表示不使用；
+        多个 worker 进程共用缓存目录时，其它进程可能覆盖、淘汰或删除了热点条目，
+        每次从内存返回前都检查响应文件的 inode、大小和修改时间是否与加载时相同
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 0, ttl: float = 0, shard_depth: int = 2,
+                 hot_max_bytes: int = 0):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.shard_depth = shard_depth
+        self.hot_max_bytes = hot_max_bytes
+        # key -> (响应内容, 加载时响应文件的标识)
+        self._hot: "OrderedDict[str, Tuple[bytes, Tuple[int, int, int]]]" = OrderedDict()
+        self._hot_bytes = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self._lock = threading.RLock()
+        # 自动提交模式，每条语句(连同触发器)是一个事务；WAL 模式下读写互不阻塞，写冲突时最多等待 30 秒
+        self._conn = sqlite3.connect(os.path.join(cache_dir, "index.db"), check_same_thread=False,
+                                     timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0,
+                is_error INTEGER NOT NULL DEFAULT 0,
+                meta TEXT
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON entries(last_access)")
+        # 响应文件总大小，由触发器维护，所有进程看到的都是同一个值
+        self._conn.execute("CREATE TABLE IF NOT EXISTS totals (id INTEGER PRIMARY KEY CHECK (id = 0), bytes INTEGER)")
+        self._conn.execute("INSERT OR IGNORE INTO totals (id, bytes) SELECT 0, COALESCE(SUM(size), 0) FROM entries")
+        self._conn.executescript(
+            """
+            CREATE TRIGGER IF NOT EXISTS entries_insert AFTER INSERT ON entries
+            BEGIN UPDATE totals SET bytes = bytes + NEW.size WHERE id = 0; END;
+            CREATE TRIGGER IF NOT EXISTS entries_delete AFTER DELETE ON entries
+            BEGIN UPDATE totals SET bytes = bytes - OLD.size WHERE id = 0; END;
+            CREATE TRIGGER IF NOT EXISTS entries_update AFTER UPDATE OF size ON entries
+            BEGIN UPDATE totals SET bytes = bytes - OLD.size + NEW.size WHERE id = 0; END;
+            """
+        )
+        # 多个 worker 同时启动时只有一个进程执行迁移
+        with FileLock(os.path.join(cache_dir, ".migrate.lock")):
+            self._migrate_flat_files()
+
+    @property
+    def _total_bytes(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT bytes FROM totals WHERE id = 0").fetchone()[0]
+
+    def _shard_dir(self, key: str) -> str:
+        parts = [key[i * 2:i * 2 + 2] for i in range(self.shard_depth)]
+        return os.path.join(self.cache_dir, *parts)
+
+    def response_path(self, key: str) -> str:
+        return os.path.join(self._shard_dir(key), f"{key}.txt")
+
+    def request_path(self, key: str) -> str:
+        return os.path.join(self._shard_dir(key), f"{key}.request")
+
+    def _migrate_flat_files(self):
+        """把旧版平铺在根目录的 <hash>.txt/<hash>.request 迁移到分片目录，只在第一次启动时发生"""
+        legacy = [name for name in os.listdir(self.cache_dir)
+                  if name.endswith(".txt") or name.endswith(".request")]
+        if not legacy:
+            return
+        print(f"迁移旧版缓存文件到分片目录，共 {len(legacy)} 个文件...")
+        for name in legacy:
+            src = os.path.join(self.cache_dir, name)
+            key, ext = os.path.splitext(name)
+            os.makedirs(self._shard_dir(key), exist_ok=True)
+            if ext == ".request":
+                os.replace(src, self.request_path(key))
+                continue
+            dst = self.response_path(key)
+            os.replace(src, dst)
+            # 旧文件没有元数据，只能在迁移时读取一次来判断是否为错误响应
+            with open(dst, 'r', encoding='utf-8', errors='replace') as f:
+                admit, _ = classify_lines(f)
+            is_error = not admit
+            stat = os.stat(dst)
+            self._index(key, "", stat.st_size, is_error, None, created_at=stat.st_mtime)
+
+    def _index(self, key: str, model: str, size: int, is_error: bool, meta: Optional[Dict],
+               created_at: Optional[float] = None):
+        now = time.time()
+        created_at = created_at or now
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO entries (key, model, size, created_at, last_access, hits, is_error, meta) "
+                "VALUES (?, ?, ?, ?, ?, 0, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET model = excluded.model, size = excluded.size, "
+                "created_at = excluded.created_at, last_access = excluded.last_access, hits = 0, "
+                "is_error = excluded.is_error, meta = excluded.meta",
+                (key, model, size, created_at, now, int(is_error), json.dumps(meta) if meta else None),
+            )
+
+    def _expired(self, created_at: float) -> bool:
+        return bool(self.ttl) and created_at + self.ttl < time.time()
+
+    def lookup(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT created_at, is_error FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or row[1]:
+                return None
+            if self._expired(row[0]):
+                self.delete(key)
+                return None
+            path = self.response_path(key)
+            if not os.path.exists(path):
+                # 文件被手动删除，索引同步清理
+                self.delete(key)
+                return None
+            self._conn.execute(
+                "UPDATE entries SET last_access = ?, hits = hits + 1 WHERE key = ?", (time.time(), key)
+            )
+            return path
+
+    def get_meta(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT meta FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None or not row[0]:
+            return None
+        return json.loads(row[0])
+
+    def put(self, key: str, content: str, model: str = "", is_error: bool = False,
+            meta: Optional[Dict] = None) -> str:
+        path = self.response_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        atomic_write(path, content)
+        self._drop_hot(key)
+        self._index(key, model, os.path.getsize(path), is_error, meta)
+        if self.max_bytes and self._total_bytes > self.max_bytes:
+            self.evict()
+        return path
+
+    def put_request(self, key: str, request_text: str) -> None:
+        path = self.request_path(key)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        atomic_write(path, request_text)
+
+    def delete(self, key: str) -> None:
+        self._drop_hot(key)
+        with self._lock:
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+        for path in (self.response_path(key), self.request_path(key)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                # 其它进程已经删除
+                pass
+
+    def import_response(self, key: str, fileobj: BinaryIO, model: str = "", is_error: bool = False,
+                        meta: Optional[Dict] = None, created_at: Optional[float] = None) -> str:
+        """从文件对象流式导入响应内容，保留原有的创建时间和元数据"""
+        path = self.response_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        atomic_copy(path, fileobj)
+        self._drop_hot(key)
+        self._index(key, model, os.path.getsize(path), is_error, meta, created_at=created_at)
+        return path
+
+    def import_request(self, key: str, fileobj: BinaryIO) -> None:
+        path = self.request_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        atomic_copy(path, fileobj)
+
+    def iter_entries(self) -> Iterator[Dict]:
+        """逐条遍历索引中的所有条目，用于导出和整理，不会一次性读入所有条目"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "SELECT key, model, size, created_at, last_access, hits, is_error, meta FROM entries"
+            )
+            for key, model, size, created_at, last_access, hits, is_error, meta in cursor:
+                yield {"key": key, "model": model, "size": size, "created_at": created_at,
+                       "last_access": last_access, "hits": hits, "is_error": bool(is_error),
+                       "meta": json.loads(meta) if meta else None}
+
+    def read(self, key: str) -> Optional[bytes]:
+        path = self.response_path(key)
+        with self._lock:
+            cached = self._hot.get(key)
+        if cached is not None:
+            try:
+                signature = file_signature(os.stat(path))
+            except FileNotFoundError:
+                signature = None
+            if signature == cached[1]:
+                with self._lock:
+                    if key in self._hot:
+                        self._hot.move_to_end(key)
+                return cached[0]
+            # 其它进程覆盖、淘汰或删除了该条目，内存中的内容已经过期
+            self._drop_hot(key)
+        if not self.hot_max_bytes:
+            return None
+        try:
+            f = open(path, 'rb')
+        except FileNotFoundError:
+            return None
+        with f:
+            # 标识取自打开的文件，读取期间文件被替换也不会把新内容和旧标识放在一起
+            stat = os.fstat(f.fileno())
+            if stat.st_size > self.hot_max_bytes:
+                return None
+            data = f.read()
+        self._add_hot(key, data, file_signature(stat))
+        return data
+
+    def warm(self, keys: List[str]) -> int:
+        loaded = 0
+        for key in keys:
+            if self._hot_bytes >= self.hot_max_bytes:
+                break
+            with self._lock:
+                row = self._conn.execute("SELECT is_error FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None or row[0]:
+                continue
+            if self.read(key) is not None:
+                loaded += 1
+        return loaded
+
+    def _add_hot(self, key: str, data: bytes, signature: Tuple[int, int, int]) -> None:
+        with self._lock:
+            self._drop_hot(key)
+            self._hot[key] = (data, signature)
+            self._hot_bytes += len(data)
+            while self._hot_bytes > self.hot_max_bytes and self._hot:
+                _, (evicted, _) = self._hot.popitem(last=False)
+                self._hot_bytes -= len(evicted)
+
+    def _drop_hot(self, key: str) -> None:
+        with self._lock:
+            cached = self._hot.pop(key, None)
+            if cached is not None:
+                self._hot_bytes -= len(cached[0])
+
+    def compact(self, grace: float = 600) -> Dict:
+        """
+        整理缓存目录: 内容完全相同的响应文件改为硬链接只保存一份，删除索引中不存在的文件和残留的临时文件，
+        最后压缩 SQLite 索引。逻辑大小(用于容量限制)不变，返回节省的磁盘空间
+
+        put 先写临时文件、重命名后才写入索引，代理运行时执行 compact，刚写入的文件可能还不在索引中，
+        因此 grace 秒内修改过的文件都不处理，删除前还会再次确认索引中没有该缓存键。
+        """
+        with self._lock:
+            known = {row[0] for row in self._conn.execute("SELECT key FROM entries")}
+        cutoff = time.time() - grace
+        by_digest: Dict[str, str] = {}
+        result = {"deduplicated": 0, "removed_orphans": 0, "saved_bytes": 0, "skipped_recent": 0}
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                key, ext = os.path.splitext(name)
+                if ext not in (".tmp", ".txt"):
+                    continue
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                if stat.st_mtime > cutoff:
+                    result["skipped_recent"] += 1
+                    continue
+                if ext == ".tmp" or key not in known:
+                    with self._lock:
+                        if ext == ".txt" and self._conn.execute(
+                                "SELECT 1 FROM entries WHERE key = ?", (key,)).fetchone():
+                            # 读取快照之后写入的缓存
+                            known.add(key)
+                        else:
+                            result["saved_bytes"] += stat.st_size
+                            result["removed_orphans"] += 1
+                            os.remove(path)
+                            continue
+                digest = hashlib.sha256()
+                with open(path, 'rb') as f:
+                    for block in iter(lambda: f.read(1 << 20), b""):
+                        digest.update(block)
+                first = by_digest.setdefault(digest.hexdigest(), path)
+                if first == path or os.path.samefile(first, path):
+                    continue
+                tmp_path = path + ".link.tmp"
+                os.link(first, tmp_path)
+                os.replace(tmp_path, path)
+                result["deduplicated"] += 1
+                result["saved_bytes"] += stat.st_size
+        with self._lock:
+            self._conn.execute("VACUUM")
+        return result
+
+    def error_keys(self) -> List[str]:
+        with self._lock:
+            rows = self._conn.execute("SELECT key FROM entries WHERE is_error = 1").fetchall()
+        return [row[0] for row in rows]
+
+    def evict(self) -> int:
+        evicted = 0
+        with self._lock:
+            if self.ttl:
+                rows = self._conn.execute(
+                    "SELECT key FROM entries WHERE created_at < ?", (time.time() - self.ttl,)
+                ).fetchall()
+                for (key,) in rows:
+                    self.delete(key)
+                    evicted += 1
+            if self.max_bytes and self._total_bytes > self.max_bytes:
+                # 按最近访问时间从旧到新淘汰，直到低于上限
+                rows = self._conn.execute("SELECT key FROM entries ORDER BY last_access ASC").fetchall()
+                for (key,) in rows:
+                    if self._total_bytes <= self.max_bytes:
+                        break
+                    self.delete(key)
+                    evicted += 1
+        return evicted
+
+    def stats(self) -> Dict:
+        with self._lock:
+            count, errors = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(is_error), 0) FROM entries"
+            ).fetchone()
+        return {
+            "entries": count,
+            "error_entries": errors,
+            "total_bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "hot_entries": len(self._hot),
+            "hot_bytes": self._hot_bytes,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def load_hot_keys(cache_dir: str) -> List[str]:
+    path = os.path.join(cache_dir, HOT_KEYS_FILE)
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+# 可选的缓存后端，自定义后端继承 CacheStore 后注册到这里即可
+CACHE_BACKENDS = {
+    "sharded": ShardedCacheStore,
+}
+
+
+def create_cache_store(backend: str, cache_dir: str, **kwargs) -> CacheStore:
+    assert backend in CACHE_BACKENDS, f"不支持的缓存后端: {backend}，可选: {list(CACHE_BACKENDS)}"
+    return CACHE_BACKENDS[backend](cache_dir, **kwargs)
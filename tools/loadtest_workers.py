@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Date  : 2026/10/17
+# @File  : loadtest_workers.py
+# @Author: johnson
+# @Contact : github: johnson7788
+# @Desc  : 多 worker 部署的压测，对比 1 到 N 个 uvicorn worker 的吞吐量，并检查跨进程请求合并
+"""
+每种 worker 数量都在新的临时缓存目录中启动一次代理（uvicorn LLM_cache:app --workers N），依次运行:
+1. miss: 每个请求内容不同，全部请求上游
+2. hit: 重复 miss 阶段的请求，全部命中缓存
+3. burst: 所有请求内容相同，理想情况下上游只收到 1 次请求（upstream_requests）
+
+python loadtest_workers.py --workers 1 2 4 --concurrency 200 --output workers.json
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+import uvicorn
+
+from benchmark_proxy import TOOLS_DIR, create_fake_upstream, run_phase
+
+
+def serve_fake_upstream(port: int, chunks: int, chunk_delay: float):
+    uvicorn.run(create_fake_upstream(chunks, chunk_delay), host="127.0.0.1", port=port, log_level="warning")
+
+
+async def wait_for_port(url: str, timeout: float = 30.0):
+    deadline = time.time() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.time() < deadline:
+            try:
+                await client.get(url)
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"服务未在 {timeout} 秒内启动: {url}")
+
+
+async def upstream_requests(upstream_url: str) -> int:
+    async with httpx.AsyncClient() as client:
+        return (await client.get(f"{upstream_url}/stats")).json()["requests"]
+
+
+async def run_workers(workers: int, args) -> dict:
+    workdir = tempfile.mkdtemp(prefix=f"llm_cache_workers{workers}_")
+    upstream_url = f"http://127.0.0.1:{args.upstream_port}"
+    env = {
+        **os.environ,
+        "PYTHONPATH": TOOLS_DIR,
+        "LLM_CACHE_DIR": os.path.join(workdir, "llm_cache"),
+        "LLM_CACHE_REPLAY_MODE": "instant",
+        "LLM_LOG_CHUNK_SAMPLE": "0",
+        "LLM_EXTRA_PROVIDERS": json.dumps({"bench-model": f"{upstream_url}/v1/chat/completions"}),
+    }
+    proxy = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "LLM_cache:app", "--host", "127.0.0.1", "--port", str(args.proxy_port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{args.proxy_port}/chat/completions"
+    try:
+        await wait_for_port(f"http://127.0.0.1:{args.proxy_port}/cache/stats")
+        prompts = [f"loadtest prompt {idx} {time.time()}" for idx in range(args.concurrency)]
+        phases = [await run_phase("miss", url, prompts), await run_phase("hit", url, prompts)]
+        before = await upstream_requests(upstream_url)
+        burst = await run_phase("burst", url, [f"loadtest burst {time.time()}"] * args.concurrency)
+        burst["upstream_requests"] = await upstream_requests(upstream_url) - before
+        phases.append(burst)
+    finally:
+        proxy.terminate()
+        proxy.wait()
+    return {"workers": workers, "phases": phases}
+
+
+async def main(args):
+    upstream = multiprocessing.Process(
+        target=serve_fake_upstream, args=(args.upstream_port, args.chunks, args.chunk_delay), daemon=True
+    )
+    upstream.start()
+    try:
+        await wait_for_port(f"http://127.0.0.1:{args.upstream_port}/stats")
+        results = [await run_workers(workers, args) for workers in args.workers]
+    finally:
+        upstream.terminate()
+    print("\nworkers  miss_rps  hit_rps  burst_upstream_requests")
+    for result in results:
+        miss, hit, burst = result["phases"]
+        print(f"{result['workers']:>7}  {miss['throughput_rps']:>8}  {hit['throughput_rps']:>7}  "
+              f"{burst['upstream_requests']:>23}")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存到 {args.output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="LLM_cache 多 worker 压测")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="依次测试的 worker 数量")
+    parser.add_argument("--concurrency", type=int, default=200, help="并发流式请求数")
+    parser.add_argument("--chunks", type=int, default=200, help="每个响应的数据块数量")
+    parser.add_argument("--chunk-delay", type=float, default=0.005, help="模拟上游每个数据块的间隔秒数")
+    parser.add_argument("--upstream-port", type=int, default=16688)
+    parser.add_argument("--proxy-port", type=int, default=16689)
+    parser.add_argument("--output", help="把结果保存为 JSON 文件")
+    asyncio.run(main(parser.parse_args()))
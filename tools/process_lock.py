@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Date  : 2026/10/17
+# @File  : process_lock.py
+# @Author: johnson
+# @Contact : github: johnson7788
+# @Desc  : 基于 fcntl.flock 的跨进程文件锁，uvicorn --workers N 或多个副本共享同一个缓存目录时使用
+"""
+进程退出时操作系统会自动释放 flock，不会因为 worker 崩溃留下死锁。
+Windows 没有 fcntl，锁退化为空操作，此时只能单进程运行。
+"""
+
+import asyncio
+import os
+from typing import Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+class FileLock:
+    """
+    :param path: 锁文件路径
+    :param remove_on_release: 释放时删除锁文件，适合按缓存键创建的一次性锁，避免锁文件越积越多
+    """
+
+    def __init__(self, path: str, remove_on_release: bool = False):
+        self.path = path
+        self.remove_on_release = remove_on_release
+        self._fd: Optional[int] = None
+
+    def acquire(self, blocking: bool = True) -> bool:
+        if fcntl is None:
+            return True
+        while True:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                return False
+            # 加锁期间文件可能已被上一个持有者删除，此时锁住的是已删除的文件，需要重新打开
+            try:
+                linked = os.stat(self.path).st_ino == os.fstat(fd).st_ino
+            except FileNotFoundError:
+                linked = False
+            if linked:
+                self._fd = fd
+                return True
+            os.close(fd)
+
+    async def acquire_async(self, poll_interval: float = 0.1, timeout: Optional[float] = None) -> bool:
+        """在事件循环中轮询获取锁，不占用线程池，超时返回 False"""
+        waited = 0.0
+        while not self.acquire(blocking=False):
+            if timeout is not None and waited >= timeout:
+                return False
+            await asyncio.sleep(poll_interval)
+            waited += poll_interval
+        return True
+
+    def release(self) -> None:
+        if self._fd is None:
+            return
+        if self.remove_on_release:
+            os.unlink(self.path)
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
+        os.close(self._fd)
+        self._fd = None
+
+    def __enter__(self) -> "FileLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.release()
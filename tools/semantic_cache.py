@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Date  : 2026/10/17
+# @File  : semantic_cache.py
+# @Author: johnson
+# @Contact : github: johnson7788
+# @Desc  : 近似重复请求的第二级缓存，屏蔽日期/UUID后按 SimHash 查找相似的已缓存请求
+"""
+Agent 每次生成的提示词常常只有日期(global_instruction 中的 Todays date)、会话id 或少量措辞不同，
+精确哈希的缓存无法命中。第二级缓存的查找顺序:
+1. 提示词文本（未屏蔽）完全相同 -> 命中
+2. 屏蔽日期、时间、UUID、长十六进制id 后，提示词的 64 位 SimHash 与已缓存请求的汉明距离不超过阈值 -> 命中
+只有模型、除 messages 以外的参数(temperature、tools 等)和最后一条用户消息都完全相同的请求之间才会比较:
+数字不屏蔽（"17 * 23" 和 "91 * 88" 是不同的问题），SimHash 覆盖整个对话，很长的系统提示词相同时
+只有最后一句不同的请求距离也可能为 0，所以最后一条用户消息必须完全相同。
+
+纯 Python 实现，不依赖向量模型和网络，索引保存在缓存目录下的 semantic.db 中。
+每个模型的阈值可以单独配置(JSON)，max_distance 为允许的最大汉明距离，0 表示只做精确匹配，
+max_distance 不超过 3 时通过 SimHash 分段桶查找候选请求，超过 3 时逐个比较参数签名相同的请求:
+{
+    "default": {"enabled": true, "max_distance": 3},
+    "gpt-4.1": {"max_distance": 0},
+    "deepseek-r1-250528": {"enabled": false}
+}
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from cache_key import CacheKeyBuilder
+
+MASK_PATTERNS = [
+    (re.compile(r"[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}"), "<UUID>"),
+    (re.compile(r"\d{4}\s*[-/.年]\s*\d{1,2}\s*[-/.月]\s*\d{1,2}\s*日?"), "<DATE>"),
+    (re.compile(r"\d{1,2}:\d{2}(:\d{2}(\.\d+)?)?"), "<TIME>"),
+    (re.compile(r"\b[0-9a-fA-F]{16,}\b"), "<ID>"),
+]
+
+SIMHASH_BITS = 64
+# SimHash 分成 4 段，每段 16 位，汉明距离不超过 3 时至少有一段完全相同（抽屉原理）
+BANDS = 4
+BAND_BITS = SIMHASH_BITS // BANDS
+DEFAULT_POLICY = {"enabled": True, "max_distance": 3}
+
+
+def mask_text(text: str) -> str:
+    for pattern, placeholder in MASK_PATTERNS:
+        text = pattern.sub(placeholder, text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def _shingles(text: str, n: int = 3) -> List[str]:
+    # 按字符切分，中英文混合的提示词都适用
+    if len(text) <= n:
+        return [text]
+    return [text[i:i + n] for i in range(len(text) - n + 1)]
+
+
+def simhash(text: str) -> int:
+    weights = [0] * SIMHASH_BITS
+    for shingle in _shingles(text):
+        h = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += 1 if (h >> bit) & 1 else -1
+    value = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            value |= 1 << bit
+    return value
+
+
+def _bands(value: int) -> List[Tuple[int, int]]:
+    mask = (1 << BAND_BITS) - 1
+    return [(idx, (value >> (idx * BAND_BITS)) & mask) for idx in range(BANDS)]
+
+
+class SemanticCache:
+    """
+    :param cache_dir: 索引文件 semantic.db 保存的目录
+    :param key_builder: 用于规范化请求体，与精确缓存使用相同的易变字段策略
+    :param policies: 每个模型的阈值配置，"default" 为默认配置
+    """
+
+    def __init__(self, cache_dir: str, key_builder: CacheKeyBuilder, policies: Optional[Dict[str, Dict]] = None):
+        policies = dict(policies or {})
+        self.default_policy = {**DEFAULT_POLICY, **policies.pop("default", {})}
+        self.policies = {model: {**self.default_policy, **options} for model, options in policies.items()}
+        self.key_builder = key_builder
+        self._lock = threading.RLock()
+        # (参数签名, 规范化文本哈希) -> 缓存键
+        self._exact: Dict[Tuple[str, str], str] = {}
+        # (参数签名, 段序号, 段值) -> [(simhash, 缓存键)]
+        self._buckets: Dict[Tuple[str, int, int], List[Tuple[int, str]]] = {}
+        # 参数签名 -> [(simhash, 缓存键)]，阈值较大、分段桶无法保证召回时使用
+        self._signatures: Dict[str, List[Tuple[int, str]]] = {}
+        self._conn = sqlite3.connect(os.path.join(cache_dir, "semantic.db"), check_same_thread=False,
+                                     timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS prompts (key TEXT PRIMARY KEY, signature TEXT, norm_hash TEXT, simhash TEXT)"
+        )
+        self._last_rowid = 0
+        self._sync()
+
+    def _sync(self) -> None:
+        """加载其它 worker 进程新写入的条目，多进程部署时每个进程的内存索引保持一致"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT rowid, key, signature, norm_hash, simhash FROM prompts WHERE rowid > ? ORDER BY rowid",
+                (self._last_rowid,),
+            ).fetchall()
+            for rowid, key, signature, norm_hash, value in rows:
+                self._add_to_memory(key, signature, norm_hash, int(value, 16))
+                self._last_rowid = rowid
+
+    @classmethod
+    def from_file(cls, cache_dir: str, key_builder: CacheKeyBuilder, path: str) -> "SemanticCache":
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(cache_dir, key_builder, json.load(f))
+
+    def policy_for(self, model: str) -> Dict:
+        return self.policies.get(model, self.default_policy)
+
+    def _features(self, body: Dict[str, Any]) -> Tuple[str, str, int]:
+        """返回 (参数签名, 文本哈希, SimHash)
+
+        参数签名包含除 messages 以外的参数和最后一条用户消息，只有签名相同的请求之间才比较 SimHash；
+        文本哈希使用未屏蔽的文本，SimHash 使用屏蔽日期、UUID 等之后的文本。
+        """
+        payload = self.key_builder.canonicalize(body)
+        messages = payload.pop("messages", [])
+        parts = []
+        last_user = ""
+        for message in messages:
+            if isinstance(message, dict):
+                content = message.get("content")
+                if not isinstance(content, str):
+                    content = json.dumps(content, sort_keys=True, ensure_ascii=False)
+                parts.append(f"{message.get('role', '')}: {content}")
+                if message.get("role") == "user":
+                    last_user = content
+        params = json.dumps([payload, last_user], sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+        signature = hashlib.sha256(params.encode("utf-8")).hexdigest()
+        text = "\n".join(parts)
+        norm_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return signature, norm_hash, simhash(mask_text(text))
+
+    def _add_to_memory(self, key: str, signature: str, norm_hash: str, value: int) -> None:
+        self._exact[(signature, norm_hash)] = key
+        for band in _bands(value):
+            self._buckets.setdefault((signature, *band), []).append((value, key))
+        self._signatures.setdefault(signature, []).append((value, key))
+
+    def add(self, key: str, body: Dict[str, Any]) -> None:
+        """记录已写入精确缓存的请求"""
+        if not self.policy_for(body.get("model", ""))["enabled"]:
+            return
+        signature, norm_hash, value = self._features(body)
+        with self._lock:
+            if (signature, norm_hash) in self._exact:
+                return
+            self._add_to_memory(key, signature, norm_hash, value)
+            self._conn.execute("INSERT OR REPLACE INTO prompts VALUES (?, ?, ?, ?)",
+                               (key, signature, norm_hash, f"{value:016x}"))
+
+    def lookup(self, body: Dict[str, Any]) -> Optional[Tuple[str, int]]:
+        """返回 (相似请求的缓存键, 汉明距离)，没有足够相似的请求时返回 None"""
+        policy = self.policy_for(body.get("model", ""))
+        if not policy["enabled"]:
+            return None
+        signature, norm_hash, value = self._features(body)
+        self._sync()
+        with self._lock:
+            key = self._exact.get((signature, norm_hash))
+            if key:
+                return key, 0
+            if not policy["max_distance"]:
+                return None
+            if policy["max_distance"] < BANDS:
+                candidates = [item for band in _bands(value) for item in self._buckets.get((signature, *band), [])]
+            else:
+                candidates = self._signatures.get(signature, [])
+            best = None
+            for candidate, candidate_key in candidates:
+                distance = bin(candidate ^ value).count("1")
+                if distance <= policy["max_distance"] and (best is None or distance < best[1]):
+                    best = (candidate_key, distance)
+            return best
+
+    def remove(self, key: str) -> None:
+        """缓存条目被淘汰或删除时同步清理"""
+        with self._lock:
+            row = self._conn.execute("SELECT signature, norm_hash, simhash FROM prompts WHERE key = ?",
+                                     (key,)).fetchone()
+            if row is None:
+                return
+            signature, norm_hash, value = row[0], row[1], int(row[2], 16)
+            if self._exact.get((signature, norm_hash)) == key:
+                del self._exact[(signature, norm_hash)]
+            for bucket in [self._buckets.get((signature, *band), []) for band in _bands(value)] + \
+                    [self._signatures.get(signature, [])]:
+                bucket[:] = [item for item in bucket if item[1] != key]
+            self._conn.execute("DELETE FROM prompts WHERE key = ?", (key,))
+
+    def __len__(self) -> int:
+        return len(self._exact)
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Date  : 2026/10/17
+# @File  : single_flight.py
+# @Author: johnson
+# @Contact : github: johnson7788
+# @Desc  : 相同缓存键的并发请求合并，只向上游发一次请求，其它请求订阅同一个数据流
+"""
+第一个未命中缓存的请求在后台任务中请求上游，并把每个数据块发布到内存中的 Flight，
+同一缓存键的后续并发请求直接订阅这个 Flight，从第一个数据块开始读取，之后实时跟随。
+上游请求放在后台任务中执行，发起请求的客户端断开也不会影响其它订阅者，缓存只写入一次。
+"""
+
+import asyncio
+import logging
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class Flight:
+    """一次正在进行的上游请求，保存已收到的数据块，供多个订阅者读取"""
+
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.done = False
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self._cond = asyncio.Condition()
+
+    async def publish(self, chunk: str) -> None:
+        async with self._cond:
+            self.chunks.append(chunk)
+            self._cond.notify_all()
+
+    async def finish(self) -> None:
+        async with self._cond:
+            self.done = True
+            self._cond.notify_all()
+
+    async def subscribe(self) -> AsyncIterator[str]:
+        self.subscribers += 1
+        idx = 0
+        while True:
+            async with self._cond:
+                await self._cond.wait_for(lambda: len(self.chunks) > idx or self.done)
+                new_chunks = self.chunks[idx:]
+                finished = self.done
+            idx += len(new_chunks)
+            for chunk in new_chunks:
+                yield chunk
+            if finished and idx >= len(self.chunks):
+                return
+
+
+class SingleFlight:
+    def __init__(self):
+        self._flights: Dict[str, Flight] = {}
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._flights
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    def join(self, key: str, producer_factory: Callable[[], AsyncIterator[str]]) -> Tuple[AsyncIterator[str], bool]:
+        """
+        加入缓存键对应的请求，不存在时创建后台任务执行 producer_factory() 返回的异步生成器
+        :return: (数据块迭代器, 是否为发起上游请求的第一个请求)
+        """
+        flight = self._flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = Flight()
+            self._flights[key] = flight
+            flight.task = asyncio.create_task(self._run(key, flight, producer_factory()))
+        return flight.subscribe(), leader
+
+    async def _run(self, key: str, flight: Flight, producer: AsyncIterator[str]) -> None:
+        try:
+            async for chunk in producer:
+                await flight.publish(chunk)
+        except Exception as e:
+            logger.error(f"合并请求 {key} 的上游数据流异常: {e}", exc_info=True)
+        finally:
+            # 生成器结束时缓存已写入，之后到达的相同请求会直接命中缓存
+            self._flights.pop(key, None)
+            await flight.finish()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Date  : 2026/10/17
+# @File  : sse_classifier.py
+# @Author: johnson
+# @Contact : github: johnson7788
+# @Desc  : 流式响应的错误判断，边接收边解析 SSE data 帧，决定响应是否可以写入缓存
+"""
+旧版在写缓存前把整个响应转成小写后查找 "error" 等子串，正常回答中出现 error 这个单词也会被当成错误。
+这里在接收每一行时解析 SSE 的 data 帧，只根据 HTTP 状态码和供应商返回的错误对象判断:
+- HTTP 状态码不是 200                    -> http_<状态码>
+- data 帧中包含 error 对象               -> provider_error
+- 没有收到任何 data 帧                    -> empty_response
+- 没有收到 [DONE] 也没有 finish_reason   -> incomplete_stream
+非流式请求(stream=false)返回的是普通 JSON，结束时解析一次。
+"""
+
+import json
+from typing import Iterable, List, Optional, Tuple
+
+
+class StreamClassifier:
+    def __init__(self):
+        self.status_code: Optional[int] = None
+        self.frames = 0
+        self.done = False
+        self.finished = False
+        self.error_reason: Optional[str] = None
+        self.error_detail: Optional[str] = None
+        self._raw_lines: List[str] = []
+
+    def on_status(self, status_code: int) -> None:
+        self.status_code = status_code
+        if status_code != 200:
+            self.mark_error(f"http_{status_code}")
+
+    def mark_error(self, reason: str, detail: Optional[str] = None) -> None:
+        """记录第一个错误，之后的错误不覆盖"""
+        if self.error_reason is None:
+            self.error_reason = reason
+            self.error_detail = detail
+
+    def feed(self, line: str) -> None:
+        line = line.strip()
+        if not line or line.startswith(":"):
+            return
+        if not line.startswith("data:"):
+            # 非 SSE 格式，按普通 JSON 响应处理
+            self._raw_lines.append(line)
+            return
+        payload = line[len("data:"):].strip()
+        self.frames += 1
+        if payload == "[DONE]":
+            self.done = True
+            return
+        try:
+            frame = json.loads(payload)
+        except ValueError:
+            return
+        self._inspect(frame)
+
+    def _inspect(self, frame) -> None:
+        if not isinstance(frame, dict):
+            return
+        error = frame.get("error")
+        if error:
+            detail = (error.get("message") or error.get("code")) if isinstance(error, dict) else error
+            self.mark_error("provider_error", str(detail))
+            return
+        for choice in frame.get("choices") or []:
+            if isinstance(choice, dict) and choice.get("finish_reason"):
+                self.finished = True
+
+    def verdict(self) -> Tuple[bool, Optional[str]]:
+        """返回 (是否可以写入缓存, 拒绝原因)"""
+        if self._raw_lines and not self.frames:
+            try:
+                self._inspect(json.loads("".join(self._raw_lines)))
+            except ValueError:
+                self.mark_error("invalid_json")
+            self.frames = 1
+            self._raw_lines = []
+        if self.error_reason:
+            return False, self.error_reason
+        if not self.frames:
+            return False, "empty_response"
+        if not (self.done or self.finished):
+            return False, "incomplete_stream"
+        return True, None
+
+
+def classify_lines(lines: Iterable[str], status_code: int = 200) -> Tuple[bool, Optional[str]]:
+    """对已保存的响应内容做一次判断，用于迁移旧版缓存文件"""
+    classifier = StreamClassifier()
+    classifier.on_status(status_code)
+    for line in lines:
+        classifier.feed(line)
+    return classifier.verdict()
+
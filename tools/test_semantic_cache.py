@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Date  : 2026/10/17
+# @File  : test_semantic_cache.py
+# @Author: johnson
+# @Contact : github: johnson7788
+# @Desc  : 近似缓存的单元测试，不需要启动代理
+"""
+python -m unittest test_semantic_cache.py
+"""
+
+import shutil
+import tempfile
+import unittest
+
+from cache_key import CacheKeyBuilder
+from semantic_cache import SemanticCache
+
+SYSTEM_PROMPT = "You are a helpful translation assistant. " * 40
+
+
+def make_body(model, *messages):
+    return {"model": model, "stream": True,
+            "messages": [{"role": role, "content": content} for role, content in messages]}
+
+
+class SemanticCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.cache = SemanticCache(self.cache_dir, CacheKeyBuilder(), {
+            "default": {"enabled": True, "max_distance": 3},
+            "gpt-4.1": {"max_distance": 0},
+        })
+
+    def tearDown(self):
+        self.cache._conn.close()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def test_different_numbers_do_not_match(self):
+        """只有数字不同的请求是不同的问题，不能返回对方的缓存"""
+        for model in ("gpt-4.1", "deepseek-chat"):
+            self.cache.add(f"{model}-k1", make_body(model, ("user", "Compute 91 * 88 and explain the steps.")))
+            self.assertIsNone(self.cache.lookup(make_body(model, ("user", "Compute 17 * 23 and explain the steps."))))
+            self.assertEqual(self.cache.lookup(make_body(model, ("user", "Compute 91 * 88 and explain the steps."))),
+                             (f"{model}-k1", 0))
+
+    def test_long_shared_system_prompt(self):
+        """系统提示词很长且相同时，最后一条用户消息不同的请求不能互相命中"""
+        self.cache.add("k2", make_body("deepseek-chat", ("system", SYSTEM_PROMPT),
+                                       ("user", "Translate 'dog' to French.")))
+        self.assertIsNone(self.cache.lookup(make_body("deepseek-chat", ("system", SYSTEM_PROMPT),
+                                                      ("user", "Translate 'cat' to French."))))
+
+    def test_exact_match_uses_unmasked_text(self):
+        """max_distance 为 0 时只有文本完全相同才命中，日期不同也不命中"""
+        self.cache.add("k3", make_body("gpt-4.1", ("system", "Todays date: 2026-10-17"), ("user", "hello")))
+        self.assertIsNone(self.cache.lookup(make_body("gpt-4.1", ("system", "Todays date: 2026-10-18"),
+                                                      ("user", "hello"))))
+
+    def test_date_only_difference_matches(self):
+        """最后一条用户消息相同、只有系统提示词中的日期不同时按 SimHash 命中"""
+        self.cache.add("k4", make_body("deepseek-chat", ("system", f"Todays date: 2026-10-17. {SYSTEM_PROMPT}"),
+                                       ("user", "hello")))
+        result = self.cache.lookup(make_body("deepseek-chat", ("system", f"Todays date: 2026-10-18. {SYSTEM_PROMPT}"),
+                                             ("user", "hello")))
+        self.assertIsNotNone(result)
+        self.assertEqual(result[0], "k4")
+
+
+if __name__ == '__main__':
+    unittest.main()
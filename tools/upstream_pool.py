@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# @Date  : 2026/10/17
+# @File  : upstream_pool.py
+# @Author: johnson
+# @Contact : github: johnson7788
+# @Desc  : 上游模型服务的长连接池，每个上游主机一个 httpx.AsyncClient，复用 keep-alive/HTTP2 连接
+"""
+LLM_cache.py 在 FastAPI lifespan 中创建连接池，关闭服务时统一释放。
+新建连接数通过 httpx 的 trace 扩展统计，用来计算连接复用率。
+"""
+
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+import httpx
+
+try:
+    import h2  # noqa: F401  pip install httpx[http2]
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+DEFAULT_UPSTREAM_OPTIONS = {
+    "http2": True,
+    "max_connections": 20,
+    "max_keepalive_connections": 10,
+    "keepalive_expiry": 60.0,
+    "timeout": 600.0,
+    "connect_timeout": 20.0,
+}
+
+
+class UpstreamPool:
+    """
+    :param options: 每个上游主机的连接配置，key 为主机名，"default" 为默认配置
+    """
+
+    def __init__(self, options: Optional[Dict[str, Dict]] = None):
+        options = dict(options or {})
+        self.default_options = {**DEFAULT_UPSTREAM_OPTIONS, **options.pop("default", {})}
+        self.host_options = options
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def options_for(self, host: str) -> Dict:
+        return {**self.default_options, **self.host_options.get(host, {})}
+
+    def _create_client(self, host: str) -> httpx.AsyncClient:
+        opts = self.options_for(host)
+        http2 = opts["http2"] and HTTP2_AVAILABLE
+        self._stats[host] = {"requests": 0, "new_connections": 0, "in_use": 0, "http2": int(http2)}
+        return httpx.AsyncClient(
+            timeout=httpx.Timeout(opts["timeout"], connect=opts["connect_timeout"]),
+            verify=False,
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=opts["max_connections"],
+                max_keepalive_connections=opts["max_keepalive_connections"],
+                keepalive_expiry=opts["keepalive_expiry"],
+            ),
+        )
+
+    def start(self, urls) -> None:
+        """为每个上游主机预先创建客户端"""
+        for url in urls:
+            host = urlparse(url).netloc
+            if host not in self._clients:
+                self._clients[host] = self._create_client(host)
+
+    def get_client(self, url: str) -> httpx.AsyncClient:
+        host = urlparse(url).netloc
+        if host not in self._clients:
+            self._clients[host] = self._create_client(host)
+        return self._clients[host]
+
+    def stream(self, method: str, url: str, **kwargs):
+        """与 client.stream 相同，额外统计请求数、新建连接数和正在使用的连接数"""
+        host = urlparse(url).netloc
+        client = self.get_client(url)
+        stats = self._stats[host]
+
+        async def trace(event_name: str, info: dict):
+            if event_name == "connection.connect_tcp.complete":
+                stats["new_connections"] += 1
+
+        return _TrackedStream(client.stream(method, url, extensions={"trace": trace}, **kwargs), stats)
+
+    def stats(self) -> Dict[str, Dict]:
+        result = {}
+        for host, stats in self._stats.items():
+            requests = stats["requests"]
+            reuse_ratio = 1 - stats["new_connections"] / requests if requests else 0.0
+            result[host] = {**stats, "reuse_ratio": round(max(reuse_ratio, 0.0), 4)}
+        return result
+
+    async def aclose(self) -> None:
+        for client in self._clients.values():
+            await client.aclose()
+        self._clients.clear()
+
+
+class _TrackedStream:
+    """包装 client.stream 返回的上下文管理器，进入时计数，退出时释放"""
+
+    def __init__(self, context, stats: Dict[str, int]):
+        self._context = context
+        self._stats = stats
+
+    async def __aenter__(self) -> httpx.Response:
+        self._stats["requests"] += 1
+        self._stats["in_use"] += 1
+        try:
+            return await self._context.__aenter__()
+        except BaseException:
+            self._stats["in_use"] -= 1
+            raise
+
+    async def __aexit__(self, *exc_info):
+        self._stats["in_use"] -= 1
+        return await self._context.__aexit__(*exc_info)